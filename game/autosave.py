@@ -0,0 +1,189 @@
+import os
+import queue
+import threading
+import uuid
+import numpy as np
+from game.savegame import write_save_file, read_save_file
+from game.constants import AUTOSAVE_KEYFRAME_INTERVAL
+
+# Tables with one row per entity, matched up with the keyframe by their id column and diffed row by row
+ROW_TABLES = ("entities.unit", "entities.building")
+# Arrays with more than this fraction of their elements changed are stored whole instead of as indices and values
+SPARSE_MAX_FRACTION = 0.25
+
+def _as_bits(array):
+    """View an array as unsigned integers of the same width, so NaNs compare equal to themselves"""
+    return array.view(f"u{array.dtype.itemsize}")
+
+def get_delta_path(path):
+    """Path of the delta file that goes with the keyframe at path"""
+    return path + ".delta"
+
+def make_delta(keyframe, arrays):
+    """Encode arrays as their differences from keyframe; returns (metadata, {name: array})
+
+    Row tables keep the rows that were added or changed plus the ids of removed
+    rows. Other arrays are left out when unchanged, stored as the indices and
+    values of their changed elements when few changed, and stored whole otherwise.
+    """
+    meta = {"arrays": list(arrays), "tables": [], "sparse": []}
+    delta = {}
+    table_columns = set()
+    for table in ROW_TABLES:
+        prefix = table + "."
+        columns = [name for name in arrays if name.startswith(prefix)]
+        if not columns:
+            continue
+        table_columns.update(columns)
+        ids = arrays[prefix + "id"]
+        keyframe_ids = keyframe.get(prefix + "id", ids[:0])
+        changed = np.ones(len(ids), dtype=bool)
+        if len(ids) and len(keyframe_ids):
+            # Both tables are ordered by id, so each row's keyframe counterpart is a binary search away
+            match = np.minimum(np.searchsorted(keyframe_ids, ids), len(keyframe_ids) - 1)
+            changed = keyframe_ids[match] != ids
+            for name in columns:
+                old = keyframe.get(name)
+                if old is None or old.dtype != arrays[name].dtype or old.shape[1:] != arrays[name].shape[1:]:
+                    changed[:] = True
+                    break
+                differs = _as_bits(arrays[name]) != _as_bits(old)[match]
+                changed |= differs.reshape(len(ids), -1).any(axis=1)
+        for name in columns:
+            delta["rows." + name] = arrays[name][changed]
+        delta["removed." + table] = np.setdiff1d(keyframe_ids, ids, assume_unique=True)
+        meta["tables"].append(table)
+
+    for name, array in arrays.items():
+        if name in table_columns:
+            continue
+        old = keyframe.get(name)
+        if old is not None and old.dtype == array.dtype and old.shape == array.shape:
+            differs = np.flatnonzero(_as_bits(array) != _as_bits(old))
+            if len(differs) == 0:
+                continue
+            if len(differs) <= SPARSE_MAX_FRACTION * array.size:
+                delta["index." + name] = differs
+                delta["values." + name] = array.reshape(-1)[differs]
+                meta["sparse"].append(name)
+                continue
+        delta["whole." + name] = array
+    return meta, delta
+
+def apply_delta(keyframe, meta, delta):
+    """Rebuild the arrays make_delta encoded from the keyframe they were diffed against"""
+    arrays = {}
+    for table in meta["tables"]:
+        prefix = "rows." + table + "."
+        rows = {name[5:]: array for name, array in delta.items() if name.startswith(prefix)}
+        ids = rows[table + ".id"]
+        keyframe_ids = keyframe.get(table + ".id", ids[:0])
+        keep = ~(np.isin(keyframe_ids, delta["removed." + table]) | np.isin(keyframe_ids, ids))
+        order = np.argsort(np.concatenate([keyframe_ids[keep], ids]), kind="stable")
+        for name, changed_rows in rows.items():
+            kept_rows = keyframe[name][keep] if keep.any() else changed_rows[:0]
+            arrays[name] = np.concatenate([kept_rows, changed_rows])[order]
+
+    sparse = set(meta["sparse"])
+    for name in meta["arrays"]:
+        if name in arrays:
+            continue
+        if name in sparse:
+            array = keyframe[name].copy()
+            array.reshape(-1)[delta["index." + name]] = delta["values." + name]
+            arrays[name] = array
+        else:
+            arrays[name] = delta.get("whole." + name, keyframe.get(name))
+    return arrays
+
+def read_autosave(path):
+    """Read the state from an autosave keyframe and its delta; returns (meta, {name: array})"""
+    keyframe_meta, keyframe = read_save_file(path)
+    delta_path = get_delta_path(path)
+    if not os.path.exists(delta_path):
+        return keyframe_meta["state"], keyframe
+    delta_meta, delta = read_save_file(delta_path)
+    # A delta left over from before the keyframe was replaced no longer applies
+    if delta_meta["keyframe"] != keyframe_meta["keyframe"]:
+        return keyframe_meta["state"], keyframe
+    return delta_meta["state"], apply_delta(keyframe, delta_meta["delta"], delta)
+
+def get_autosave_time(path):
+    """Modification time of the newest autosave file, or None if there is no autosave"""
+    times = [os.path.getmtime(name) for name in (path, get_delta_path(path)) if os.path.exists(name)]
+    return max(times) if os.path.exists(path) else None
+
+def _replace_file(path, meta, arrays):
+    """Write a save file next to path and move it into place, so a crash never leaves half a file"""
+    temporary_path = path + ".tmp"
+    write_save_file(temporary_path, meta, arrays)
+    os.replace(temporary_path, path)
+
+class Autosaver:
+    """Saves the match in the background so autosaves never hold up a tick
+
+    save() only takes a copy of the state at a tick boundary; a worker thread
+    diffs, compresses and writes it. Every keyframe_interval-th save is a full
+    keyframe and the rest store only what changed since that keyframe, so a
+    restore needs just two files. A save due while the previous one is still
+    being written is skipped.
+    """
+
+    def __init__(self, path, keyframe_interval=AUTOSAVE_KEYFRAME_INTERVAL):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.saves_since_keyframe = 0
+        self.idle = threading.Event()
+        self.idle.set()
+        self.jobs = queue.Queue(maxsize=1)
+        self.worker = None
+        self.keyframe = None  # (id, arrays) of the keyframe on disk; only touched by the worker
+        self.error = None  # Last failure of the worker, which is kept here rather than raised on the game thread
+
+    def reset(self):
+        """Make the next save a keyframe, e.g. when a different match starts"""
+        self.saves_since_keyframe = 0
+
+    def save(self, get_snapshot):
+        """Hand the (meta, arrays) from get_snapshot() to the worker; returns False if it was still busy"""
+        if not self.idle.is_set():
+            return False
+        meta, arrays = get_snapshot()
+        is_keyframe = self.saves_since_keyframe % self.keyframe_interval == 0
+        self.saves_since_keyframe += 1
+        self.idle.clear()
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, name="autosave", daemon=True)
+            self.worker.start()
+        self.jobs.put((is_keyframe, meta, arrays))
+        return True
+
+    def wait(self):
+        """Block until the save in progress, if any, is on disk"""
+        self.idle.wait()
+
+    def run(self):
+        while True:
+            is_keyframe, meta, arrays = self.jobs.get()
+            try:
+                self.write(is_keyframe, meta, arrays)
+            except Exception as e:
+                self.error = e
+                # Start over from a keyframe rather than diff against one that may not be on disk
+                self.keyframe = None
+            finally:
+                self.idle.set()
+
+    def write(self, is_keyframe, meta, arrays):
+        """Write a keyframe or a delta against the last keyframe; runs on the worker thread"""
+        if is_keyframe or self.keyframe is None:
+            keyframe_id = uuid.uuid4().hex
+            _replace_file(self.path, {"keyframe": keyframe_id, "state": meta}, arrays)
+            self.keyframe = (keyframe_id, arrays)
+            delta_path = get_delta_path(self.path)
+            if os.path.exists(delta_path):
+                os.remove(delta_path)
+        else:
+            keyframe_id, keyframe = self.keyframe
+            delta_meta, delta = make_delta(keyframe, arrays)
+            _replace_file(get_delta_path(self.path), {"keyframe": keyframe_id, "state": meta, "delta": delta_meta}, delta)
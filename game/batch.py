@@ -0,0 +1,128 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+from game.headless import run_headless
+from game.entities.entity_types import ENTITY_TYPES
+from game.constants import ENTITY_UNIT, ENTITY_BUILDING, FPS
+
+# Scenario used when no scenario file is given: the stock starting position
+DEFAULT_SCENARIO = {"name": "default"}
+DEFAULT_MAX_TICKS = 10 * 60 * FPS
+
+def parse_seeds(text):
+    """Parse non-negative seeds given as "1,2,5" or ranges like "0-999", or a mix of both"""
+    seeds = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            seeds.extend(range(int(first), int(last) + 1))
+        else:
+            seeds.append(int(part))
+    return seeds
+
+def load_scenarios(path):
+    """Load a JSON list of scenarios
+
+    Every field is optional:
+      name       label written with each result
+      max_ticks  tick limit for the match
+      map_path   .engimap file to play on instead of the seeded map
+      stats      {kind: {type name: {stat: value}}} overrides, laid out like entity_types.json
+      units      extra [type, x, y, is_player] units, positions in tiles
+      buildings  extra [type, x, y, is_player] buildings, positions in tiles
+      attack     send every unit at the nearest enemy building on the first tick
+    """
+    with open(path) as f:
+        scenarios = json.load(f)
+    for index, scenario in enumerate(scenarios):
+        scenario.setdefault("name", f"scenario-{index}")
+    return scenarios
+
+def apply_stat_overrides(overrides):
+    """Overwrite type stats in this process; returns what is needed to undo it
+
+    Stats are read like entity_types.json, so building sizes are in tiles and
+    derived stats such as a building's radius follow them.
+    """
+    previous = []
+    for kind, types in overrides.items():
+        for name, stats in types.items():
+            previous.append((ENTITY_TYPES.get(kind, name), ENTITY_TYPES.override(kind, name, stats)))
+    return previous
+
+def restore_stats(previous):
+    """Undo apply_stat_overrides"""
+    for entity_type, stats in reversed(previous):
+        for stat, value in stats.items():
+            setattr(entity_type, stat, value)
+
+def setup_scenario(scenario, playing_state):
+    """Add a scenario's extra entities and opening orders to a started match"""
+    entity_manager = playing_state.entity_manager
+    for unit_type, x, y, is_player in scenario.get("units", ()):
+        entity_manager.create_unit(unit_type, x, y, is_player)
+    for building_type, x, y, is_player in scenario.get("buildings", ()):
+        entity_manager.create_building(building_type, x, y, is_player)
+
+    if scenario.get("attack"):
+        for is_player in (True, False):
+            targets = entity_manager.get_group_entities(not is_player, ENTITY_BUILDING)
+            if not targets:
+                continue
+            for unit in entity_manager.get_group_entities(is_player, ENTITY_UNIT):
+                if unit.can_attack:
+                    unit.set_attack_target(min(targets, key=unit.distance_to))
+
+def run_match(task):
+    """Run one (scenario, seed) match in a worker process and return its result"""
+    scenario, seed = task
+    previous = apply_stat_overrides(scenario.get("stats", {}))
+    try:
+        result = run_headless(scenario.get("max_ticks", DEFAULT_MAX_TICKS), seed=seed,
+                              map_path=scenario.get("map_path"),
+                              setup=lambda playing_state: setup_scenario(scenario, playing_state))
+    except Exception as e:
+        # One broken match shouldn't take down an overnight sweep
+        result = {"seed": seed, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        # Pool workers are reused, so the next match must see the stock stats
+        restore_stats(previous)
+    result["scenario"] = scenario["name"]
+    return result
+
+def run_batch(scenarios, seeds, results_path, workers=None):
+    """Run every scenario against every seed across a process pool
+
+    Results are appended to results_path as one JSON object per line, in the
+    order matches finish, so a long sweep can be followed and survives a crash.
+    Returns the number of matches run.
+    """
+    tasks = list(itertools.product(scenarios, seeds))
+    count = 0
+    with multiprocessing.Pool(processes=workers or os.cpu_count()) as pool, open(results_path, "a") as f:
+        for result in pool.imap_unordered(run_match, tasks):
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless matches over many seeds and scenarios in parallel")
+    parser.add_argument("--seeds", default="0-99", help='seeds to play, e.g. "0-999" or "1,5,9" (default: 0-99)')
+    parser.add_argument("--scenarios", default=None, help="JSON file with a list of scenarios (default: the stock start)")
+    parser.add_argument("--out", default="results.jsonl", help="file results are appended to, one JSON line per match")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios) if args.scenarios else [DEFAULT_SCENARIO]
+    seeds = parse_seeds(args.seeds)
+    count = run_batch(scenarios, seeds, args.out, workers=args.workers)
+    print(f"Ran {count} matches, results in {args.out}")
+
+if __name__ == "__main__":
+    main()
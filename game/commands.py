@@ -0,0 +1,82 @@
+import struct
+from game.constants import ENTITY_UNIT
+from game.entities.entity_types import ENTITY_TYPES
+
+# Player orders, applied by PlayingState at the start of the tick they are stamped with
+COMMAND_MOVE = 0
+COMMAND_ATTACK = 1
+COMMAND_PRODUCE = 2
+
+# Binary layout: tick, action and entity count, then the entity ids, then the action's arguments
+COMMAND_HEADER = struct.Struct("<IBH")
+COMMAND_ARGUMENTS = {
+    COMMAND_MOVE: struct.Struct("<ii"),  # World x, y
+    COMMAND_ATTACK: struct.Struct("<I"),  # Target entity id
+    COMMAND_PRODUCE: struct.Struct("<H"),  # Unit type id
+}
+
+class Command:
+    """An order for a group of entities, referring to them by id so it can be replayed"""
+
+    __slots__ = ("tick", "action", "entity_ids", "x", "y", "target_id", "unit_type")
+
+    def __init__(self, action, entity_ids, x=0, y=0, target_id=0, unit_type=None, tick=0):
+        self.tick = tick
+        self.action = action
+        self.entity_ids = tuple(entity_ids)
+        self.x = int(x)
+        self.y = int(y)
+        self.target_id = target_id
+        self.unit_type = unit_type
+
+    @classmethod
+    def move(cls, entities, x, y):
+        return cls(COMMAND_MOVE, [entity.id for entity in entities], x=x, y=y)
+
+    @classmethod
+    def attack(cls, entities, target):
+        return cls(COMMAND_ATTACK, [entity.id for entity in entities], target_id=target.id)
+
+    @classmethod
+    def produce(cls, building, unit_type):
+        return cls(COMMAND_PRODUCE, [building.id], unit_type=unit_type)
+
+    def __eq__(self, other):
+        return isinstance(other, Command) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Command(tick={self.tick}, action={self.action}, entity_ids={self.entity_ids})"
+
+    def encode(self):
+        """Pack the command into bytes"""
+        if self.action == COMMAND_MOVE:
+            arguments = (self.x, self.y)
+        elif self.action == COMMAND_ATTACK:
+            arguments = (self.target_id,)
+        else:
+            arguments = (ENTITY_TYPES.get(ENTITY_UNIT, self.unit_type).type_id,)
+        count = len(self.entity_ids)
+        return (COMMAND_HEADER.pack(self.tick, self.action, count) +
+                struct.pack(f"<{count}I", *self.entity_ids) +
+                COMMAND_ARGUMENTS[self.action].pack(*arguments))
+
+    @classmethod
+    def decode(cls, data, offset=0):
+        """Unpack one command from data at offset; returns (command, next offset)"""
+        tick, action, count = COMMAND_HEADER.unpack_from(data, offset)
+        offset += COMMAND_HEADER.size
+        entity_ids = struct.unpack_from(f"<{count}I", data, offset)
+        offset += 4 * count
+        arguments_format = COMMAND_ARGUMENTS.get(action)
+        if arguments_format is None:
+            raise ValueError(f"Unknown command action {action}")
+        arguments = arguments_format.unpack_from(data, offset)
+        offset += arguments_format.size
+
+        if action == COMMAND_MOVE:
+            command = cls(action, entity_ids, x=arguments[0], y=arguments[1], tick=tick)
+        elif action == COMMAND_ATTACK:
+            command = cls(action, entity_ids, target_id=arguments[0], tick=tick)
+        else:
+            command = cls(action, entity_ids, unit_type=ENTITY_TYPES.get_by_id(arguments[0]).name, tick=tick)
+        return command, offset
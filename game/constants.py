@@ -18,12 +18,42 @@ COLOR_BLUE = (0, 0, 255)
 COLOR_GRAY = (128, 128, 128)
 
 # Game settings
-FPS = 60
+FPS = 60  # Simulation ticks per second; rendering runs at its own rate
+MAX_RENDER_FPS = 0  # Frame rate cap for rendering, 0 for uncapped
+MAX_TICKS_PER_FRAME = 5  # Ticks to catch up per frame before dropping the rest of the backlog
+USE_SIMULATION_THREAD = False  # Simulate on a worker thread and render from published snapshots
 MAP_WIDTH = 100
 MAP_HEIGHT = 100
 TILE_SIZE = 32
+CHUNK_SIZE = 16  # Side length in tiles of the pre-rendered map chunks
+SPATIAL_CELL_SIZE = TILE_SIZE * 2  # Bucket size of the entity spatial hash
+USE_ENTITY_ARRAYS = False  # Store entities in NumPy arrays and move them in bulk
+REGION_WORKERS = 0  # Processes that step unit movement one map region each, 0 to step it in-process
+# Moving units needed before a step is split across the region workers. The pool has only been
+# measured on one core, where it loses at every size (8.9 ms against 6.5 ms for 10k movers, 279 ms
+# against 210 ms for 200k), so this is a placeholder until it is benchmarked on a multi-core machine
+REGION_MIN_MOVERS = 20000
+PATH_CACHE_SIZE = 512  # Paths remembered by (start tile, goal tile)
+CLUSTER_SIZE = 16  # Side length in tiles of the hierarchical pathfinding clusters
+HIERARCHICAL_MIN_DISTANCE = 2 * CLUSTER_SIZE  # Searches at least this many tiles long go through the cluster graph
+FLOW_FIELD_MIN_GROUP = 8  # Move orders for at least this many units use a shared flow field
+FLOW_FIELD_CACHE_SIZE = 16  # Flow fields remembered by destination tile
+AUTO_ACQUIRE_RANGE = 5 * TILE_SIZE  # Idle units attack hostiles that come this close
+ARRIVAL_DISTANCE = 5  # Distance at which a unit counts as having reached its move target
+USE_CHUNKED_WORLD = False  # Stream the map in chunks instead of holding it all in memory
+WORLD_WIDTH = 4096  # Size in tiles of the streamed world
+WORLD_HEIGHT = 4096
+WORLD_CHUNK_SIZE = 64  # Side length in tiles of the streamed world chunks
+MAX_RESIDENT_CHUNKS = 256  # World chunks kept in memory before the least recently used is evicted
+MAX_CHUNK_SURFACES = 48  # Pre-rendered chunk surfaces kept for a streamed world
 
 # Entity types
 ENTITY_UNIT = "unit"
 ENTITY_BUILDING = "building"
-ENTITY_RESOURCE = "resource" 
\ No newline at end of file
+ENTITY_RESOURCE = "resource" 
+
+# Save games
+SAVE_GAME_PATH = "savegame.sav"  # Single save slot used by the pause and main menus
+AUTOSAVE_PATH = "autosave.sav"  # Autosave keyframe; its delta is written next to it
+AUTOSAVE_INTERVAL = 60 * FPS  # Ticks between autosaves
+AUTOSAVE_KEYFRAME_INTERVAL = 10  # Every this many autosaves is a full keyframe, the rest are deltas against it
@@ -1,16 +1,29 @@
 import pygame
-from game.constants import STATE_MENU, STATE_PLAYING, STATE_PAUSED, STATE_VICTORY
+from game.constants import STATE_MENU, STATE_PLAYING, STATE_PAUSED, STATE_VICTORY, FPS, MAX_TICKS_PER_FRAME
 from game.states.menu_state import MenuState
 from game.states.playing_state import PlayingState
 from game.states.paused_state import PausedState
 from game.states.victory_state import VictoryState
 
 class GameEngine:
-    def __init__(self, screen):
+    def __init__(self, screen, headless=False, threaded=False):
         self.screen = screen
+        self.headless = headless  # No display or fonts; only the playing state is simulated
+        self.threaded = threaded and not headless  # Simulate matches on a thread of their own while rendering
         self.running = True
         self.current_state = None
+        self.final_state = None  # State a headless run tried to leave play for, e.g. victory
         
+        # Fixed-timestep clock: real time piles up in the accumulator and is spent in whole ticks
+        self.tick_duration = 1.0 / FPS
+        self.accumulator = 0.0
+        self.interpolation = 1.0  # How far rendering is between the previous tick and the current one
+        
+        if headless:
+            # Menus and overlays need fonts and a screen; the caller enters play itself
+            self.states = {STATE_PLAYING: PlayingState(self)}
+            return
+            
         # Initialize all states
         self.states = {
             STATE_MENU: MenuState(self),
@@ -24,6 +37,12 @@ class GameEngine:
     
     def change_state(self, new_state):
         """Change the current game state"""
+        if new_state not in self.states:
+            # A headless run ends when play would leave the playing state
+            self.final_state = new_state
+            self.running = False
+            return
+            
         if self.current_state:
             self.current_state.exit()
         
@@ -40,6 +59,30 @@ class GameEngine:
         if self.current_state:
             self.current_state.update()
     
+    def advance(self, elapsed):
+        """Run as many fixed ticks as elapsed seconds of real time call for; returns how many ran"""
+        simulation = getattr(self.current_state, "simulation", None)
+        if simulation is not None and simulation.running:
+            # The simulation thread keeps its own clock; only act on what it asked for
+            self.interpolation = simulation.get_interpolation()
+            requested_state = simulation.poll()
+            if requested_state is not None:
+                self.change_state(requested_state)
+            return 0
+            
+        self.accumulator += elapsed
+        ticks = 0
+        while self.accumulator >= self.tick_duration:
+            if ticks == MAX_TICKS_PER_FRAME:
+                # Too far behind to catch up, so drop the backlog instead of spiralling
+                self.accumulator %= self.tick_duration
+                break
+            self.update()
+            self.accumulator -= self.tick_duration
+            ticks += 1
+        self.interpolation = self.accumulator / self.tick_duration
+        return ticks
+    
     def render(self):
         """Render the current game state"""
         if self.current_state:
@@ -1,128 +1,101 @@
 import pygame
-from game.entities.entity import Entity
-from game.constants import TILE_SIZE
+from game.entities.entity import Entity, draw_health_bar
+from game.entities.entity_types import ENTITY_TYPES
+from game.constants import TILE_SIZE, ENTITY_UNIT, ENTITY_BUILDING
 
 class Building(Entity):
+    kind = ENTITY_BUILDING
+    
+    __slots__ = ("is_completed", "construction_started", "construction_due", "current_production",
+                 "production_started", "production_due", "scheduler", "attack_target")
+    
     def __init__(self, entity_id, building_type, x, y, is_player):
         super().__init__(entity_id, building_type, x, y, is_player)
         
-        # Buildings can't move by default
-        self.can_move = False
-        self.construction_progress = 100  # Percentage complete
+        # Buildings can't move; stats come from the building's type
         self.is_completed = True
-        
-        # Configure building type specific attributes
-        if building_type == "command_center":
-            self.max_health = 1000
-            self.health = 1000
-            self.width = 3 * TILE_SIZE
-            self.height = 3 * TILE_SIZE
-            self.radius = int(max(self.width, self.height) / 2)
-            self.production_options = ["worker"]
-            self.production_cooldown = 0
-            
-        elif building_type == "barracks":
-            self.max_health = 500
-            self.health = 500
-            self.width = 2 * TILE_SIZE
-            self.height = 2 * TILE_SIZE
-            self.radius = int(max(self.width, self.height) / 2)
-            self.can_attack = False
-            self.production_options = ["soldier"]
-            self.production_cooldown = 0
-            
-        elif building_type == "factory":
-            self.max_health = 800
-            self.health = 800
-            self.width = 3 * TILE_SIZE
-            self.height = 2 * TILE_SIZE
-            self.radius = int(max(self.width, self.height) / 2)
-            self.can_attack = False
-            self.production_options = ["tank"]
-            self.production_cooldown = 0
+        self.construction_started = 0
+        self.construction_due = 0
+        self.current_production = None
+        self.production_started = 0
+        self.production_due = 0
+        self.scheduler = None  # Clock of the timers this building is waiting on
+        self.attack_target = None
             
-        elif building_type == "turret":
-            self.max_health = 300
-            self.health = 300
-            self.width = 1 * TILE_SIZE
-            self.height = 1 * TILE_SIZE
-            self.radius = int(max(self.width, self.height) / 2)
-            self.can_attack = True
-            self.attack_damage = 15
-            self.attack_range = 150
-            self.attack_cooldown = 0
-            self.attack_cooldown_max = 30
-            self.attack_target = None
+    @property
+    def production_options(self):
+        return self.stats.production_options
+        
+    @property
+    def construction_progress(self):
+        """Percentage of construction done"""
+        if self.is_completed:
+            return 100
+        elapsed = self.scheduler.current_tick - self.construction_started
+        return min(100, 100 * elapsed / (self.construction_due - self.construction_started))
+        
+    @property
+    def production_cooldown(self):
+        """Ticks left until the current unit is produced, or 0 when idle"""
+        if self.current_production is None:
+            return 0
+        return max(0, self.production_due - self.scheduler.current_tick)
+        
+    def start_construction(self, entity_manager):
+        """Put the building back under construction; it completes on a scheduled tick"""
+        scheduler = entity_manager.scheduler
+        self.scheduler = scheduler
+        self.is_completed = False
+        self.construction_started = scheduler.current_tick
+        self.construction_due = scheduler.schedule(self.stats.construction_time, self, "construction")
             
-    def start_production(self, unit_type):
-        """Start producing a unit"""
-        if unit_type in self.production_options and self.production_cooldown <= 0:
+    def start_production(self, entity_manager, unit_type):
+        """Start producing a unit; it is spawned on a scheduled tick"""
+        if unit_type in self.production_options and self.current_production is None:
+            scheduler = entity_manager.scheduler
+            self.scheduler = scheduler
             self.current_production = unit_type
-            
-            # Set production time based on unit type
-            if unit_type == "worker":
-                self.production_cooldown = 180  # 3 seconds at 60 FPS
-            elif unit_type == "soldier":
-                self.production_cooldown = 300  # 5 seconds
-            elif unit_type == "tank":
-                self.production_cooldown = 480  # 8 seconds
-                
+            self.production_started = scheduler.current_tick
+            self.production_due = scheduler.schedule(ENTITY_TYPES.get(ENTITY_UNIT, unit_type).production_time, self, "production")
             return True
         return False
         
-    def update(self, entity_manager, game_map):
-        """Update building logic"""
-        # If under construction, progress the construction
-        if not self.is_completed:
-            self.construction_progress += 0.2  # 0.2% per frame
-            if self.construction_progress >= 100:
-                self.construction_progress = 100
-                self.is_completed = True
-                self.health = self.max_health
-        
-        # Handle production
-        if hasattr(self, 'production_cooldown') and self.production_cooldown > 0:
-            self.production_cooldown -= 1
+    def on_timer(self, event, entity_manager):
+        """Finish construction or production when its scheduled tick arrives"""
+        if event == "construction" and not self.is_completed:
+            self.is_completed = True
+            self.health = self.max_health
             
-            # Finished producing unit
-            if self.production_cooldown <= 0 and hasattr(self, 'current_production'):
-                # Find spawn position near the building
-                spawn_x = int(self.x / TILE_SIZE) + 1
-                spawn_y = int(self.y / TILE_SIZE) + 3
-                
-                # Create the unit
-                entity_manager.create_unit(self.current_production, spawn_x, spawn_y, self.is_player)
-                delattr(self, 'current_production')
-                
-        # Handle turret attacks
+        elif event == "production" and self.current_production is not None:
+            # Find spawn position near the building
+            spawn_x = int(self.x / TILE_SIZE) + 1
+            spawn_y = int(self.y / TILE_SIZE) + 3
+            
+            # Create the unit
+            entity_manager.create_unit(self.current_production, spawn_x, spawn_y, self.is_player)
+            self.current_production = None
+        
+    def set_attack_target(self, target_entity):
+        """Set an entity as the attack target"""
+        self.wake()
+        self.attack_target = target_entity
+        
+    def is_idle(self):
+        """Buildings only need updating while a turret has a target; timers wake them otherwise"""
+        return self.attack_target is None
+        
+    def update(self, entity_manager, game_map):
+        """Update building logic; construction and production run on scheduled timers"""
+        # Handle turret attacks; targets are handed out in batch by the entity manager
         if self.can_attack:
-            # Decrease attack cooldown
-            if self.attack_cooldown > 0:
-                self.attack_cooldown -= 1
-                
-            # Find target if none
-            if not hasattr(self, 'attack_target') or self.attack_target is None:
-                # Find closest enemy in range
-                closest_enemy = None
-                closest_distance = self.attack_range
-                
-                for entity in entity_manager.entities:
-                    if entity.is_player != self.is_player:
-                        distance = self.distance_to(entity)
-                        if distance < closest_distance:
-                            closest_enemy = entity
-                            closest_distance = distance
-                
-                self.attack_target = closest_enemy
-                
             # Attack if target exists and in range
-            if hasattr(self, 'attack_target') and self.attack_target:
-                if self.attack_target in entity_manager.entities:
+            if self.attack_target:
+                if entity_manager.is_alive(self.attack_target):
                     if self.distance_to(self.attack_target) <= self.attack_range:
-                        if self.attack_cooldown <= 0:
-                            # Deal damage
-                            self.attack_target.apply_damage(self.attack_damage)
-                            self.attack_cooldown = self.attack_cooldown_max
+                        if self.is_attack_ready(entity_manager):
+                            # Deal damage once the tick's combat is resolved
+                            entity_manager.queue_damage(self, self.attack_target, self.attack_damage)
+                            self.start_attack_cooldown(entity_manager)
                     else:
                         # Target out of range
                         self.attack_target = None
@@ -132,54 +105,53 @@ class Building(Entity):
         
     def render(self, screen, camera_x, camera_y):
         """Render the building on screen"""
-        # Calculate screen position
-        screen_x = int(self.x - camera_x)
-        screen_y = int(self.y - camera_y)
+        construction = None if self.is_completed else self.construction_progress
+        production = None
+        if self.current_production is not None and self.production_cooldown > 0:
+            production = (self.scheduler.current_tick - self.production_started) / (self.production_due - self.production_started)
+        draw_building(screen, self.stats, self.is_player, int(self.x - camera_x), int(self.y - camera_y), self.health,
+                      construction, production)
+
+def draw_building(screen, stats, is_player, screen_x, screen_y, health, construction=None, production=None):
+    """Draw a building with its top left at a screen position
+
+    construction is the percentage built, None once complete; production is the
+    fraction of the current unit made, None when idle.
+    """
+    # Don't render if off screen
+    if (screen_x + stats.width < 0 or screen_x > screen.get_width() or
+        screen_y + stats.height < 0 or screen_y > screen.get_height()):
+        return
         
-        # Don't render if off screen
-        if (screen_x + self.width < 0 or screen_x > screen.get_width() or
-            screen_y + self.height < 0 or screen_y > screen.get_height()):
-            return
-            
-        # Draw building
-        color = (0, 200, 0) if self.is_player else (200, 0, 0)
+    # Draw building
+    color = (0, 200, 0) if is_player else (200, 0, 0)
+    
+    # If under construction, adjust opacity
+    if construction is not None:
+        # Draw as wireframe if under construction
+        pygame.draw.rect(screen, color, (screen_x, screen_y, stats.width, stats.height), 2)
         
-        # If under construction, adjust opacity
-        if not self.is_completed:
-            # Draw as wireframe if under construction
-            pygame.draw.rect(screen, color, (screen_x, screen_y, self.width, self.height), 2)
-            
-            # Draw construction progress bar
-            progress_width = int(self.width * (self.construction_progress / 100))
-            pygame.draw.rect(screen, (100, 100, 100), (screen_x, screen_y - 10, self.width, 5))
-            pygame.draw.rect(screen, (200, 200, 0), (screen_x, screen_y - 10, progress_width, 5))
-        else:
-            # Draw completed building
-            pygame.draw.rect(screen, color, (screen_x, screen_y, self.width, self.height))
-            
-            # Draw building type icon/symbol in the center
-            building_symbol = "CC" if self.type == "command_center" else "B" if self.type == "barracks" else "F" if self.type == "factory" else "T"
-            font = pygame.font.SysFont(None, 20)
-            text = font.render(building_symbol, True, (0, 0, 0))
-            text_rect = text.get_rect(center=(screen_x + self.width // 2, screen_y + self.height // 2))
-            screen.blit(text, text_rect)
-            
-        # Draw health bar
-        self.render_health_bar(screen, screen_x + self.width // 2, screen_y)
+        # Draw construction progress bar
+        progress_width = int(stats.width * (construction / 100))
+        pygame.draw.rect(screen, (100, 100, 100), (screen_x, screen_y - 10, stats.width, 5))
+        pygame.draw.rect(screen, (200, 200, 0), (screen_x, screen_y - 10, progress_width, 5))
+    else:
+        # Draw completed building
+        pygame.draw.rect(screen, color, (screen_x, screen_y, stats.width, stats.height))
         
-        # Draw production progress if producing
-        if hasattr(self, 'production_cooldown') and hasattr(self, 'current_production') and self.production_cooldown > 0:
-            # Calculate original cooldown based on unit type
-            max_cooldown = 180  # Default
-            if self.current_production == "soldier":
-                max_cooldown = 300
-            elif self.current_production == "tank":
-                max_cooldown = 480
-                
-            # Draw production bar
-            progress = (max_cooldown - self.production_cooldown) / max_cooldown
-            bar_width = self.width
-            progress_width = int(bar_width * progress)
-            
-            pygame.draw.rect(screen, (50, 50, 50), (screen_x, screen_y + self.height + 5, bar_width, 5))
-            pygame.draw.rect(screen, (50, 150, 250), (screen_x, screen_y + self.height + 5, progress_width, 5)) 
\ No newline at end of file
+        # Draw building type icon/symbol in the center
+        font = pygame.font.SysFont(None, 20)
+        text = font.render(stats.symbol, True, (0, 0, 0))
+        text_rect = text.get_rect(center=(screen_x + stats.width // 2, screen_y + stats.height // 2))
+        screen.blit(text, text_rect)
+        
+    # Draw health bar
+    draw_health_bar(screen, screen_x + stats.width // 2, screen_y, stats.radius, health, stats.max_health)
+    
+    # Draw production progress if producing
+    if production is not None:
+        bar_width = stats.width
+        progress_width = int(bar_width * production)
+        
+        pygame.draw.rect(screen, (50, 50, 50), (screen_x, screen_y + stats.height + 5, bar_width, 5))
+        pygame.draw.rect(screen, (50, 150, 250), (screen_x, screen_y + stats.height + 5, progress_width, 5)) 
@@ -0,0 +1,68 @@
+import numpy as np
+
+class CombatResolver:
+    """Attacks buffered during a tick and resolved for every target in one batch
+
+    While entities update, attacks are only recorded as (attacker, target,
+    damage). At the end of the tick the damage to each target is summed in one
+    pass and applied at once, so every attack of the tick lands whatever order
+    entities updated in, including attacks by entities killed in the same tick.
+    """
+
+    def __init__(self):
+        self.attackers = []
+        self.targets = []
+        self.damage = []
+
+    def clear(self):
+        """Drop every buffered attack"""
+        self.attackers = []
+        self.targets = []
+        self.damage = []
+
+    def queue_damage(self, attacker, target, damage):
+        """Record an attack to resolve at the end of the tick"""
+        self.attackers.append(attacker)
+        self.targets.append(target)
+        self.damage.append(damage)
+
+    def resolve(self, entity_manager):
+        """Apply the buffered attacks; returns (killed, killers), both ordered by the killed entity's id
+
+        Each kill is credited to the attacker that dealt the most damage to the
+        target this tick, the lowest id among equals.
+        """
+        # Attacks on anything removed since they were made no longer land
+        attacks = [attack for attack in zip(self.attackers, self.targets, self.damage)
+                   if entity_manager.is_alive(attack[1])]
+        self.clear()
+        if not attacks:
+            return [], []
+        attackers, targets, damage = map(list, zip(*attacks))
+
+        count = len(targets)
+        target_ids = np.fromiter((target.id for target in targets), dtype=np.int64, count=count)
+        attacker_ids = np.fromiter((attacker.id for attacker in attackers), dtype=np.int64, count=count)
+        damage = np.array(damage, dtype=np.int64)
+
+        # One victim per distinct target, in id order, and the total damage it took
+        _, first, victim_index = np.unique(target_ids, return_index=True, return_inverse=True)
+        victims = [targets[index] for index in first.tolist()]
+        totals = np.bincount(victim_index, weights=damage, minlength=len(victims)).astype(np.int64)
+        health = np.maximum(entity_manager.get_health(victims) - totals, 0)
+        entity_manager.set_health(victims, health)
+        for victim in victims:
+            victim.wake()
+
+        killed = np.flatnonzero(health <= 0)
+        if len(killed) == 0:
+            return [], []
+
+        # Sort each victim's attacks by damage, highest first, then attacker id and keep the first
+        order = np.lexsort((attacker_ids, -damage, victim_index))
+        sorted_victims = victim_index[order]
+        first_attack = np.ones(count, dtype=np.bool_)
+        first_attack[1:] = sorted_victims[1:] != sorted_victims[:-1]
+        credited = order[first_attack]  # One attack per victim, in victim order
+        return ([victims[index] for index in killed.tolist()],
+                [attackers[index] for index in credited[killed].tolist()])
@@ -1,24 +1,42 @@
 import pygame
+from operator import attrgetter
 from game.constants import COLOR_GREEN, COLOR_RED, TILE_SIZE
+from game.entities.entity_types import ENTITY_TYPES
+
+def _stat_property(name):
+    """Read-only attribute served from the entity's shared type stats"""
+    return property(attrgetter("stats." + name))
 
 class Entity:
+    kind = None  # ENTITY_UNIT or ENTITY_BUILDING, set by subclasses
+    
+    # Per-entity state only; constant stats live on the shared EntityType
+    __slots__ = ("id", "handle", "manager", "awake", "type", "stats", "x", "y", "is_player", "health", "attack_ready_tick")
+    
     def __init__(self, entity_id, entity_type, x, y, is_player):
         self.id = entity_id
+        self.handle = None  # (slot, generation) handed out by the EntityManager
+        self.manager = None  # EntityManager that owns the entity, told when it has work again
+        self.awake = False  # Whether the entity is in its manager's active set
         self.type = entity_type
+        self.stats = ENTITY_TYPES.get(self.kind, entity_type)
         self.x = x * TILE_SIZE  # Convert grid position to pixel position
         self.y = y * TILE_SIZE
         self.is_player = is_player
-        self.radius = 16  # Default collision radius
-        self.width = 32  # Default width
-        self.height = 32  # Default height
-        self.health = 100
-        self.max_health = 100
-        self.can_move = False
-        self.can_attack = False
-        self.attack_damage = 0
-        self.attack_range = 0
-        self.attack_cooldown = 0
-        self.attack_cooldown_max = 60  # 1 second at 60 FPS
+        self.health = self.stats.max_health
+        self.attack_ready_tick = 0  # Scheduler tick from which the entity may attack again
+        
+    type_id = _stat_property("type_id")
+    max_health = _stat_property("max_health")
+    radius = _stat_property("radius")
+    width = _stat_property("width")
+    height = _stat_property("height")
+    can_move = _stat_property("can_move")
+    can_attack = _stat_property("can_attack")
+    attack_damage = _stat_property("attack_damage")
+    attack_range = _stat_property("attack_range")
+    attack_cooldown_max = _stat_property("attack_cooldown_max")
+    move_speed = _stat_property("move_speed")
         
     def is_point_inside(self, point_x, point_y):
         """Check if a point is inside this entity"""
@@ -49,13 +67,35 @@ class Entity:
         dy = y - self.y
         return (dx * dx + dy * dy) ** 0.5
         
+    def wake(self):
+        """Ask the manager to update this entity again, e.g. after an order or a hit"""
+        if not self.awake and self.manager is not None:
+            self.manager.wake(self)
+            
+    def is_idle(self):
+        """Check if the entity has nothing to do and can sleep until woken"""
+        return True
+        
     def apply_damage(self, damage):
         """Apply damage to this entity"""
+        self.wake()
         self.health -= damage
         if self.health < 0:
             self.health = 0
         return self.health <= 0
         
+    def is_attack_ready(self, entity_manager):
+        """Check if the attack cooldown has run out"""
+        return entity_manager.scheduler.current_tick >= self.attack_ready_tick
+        
+    def start_attack_cooldown(self, entity_manager):
+        """Block attacks for attack_cooldown_max ticks"""
+        self.attack_ready_tick = entity_manager.scheduler.current_tick + self.attack_cooldown_max
+        
+    def on_timer(self, event, entity_manager):
+        """Handle an event scheduled with the entity manager's scheduler"""
+        pass
+        
     def update(self, entity_manager, game_map):
         """Update entity state"""
         # Base entity has no update logic
@@ -63,33 +103,36 @@ class Entity:
         
     def render(self, screen, camera_x, camera_y):
         """Render entity on screen"""
-        # Calculate screen position
-        screen_x = int(self.x - camera_x)
-        screen_y = int(self.y - camera_y)
-        
-        # Don't render if off screen
-        if (screen_x < -self.width or screen_x > screen.get_width() or
-            screen_y < -self.height or screen_y > screen.get_height()):
-            return
-            
-        # Draw entity
-        color = COLOR_GREEN if self.is_player else COLOR_RED
-        pygame.draw.circle(screen, color, (screen_x, screen_y), self.radius)
-        
-        # Draw health bar
-        self.render_health_bar(screen, screen_x, screen_y)
+        draw_entity(screen, self.stats, self.is_player, int(self.x - camera_x), int(self.y - camera_y), self.health)
         
     def render_health_bar(self, screen, screen_x, screen_y):
         """Render health bar above entity"""
-        bar_width = 32
-        bar_height = 4
-        bar_x = screen_x - bar_width // 2
-        bar_y = screen_y - self.radius - 10
-        
-        # Background (empty health)
-        pygame.draw.rect(screen, (60, 60, 60), (bar_x, bar_y, bar_width, bar_height))
+        draw_health_bar(screen, screen_x, screen_y, self.radius, self.health, self.max_health)
+
+def draw_entity(screen, stats, is_player, screen_x, screen_y, health):
+    """Draw an entity of the given type centred on a screen position, skipping it when off screen"""
+    if (screen_x < -stats.width or screen_x > screen.get_width() or
+        screen_y < -stats.height or screen_y > screen.get_height()):
+        return
         
-        # Foreground (current health)
-        health_width = int(bar_width * (self.health / self.max_health))
-        health_color = (0, 255, 0) if self.health > self.max_health * 0.5 else (255, 0, 0)
-        pygame.draw.rect(screen, health_color, (bar_x, bar_y, health_width, bar_height)) 
\ No newline at end of file
+    # Draw entity
+    color = COLOR_GREEN if is_player else COLOR_RED
+    pygame.draw.circle(screen, color, (screen_x, screen_y), stats.radius)
+    
+    # Draw health bar
+    draw_health_bar(screen, screen_x, screen_y, stats.radius, health, stats.max_health)
+    
+def draw_health_bar(screen, screen_x, screen_y, radius, health, max_health):
+    """Draw a health bar above an entity of the given radius"""
+    bar_width = 32
+    bar_height = 4
+    bar_x = screen_x - bar_width // 2
+    bar_y = screen_y - radius - 10
+    
+    # Background (empty health)
+    pygame.draw.rect(screen, (60, 60, 60), (bar_x, bar_y, bar_width, bar_height))
+    
+    # Foreground (current health)
+    health_width = int(bar_width * (health / max_health))
+    health_color = (0, 255, 0) if health > max_health * 0.5 else (255, 0, 0)
+    pygame.draw.rect(screen, health_color, (bar_x, bar_y, health_width, bar_height)) 
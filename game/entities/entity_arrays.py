@@ -0,0 +1,347 @@
+import numpy as np
+from game.entities.unit import Unit
+from game.entities.building import Building
+from game.entities.entity_types import ENTITY_TYPES
+from game.entities.grid_query import neighbor_pairs
+from game.entities.shared_arrays import SharedArrays
+from game.constants import REGION_MIN_MOVERS, ARRIVAL_DISTANCE
+
+# Per-entity fields stored as array columns: name -> (dtype, Python type used when read back)
+ARRAY_FIELDS = {
+    "id": (np.int64, int),
+    "type_id": (np.uint16, int),
+    "is_player": (np.bool_, bool),
+    "x": (np.float64, float),
+    "y": (np.float64, float),
+    "move_speed": (np.float64, float),
+    "radius": (np.int32, int),
+    "health": (np.int64, int),
+    "attack_ready_tick": (np.int64, int),
+    "attack_range": (np.float64, float),
+    "can_move": (np.bool_, bool),
+    "can_attack": (np.bool_, bool),
+}
+
+# Columns holding a copy of the entity type's shared stats, for the vectorized steps
+STAT_FIELDS = ("type_id", "move_speed", "radius", "attack_range", "can_move", "can_attack")
+
+# Bookkeeping columns that have no matching entity attribute
+FLAG_FIELDS = ("alive", "awake", "has_target", "has_attack_target")
+
+def propose_moves(x, y, target_x, target_y, move_speed, movers):
+    """Get where movers would be after one step straight towards their targets"""
+    dx = target_x[movers] - x[movers]
+    dy = target_y[movers] - y[movers]
+    # Same operations in the same order as Unit.update_movement, so both backends round alike
+    scale = move_speed[movers] / np.sqrt(dx * dx + dy * dy)
+    return x[movers] + dx * scale, y[movers] + dy * scale
+
+def find_collisions(x, y, radius, others, movers, new_x, new_y):
+    """Flag movers whose collision box at its new position overlaps the box of one of the other rows
+
+    Only positions in x and y are checked against, so every mover sees the same
+    world no matter which movers are checked first or alongside it.
+    """
+    blocked = np.zeros(len(movers), dtype=np.bool_)
+    if len(movers) == 0 or len(others) == 0:
+        return blocked
+
+    cell_size = 2 * int(radius[others].max()) + 1
+    pair_mover, pair_other = neighbor_pairs(new_x, new_y, x[others], y[others], cell_size)
+    other_rows = others[pair_other]
+    not_self = movers[pair_mover] != other_rows
+    pair_mover = pair_mover[not_self]
+    other_rows = other_rows[not_self]
+
+    # Mirror pygame.Rect, which truncates coordinates to integers
+    mover_radius = radius[movers][pair_mover]
+    mover_left = np.trunc(new_x[pair_mover] - mover_radius)
+    mover_top = np.trunc(new_y[pair_mover] - mover_radius)
+    mover_size = 2 * mover_radius
+    other_radius = radius[other_rows]
+    other_left = np.trunc(x[other_rows] - other_radius)
+    other_top = np.trunc(y[other_rows] - other_radius)
+    other_size = 2 * other_radius
+
+    overlap = ((mover_left < other_left + other_size) & (other_left < mover_left + mover_size) &
+               (mover_top < other_top + other_size) & (other_top < mover_top + mover_size))
+    blocked[pair_mover[overlap]] = True
+    return blocked
+
+class EntityArrays:
+    """Structure-of-arrays storage for the per-tick hot fields of every entity
+
+    With shared set, the columns live in shared memory so worker processes can
+    read and write them in place.
+    """
+
+    def __init__(self, capacity=256, shared=False):
+        self.capacity = capacity
+        self.size = 0  # High-water mark of allocated rows
+        self.free_rows = []
+        self.entities = [None] * capacity
+        self.shared = SharedArrays() if shared else None
+        for name, (dtype, _) in ARRAY_FIELDS.items():
+            setattr(self, name, self.new_column(name, dtype, capacity))
+        self.target_x = self.new_column("target_x", np.float64, capacity)
+        self.target_y = self.new_column("target_y", np.float64, capacity)
+        for name in FLAG_FIELDS:
+            setattr(self, name, self.new_column(name, np.bool_, capacity))
+
+    def new_column(self, name, dtype, capacity):
+        """Allocate a zeroed column, in shared memory if this store is shared"""
+        if self.shared is not None:
+            return self.shared.allocate(name, dtype, capacity)
+        return np.zeros(capacity, dtype=dtype)
+
+    def close(self):
+        """Free the shared memory behind a shared store"""
+        if self.shared is not None:
+            self.shared.close()
+
+    def column_names(self):
+        """Get the names of every array column"""
+        return list(ARRAY_FIELDS) + ["target_x", "target_y"] + list(FLAG_FIELDS)
+
+    def allocate(self, entity):
+        """Reserve a row for an entity and return its index"""
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            if self.size == self.capacity:
+                self.grow(self.capacity * 2)
+            row = self.size
+            self.size += 1
+
+        for name in self.column_names():
+            getattr(self, name)[row] = 0
+        self.alive[row] = True
+        self.entities[row] = entity
+        return row
+
+    def add_rows(self, entity_class, type_ids, columns):
+        """Fill one new row per type id from {field: array} columns and wrap each in entity_class
+
+        Used to load many entities at once: type stats are copied in for every
+        row together, and rows are wrapped without the per-field setup of
+        entity_class.__init__. Returns the entities in row order.
+        """
+        count = len(type_ids)
+        start = self.size
+        capacity = self.capacity
+        while capacity < start + count:
+            capacity *= 2
+        if capacity != self.capacity:
+            self.grow(capacity)
+        self.size += count
+
+        rows = slice(start, start + count)
+        for name in self.column_names():
+            getattr(self, name)[rows] = 0
+        for name, column in columns.items():
+            getattr(self, name)[rows] = column
+        for name in STAT_FIELDS:
+            stats = np.array([getattr(entity_type, name) for entity_type in ENTITY_TYPES.types])
+            getattr(self, name)[rows] = stats[type_ids]
+        self.alive[rows] = True
+        types = ENTITY_TYPES.types
+        return [entity_class.from_row(self, row, types[type_id]) for row, type_id in enumerate(type_ids.tolist(), start)]
+
+    def release(self, row):
+        """Free a row so a later entity can reuse it"""
+        self.alive[row] = False
+        self.entities[row] = None
+        self.free_rows.append(row)
+
+    def detach_row(self, row):
+        """Copy one row into its own single-row store and free the original"""
+        detached = EntityArrays(capacity=1)
+        detached.size = 1
+        for name in self.column_names():
+            getattr(detached, name)[0] = getattr(self, name)[row]
+        detached.entities[0] = self.entities[row]
+        self.release(row)
+        return detached
+
+    def grow(self, capacity):
+        """Reallocate every column with a larger capacity"""
+        for name in self.column_names():
+            column = getattr(self, name)
+            grown = self.new_column(name, column.dtype, capacity)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+        del column
+        if self.shared is not None:
+            self.shared.release_replaced()
+        self.entities.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def get_rows_needing_update(self):
+        """Get rows whose entity has per-object logic this tick: awake buildings and attacking units"""
+        size = self.size
+        return np.flatnonzero(self.alive[:size] & self.awake[:size] &
+                              (~self.can_move[:size] | self.has_attack_target[:size])).tolist()
+
+    def get_idle_rows(self):
+        """Get rows of awake entities with neither a move target nor an attack target"""
+        size = self.size
+        return np.flatnonzero(self.alive[:size] & self.awake[:size] &
+                              ~self.has_target[:size] & ~self.has_attack_target[:size]).tolist()
+
+    def get_rows(self, entities):
+        """Get the rows of a list of entities stored here"""
+        return np.fromiter((entity._row for entity in entities), dtype=np.int64, count=len(entities))
+
+    def step_movement(self, game_map, region_pool=None):
+        """Advance every unit with a move target by one tick
+
+        Returns (moved_rows, old_x, old_y, arrived_rows). Terrain is checked with
+        game_map.are_passable, and collisions against positions from the start of
+        the step, so the result does not depend on the order entities were created in.
+        Enough movers are split by region across region_pool's processes if given.
+        """
+        size = self.size
+        rows = np.flatnonzero(self.alive[:size] & self.can_move[:size] & self.has_target[:size])
+        empty = np.zeros(0, dtype=np.int64)
+        if len(rows) == 0:
+            return empty, np.zeros(0), np.zeros(0), empty
+
+        x = self.x[rows]
+        y = self.y[rows]
+        dx = self.target_x[rows] - x
+        dy = self.target_y[rows] - y
+        distance = np.sqrt(dx * dx + dy * dy)
+
+        # Units with an attack target stop moving once it is in range
+        holding = self.has_attack_target[rows] & (distance <= self.attack_range[rows])
+        arrived = ~holding & (distance <= ARRIVAL_DISTANCE)
+        moving = ~holding & ~arrived
+
+        # Reached target, clear it unless chasing an attack target
+        arrived_rows = rows[arrived & ~self.has_attack_target[rows]]
+        self.has_target[arrived_rows] = False
+
+        movers = rows[moving]
+        if region_pool is not None and len(movers) >= REGION_MIN_MOVERS:
+            new_x, new_y, collided = region_pool.step_movers(self, movers)
+        else:
+            new_x, new_y = propose_moves(self.x, self.y, self.target_x, self.target_y, self.move_speed, movers)
+            collided = self.find_blocked(movers, new_x, new_y)
+
+        # Check for impassable terrain, letting units already stuck on it walk off
+        blocked = ~game_map.are_passable(new_x, new_y) & game_map.are_passable(x[moving], y[moving])
+        blocked |= collided
+        moved = movers[~blocked]
+        old_x = self.x[moved]
+        old_y = self.y[moved]
+        self.x[moved] = new_x[~blocked]
+        self.y[moved] = new_y[~blocked]
+        return moved, old_x, old_y, arrived_rows
+
+    def find_blocked(self, movers, new_x, new_y):
+        """Flag movers whose new collision box overlaps another entity's box"""
+        others = np.flatnonzero(self.alive[:self.size])
+        return find_collisions(self.x, self.y, self.radius, others, movers, new_x, new_y)
+
+def _array_property(name, convert):
+    def get(self):
+        return convert(getattr(self._arrays, name)[self._row])
+
+    def set(self, value):
+        getattr(self._arrays, name)[self._row] = value
+
+    return property(get, set)
+
+def _target_property(name):
+    def get(self):
+        if not self._arrays.has_target[self._row]:
+            return None
+        return float(getattr(self._arrays, name)[self._row])
+
+    def set(self, value):
+        if value is None:
+            self._arrays.has_target[self._row] = False
+        else:
+            getattr(self._arrays, name)[self._row] = value
+            self._arrays.has_target[self._row] = True
+
+    return property(get, set)
+
+class ArrayRowView:
+    """Mixin that keeps an entity's hot fields in an EntityArrays row instead of on the object"""
+
+    # Concrete subclasses declare the _arrays, _row and _attack_target slots
+    __slots__ = ()
+
+    def __init__(self, arrays, *args):
+        self._arrays = arrays
+        self._row = arrays.allocate(self)
+        super().__init__(*args)
+        for name in STAT_FIELDS:
+            getattr(arrays, name)[self._row] = getattr(self.stats, name)
+
+    @classmethod
+    def from_row(cls, arrays, row, entity_type):
+        """Wrap a row whose columns are already filled in, e.g. by EntityArrays.add_rows
+
+        Only the fields kept on the object are set; the caller fills in the rest
+        of the entity's state, as EntityManager.load_snapshot does.
+        """
+        entity = cls.__new__(cls)
+        entity._arrays = arrays
+        entity._row = row
+        entity._attack_target = None
+        entity.handle = None
+        entity.manager = None
+        entity.type = entity_type.name
+        entity.stats = entity_type
+        arrays.entities[row] = entity
+        return entity
+
+    @property
+    def attack_target(self):
+        return getattr(self, "_attack_target", None)
+
+    @attack_target.setter
+    def attack_target(self, target):
+        self._attack_target = target
+        self._arrays.has_attack_target[self._row] = target is not None
+
+    def __getstate__(self):
+        """Copy or pickle only the slots that hold data; array-backed fields travel with the arrays"""
+        cls = type(self)
+        state = {}
+        for klass in cls.__mro__:
+            for name in getattr(klass, "__slots__", ()):
+                if name in state or isinstance(getattr(cls, name, None), property):
+                    continue
+                try:
+                    state[name] = getattr(self, name)
+                except AttributeError:
+                    pass
+        return (None, state)
+        
+    def detach(self):
+        """Move this entity's fields out of the shared arrays, e.g. once it has died"""
+        self._arrays = self._arrays.detach_row(self._row)
+        self._row = 0
+
+for _name, (_, _convert) in ARRAY_FIELDS.items():
+    setattr(ArrayRowView, _name, _array_property(_name, _convert))
+ArrayRowView.awake = _array_property("awake", bool)
+ArrayRowView.target_x = _target_property("target_x")
+ArrayRowView.target_y = _target_property("target_y")
+
+class ArrayUnit(ArrayRowView, Unit):
+    """Unit whose position, target and combat state live in EntityArrays"""
+
+    __slots__ = ("_arrays", "_row", "_attack_target")
+
+    def update_movement(self, entity_manager, game_map):
+        """Movement is advanced in bulk by EntityArrays.step_movement"""
+        pass
+
+class ArrayBuilding(ArrayRowView, Building):
+    """Building whose position and combat state live in EntityArrays"""
+
+    __slots__ = ("_arrays", "_row", "_attack_target")
@@ -1,77 +1,599 @@
+import heapq
+import math
+import zlib
+import numpy as np
+from operator import attrgetter
 from game.entities.entity import Entity
 from game.entities.unit import Unit
 from game.entities.building import Building
+from game.entities.spatial_hash import SpatialHash, ArraySpatialHash
+from game.entities.slot_table import SlotTable
+from game.entities.targeting import TargetAcquisition
+from game.entities.combat import CombatResolver
+from game.entities.scheduler import Scheduler
+from game.entities.entity_arrays import EntityArrays, ArrayUnit, ArrayBuilding
+from game.entities.region_pool import RegionPool
+from game.entities.entity_types import ENTITY_TYPES
+from game.map.flow_field import FlowField
+from game.constants import USE_ENTITY_ARRAYS, REGION_WORKERS, ENTITY_UNIT, ENTITY_BUILDING
+
+# Scheduler events, stored in snapshots as their index here
+TIMER_EVENTS = ("construction", "production")
+
+def get_column(entities, get, dtype):
+    """Gather one attribute of every entity into an array"""
+    return np.fromiter(map(get, entities), dtype=dtype, count=len(entities))
 
 class EntityManager:
-    def __init__(self):
-        self.entities = []
+    def __init__(self, use_arrays=USE_ENTITY_ARRAYS, workers=REGION_WORKERS):
+        if workers and not use_arrays:
+            raise ValueError("Region workers step the array backend, so they need use_arrays")
+        # Entities are handed (slot, generation) handles; self.entities is the table's dense list
+        self.slots = SlotTable()
+        self.entities = self.slots.items
+        # Entities by (is_player, kind), keyed by handle and kept in creation order
+        self.groups = {(is_player, kind): {} for is_player in (True, False) for kind in (ENTITY_UNIT, ENTITY_BUILDING)}
+        # Running totals by (is_player, kind) for match statistics
+        self.created_counts = dict.fromkeys(self.groups, 0)
+        self.lost_counts = dict.fromkeys(self.groups, 0)
+        self.kill_counts = dict.fromkeys(self.groups, 0)  # Kills credited to attackers of each (is_player, kind)
         self.entity_id_counter = 0
+        self.ids = {}  # Entity id -> handle, for commands that name entities by id
+        # Optional structure-of-arrays storage; entities become views over its rows
+        self.arrays = EntityArrays(shared=workers > 0) if use_arrays else None
+        self.spatial_hash = SpatialHash() if self.arrays is None else ArraySpatialHash(self.arrays)
+        # Worker processes that step movement by map region, reading the arrays from shared memory
+        self.region_pool = RegionPool(workers) if workers else None
+        self.targeting = TargetAcquisition()
+        self.combat = CombatResolver()
+        self.scheduler = Scheduler()
+        self.pending_moves = []  # (unit, x, y) steps chosen this tick, made together by resolve_moves
+        # Entities with something to do, by handle; everything else sleeps until woken
+        self.active = {}
+        # Sleeping entities that can attack, woken when a hostile comes within their search range
+        self.sleeping_seekers = {}
+        self.sleeper_positions = None  # Cached (sleepers, targeting positions) of sleeping_seekers
+        # Where entities that moved in the last tick started it, for interpolated rendering
+        self.moved_from = {}  # Handle -> (x, y), filled by move_entity
+        self.array_moves = None  # (rows, old_x, old_y) from the last vectorized movement step
+        self.previous_positions = None  # Both of the above merged by handle, built on first render
         
     def clear(self):
         """Clear all entities"""
-        self.entities = []
+        self.slots.clear()
+        self.ids.clear()
+        self.entity_id_counter = 0
+        for group in self.groups.values():
+            group.clear()
+        self.created_counts = dict.fromkeys(self.groups, 0)
+        self.lost_counts = dict.fromkeys(self.groups, 0)
+        self.kill_counts = dict.fromkeys(self.groups, 0)
+        self.combat.clear()
+        self.scheduler.clear()
+        self.pending_moves = []
+        self.active.clear()
+        self.sleeping_seekers.clear()
+        self.sleeper_positions = None
+        self.moved_from = {}
+        self.array_moves = None
+        self.previous_positions = None
+        self.spatial_hash.clear()
+        if self.arrays is not None:
+            self.arrays.close()
+            self.arrays = EntityArrays(shared=self.region_pool is not None)
+            self.spatial_hash = ArraySpatialHash(self.arrays)
+            
+    def close(self):
+        """Stop the region workers and free shared memory; the manager can't be used afterwards"""
+        if self.region_pool is not None:
+            self.region_pool.close()
+        if self.arrays is not None:
+            self.arrays.close()
         
     def create_unit(self, unit_type, x, y, is_player=True):
         """Create a new unit at the given position"""
-        unit = Unit(self.entity_id_counter, unit_type, x, y, is_player)
-        self.entities.append(unit)
+        unit = self.make_entity(ENTITY_UNIT, self.entity_id_counter, unit_type, x, y, is_player)
         self.entity_id_counter += 1
-        return unit
+        return self.add_entity(unit)
         
     def create_building(self, building_type, x, y, is_player=True):
         """Create a new building at the given position"""
-        building = Building(self.entity_id_counter, building_type, x, y, is_player)
-        self.entities.append(building)
+        building = self.make_entity(ENTITY_BUILDING, self.entity_id_counter, building_type, x, y, is_player)
         self.entity_id_counter += 1
-        return building
+        return self.add_entity(building)
+        
+    def make_entity(self, kind, entity_id, entity_type, x, y, is_player):
+        """Build an entity for this manager's storage backend without adding it"""
+        if kind == ENTITY_UNIT:
+            if self.arrays is not None:
+                return ArrayUnit(self.arrays, entity_id, entity_type, x, y, is_player)
+            return Unit(entity_id, entity_type, x, y, is_player)
+        if self.arrays is not None:
+            return ArrayBuilding(self.arrays, entity_id, entity_type, x, y, is_player)
+        return Building(entity_id, entity_type, x, y, is_player)
+        
+    def add_entity(self, entity):
+        """Give an entity a handle, index it and make it active"""
+        entity.handle = self.slots.insert(entity)
+        self.ids[entity.id] = entity.handle
+        self.groups[(entity.is_player, entity.kind)][entity.handle] = entity
+        self.created_counts[(entity.is_player, entity.kind)] += 1
+        self.spatial_hash.insert(entity)
+        entity.manager = self
+        self.wake(entity)
+        return entity
+        
+    def get_entity(self, handle):
+        """Get the entity behind a handle, or None if it has been removed"""
+        return self.slots.get(handle)
+        
+    def get_entity_by_id(self, entity_id):
+        """Get a live entity by its id, or None"""
+        handle = self.ids.get(entity_id)
+        return None if handle is None else self.slots.get(handle)
+        
+    def is_alive(self, entity):
+        """Check if an entity is still in the game"""
+        return entity is not None and entity.handle is not None and self.slots.is_alive(entity.handle)
+        
+    def wake(self, entity):
+        """Add an entity to the active set so it is updated from the next pass on"""
+        if entity.awake or not self.is_alive(entity):
+            return
+        entity.awake = True
+        self.active[entity.handle] = entity
+        if self.sleeping_seekers.pop(entity.handle, None) is not None:
+            self.sleeper_positions = None
+            
+    def sleep(self, entity):
+        """Take an idle entity out of the active set until something wakes it"""
+        entity.awake = False
+        del self.active[entity.handle]
+        if entity.can_attack:
+            self.sleeping_seekers[entity.handle] = entity
+            self.sleeper_positions = None
+            
+    def wake_seekers_near_active(self):
+        """Wake sleeping units and turrets that an active hostile has come within range of"""
+        if not self.sleeping_seekers or not self.active:
+            return
+        # Sleepers don't move, so their positions only change when the set does
+        if self.sleeper_positions is None:
+            sleepers = list(self.sleeping_seekers.values())
+            self.sleeper_positions = (sleepers, self.targeting.get_positions(sleepers))
+        sleepers, positions = self.sleeper_positions
+        for index in self.targeting.find_seekers_in_range(positions, self.get_active_positions()):
+            self.wake(sleepers[index])
+            
+    def get_active_positions(self):
+        """Get (x, y, is_player) arrays of every active entity"""
+        if self.arrays is not None:
+            arrays = self.arrays
+            rows = np.flatnonzero(arrays.alive[:arrays.size] & arrays.awake[:arrays.size])
+            return arrays.x[rows], arrays.y[rows], arrays.is_player[rows]
+        active = list(self.active.values())
+        return (get_column(active, attrgetter("x"), np.float64), get_column(active, attrgetter("y"), np.float64),
+                get_column(active, attrgetter("is_player"), np.bool_))
+            
+    def move_entity(self, entity, x, y):
+        """Move an entity and keep the spatial hash in sync"""
+        self.moved_from.setdefault(entity.handle, (entity.x, entity.y))
+        entity.x = x
+        entity.y = y
+        self.spatial_hash.update(entity)
         
     def get_entity_at_position(self, x, y):
         """Get entity at the specified position"""
-        for entity in self.entities:
-            if entity.is_point_inside(x, y):
-                return entity
-        return None
+        # Prefer the oldest entity when several overlap, matching creation order
+        result = None
+        for entity in self.spatial_hash.query_point(x, y):
+            if entity.is_point_inside(x, y) and (result is None or entity.id < result.id):
+                result = entity
+        return result
         
     def get_entities_in_rect(self, rect):
         """Get all entities inside the specified rectangle"""
-        result = []
-        for entity in self.entities:
-            if entity.is_inside_rect(rect):
-                result.append(entity)
+        candidates = self.spatial_hash.query_rect(rect.left, rect.top, rect.right, rect.bottom)
+        result = [entity for entity in candidates if entity.is_inside_rect(rect)]
+        result.sort(key=lambda e: e.id)
         return result
+        
+    def has_collision(self, rect, ignore_entity=None):
+        """Check if any entity's collision box overlaps the rectangle"""
+        for entity in self.spatial_hash.query_rect(rect.left, rect.top, rect.right, rect.bottom):
+            if entity is not ignore_entity and entity.is_inside_rect(rect):
+                return True
+        return False
     
+    def get_group_entities(self, is_player, kind=None):
+        """Get one team's entities of a kind (or of every kind) in creation order"""
+        if kind is not None:
+            return list(self.groups[(is_player, kind)].values())
+        units = self.groups[(is_player, ENTITY_UNIT)].values()
+        buildings = self.groups[(is_player, ENTITY_BUILDING)].values()
+        return sorted([*units, *buildings], key=lambda e: e.id)
+        
+    def count_entities(self, is_player, kind=None):
+        """Count one team's entities of a kind, or of every kind, without building a list"""
+        if kind is not None:
+            return len(self.groups[(is_player, kind)])
+        return len(self.groups[(is_player, ENTITY_UNIT)]) + len(self.groups[(is_player, ENTITY_BUILDING)])
+        
     def get_player_entities(self):
         """Get all player entities"""
-        return [e for e in self.entities if e.is_player]
+        return self.get_group_entities(True)
         
     def get_enemy_entities(self):
         """Get all enemy entities"""
-        return [e for e in self.entities if not e.is_player]
+        return self.get_group_entities(False)
         
     def get_player_buildings(self):
         """Get all player buildings"""
-        return [e for e in self.entities if e.is_player and isinstance(e, Building)]
+        return self.get_group_entities(True, ENTITY_BUILDING)
         
     def get_enemy_buildings(self):
         """Get all enemy buildings"""
-        return [e for e in self.entities if not e.is_player and isinstance(e, Building)]
+        return self.get_group_entities(False, ENTITY_BUILDING)
         
+    def remove_entity(self, entity):
+        """Remove an entity from the manager"""
+        if not self.slots.remove(entity.handle):
+            return
+        del self.groups[(entity.is_player, entity.kind)][entity.handle]
+        del self.ids[entity.id]
+        self.lost_counts[(entity.is_player, entity.kind)] += 1
+        self.active.pop(entity.handle, None)
+        if self.sleeping_seekers.pop(entity.handle, None) is not None:
+            self.sleeper_positions = None
+        self.spatial_hash.remove(entity)
+        if self.arrays is not None:
+            entity.detach()
+            
     def update(self, game_map):
         """Update all entities"""
-        # Create a copy of entities to allow removal during iteration
-        entities_copy = self.entities.copy()
+        # A new tick starts, so only its moves are interpolated over
+        self.moved_from = {}
+        self.array_moves = None
+        self.previous_positions = None
         
-        for entity in entities_copy:
+        # Only entities with a timer due this tick are woken for it
+        for entity, event in self.scheduler.advance():
+            if self.is_alive(entity):
+                entity.on_timer(event, self)
+                
+        # Sleepers wake when a hostile comes close, then idle units and turrets
+        # pick their targets together before anything moves
+        self.wake_seekers_near_active()
+        if self.arrays is not None:
+            self.targeting.acquire_array_targets(self.arrays)
+        else:
+            self.targeting.acquire_targets(self.active.values(), self.groups)
+        
+        if self.arrays is not None:
+            self.update_arrays(game_map)
+            return
+            
+        # Only active entities update; ones woken during the tick start next tick
+        for entity in list(self.active.values()):
+            if entity.is_idle():
+                # Still idle after target acquisition, so only a wake can give it work
+                self.sleep(entity)
+                continue
             entity.update(self, game_map)
             
-            # Remove dead entities
-            if entity.health <= 0:
-                self.entities.remove(entity)
+        # Units step together once everyone has updated, then attacks land together
+        self.resolve_moves()
+        self.resolve_combat()
+        
+    def queue_move(self, unit, x, y):
+        """Have unit step to (x, y) when the tick's moves are resolved, unless it would collide"""
+        self.pending_moves.append((unit, x, y))
+        
+    def resolve_moves(self):
+        """Make the tick's steps, each checked for collisions against where everything started the tick
+
+        Every step is checked before any is made, so the outcome doesn't depend
+        on the order units updated in and matches EntityArrays.step_movement.
+        """
+        moves, self.pending_moves = self.pending_moves, []
+        allowed = [(unit, x, y) for unit, x, y in moves if not unit.check_collision(x, y, self)]
+        for unit, x, y in allowed:
+            self.move_entity(unit, x, y)
+        
+    def queue_damage(self, attacker, target, damage):
+        """Have attacker hit target for damage when the tick's combat is resolved"""
+        self.combat.queue_damage(attacker, target, damage)
+        
+    def resolve_combat(self):
+        """Apply the tick's attacks, credit the kills and remove everything killed, in id order"""
+        killed, killers = self.combat.resolve(self)
+        for killer in killers:
+            self.kill_counts[(killer.is_player, killer.kind)] += 1
+        for entity in killed:
+            self.remove_entity(entity)
+            
+    def get_health(self, entities):
+        """Get the health of a list of entities as an array"""
+        if self.arrays is not None:
+            return self.arrays.health[self.arrays.get_rows(entities)]
+        return np.fromiter((entity.health for entity in entities), dtype=np.int64, count=len(entities))
+        
+    def set_health(self, entities, health):
+        """Set the health of a list of entities from an array"""
+        if self.arrays is not None:
+            self.arrays.health[self.arrays.get_rows(entities)] = health
+            return
+        for entity, value in zip(entities, health.tolist()):
+            entity.health = value
                 
-    def render(self, screen, camera_x, camera_y):
-        """Render all entities"""
+    def update_arrays(self, game_map):
+        """Update all entities using the structure-of-arrays backend"""
+        arrays = self.arrays
+        
+        # Rows still idle after target acquisition sleep until something wakes them
+        for row in arrays.get_idle_rows():
+            self.sleep(arrays.entities[row])
+            
+        # Only awake buildings and attacking units still need per-object logic
+        for row in arrays.get_rows_needing_update():
+            arrays.entities[row].update(self, game_map)
+            
+        self.update_array_movement(game_map)
+        
+        # Attacks land together once everything has moved, as with the object backend
+        self.resolve_combat()
+        
+    def update_array_movement(self, game_map):
+        """Advance all moving units in one vectorized step"""
+        arrays = self.arrays
+        moved, old_x, old_y, arrived = arrays.step_movement(game_map, self.region_pool)
+        self.array_moves = (moved, old_x, old_y)
+        
+        # Units that reached a waypoint pick up the next one; the spatial hash
+        # reads positions from the arrays, so moved rows need nothing else
+        for row in arrived.tolist():
+            arrays.entities[row].advance_waypoint()
+            
+    def get_target_id(self, entity):
+        """Get the id of an entity's live attack target, or -1"""
+        target = entity.attack_target
+        return target.id if target is not None and self.is_alive(target) else -1
+        
+    def get_snapshot(self):
+        """Get every entity's state as (metadata, {name: array}), one column per field
+
+        Units and buildings each get their own table, ordered by id, and every
+        "unit." or "building." array holds exactly one row per entity. Entities
+        refer to each other, and timers to entities, by id.
+        """
+        entities = sorted(self.entities, key=attrgetter("id"))
+        units = [entity for entity in entities if entity.kind == ENTITY_UNIT]
+        buildings = [entity for entity in entities if entity.kind == ENTITY_BUILDING]
+        arrays = {}
+        for prefix, group in (("unit", units), ("building", buildings)):
+            arrays[prefix + ".id"] = get_column(group, attrgetter("id"), np.int64)
+            arrays[prefix + ".type_id"] = get_column(group, attrgetter("type_id"), np.uint16)
+            arrays[prefix + ".is_player"] = get_column(group, attrgetter("is_player"), np.bool_)
+            arrays[prefix + ".x"] = get_column(group, attrgetter("x"), np.float64)
+            arrays[prefix + ".y"] = get_column(group, attrgetter("y"), np.float64)
+            arrays[prefix + ".health"] = get_column(group, attrgetter("health"), np.int64)
+            arrays[prefix + ".attack_ready_tick"] = get_column(group, attrgetter("attack_ready_tick"), np.int64)
+            arrays[prefix + ".attack_target"] = get_column(group, self.get_target_id, np.int64)
+            
+        # Missing targets are stored as NaN
+        nan = math.nan
+        arrays["unit.target_x"] = get_column(units, lambda unit: nan if unit.target_x is None else unit.target_x, np.float64)
+        arrays["unit.target_y"] = get_column(units, lambda unit: nan if unit.target_y is None else unit.target_y, np.float64)
+        arrays["unit.flow_x"] = get_column(units, lambda unit: nan if unit.flow_field is None else unit.flow_target[0], np.float64)
+        arrays["unit.flow_y"] = get_column(units, lambda unit: nan if unit.flow_field is None else unit.flow_target[1], np.float64)
+        
+        # Flow fields are costly to integrate, so each one in use is saved once and shared again on load
+        fields = {}
+        for unit in units:
+            if unit.flow_field is not None:
+                fields.setdefault(id(unit.flow_field), (len(fields), unit.flow_field))
+        arrays["unit.flow_field"] = get_column(
+            units, lambda unit: -1 if unit.flow_field is None else fields[id(unit.flow_field)][0], np.int32)
+        fields = [field for _, field in fields.values()]
+        arrays["flow_field.goal"] = np.array([field.goal for field in fields], dtype=np.int32).reshape(-1, 2)
+        for name in ("integration", "direction_x", "direction_y"):
+            arrays["flow_field." + name] = np.array([getattr(field, name) for field in fields])
+        arrays["unit.path_length"] = get_column(units, lambda unit: len(unit.path), np.int32)
+        arrays["path.points"] = np.array([point for unit in units for point in unit.path], dtype=np.float64).reshape(-1, 2)
+        
+        arrays["building.is_completed"] = get_column(buildings, attrgetter("is_completed"), np.bool_)
+        arrays["building.construction_started"] = get_column(buildings, attrgetter("construction_started"), np.int64)
+        arrays["building.construction_due"] = get_column(buildings, attrgetter("construction_due"), np.int64)
+        arrays["building.production"] = get_column(
+            buildings, lambda building: -1 if building.current_production is None else
+            ENTITY_TYPES.get(ENTITY_UNIT, building.current_production).type_id, np.int32)
+        arrays["building.production_started"] = get_column(buildings, attrgetter("production_started"), np.int64)
+        arrays["building.production_due"] = get_column(buildings, attrgetter("production_due"), np.int64)
+        
+        # Timers keep their heap order, so loading them back needs no re-sorting
+        events = [event for event in self.scheduler.events if self.is_alive(event[2])]
+        arrays["timer.due"] = np.array([event[0] for event in events], dtype=np.int64)
+        arrays["timer.sequence"] = np.array([event[1] for event in events], dtype=np.int64)
+        arrays["timer.entity"] = np.array([event[2].id for event in events], dtype=np.int64)
+        arrays["timer.event"] = np.array([TIMER_EVENTS.index(event[3]) for event in events], dtype=np.uint8)
+        
+        arrays["active"] = np.fromiter((entity.id for entity in self.active.values()), dtype=np.int64, count=len(self.active))
+        arrays["sleeping_seekers"] = np.fromiter((entity.id for entity in self.sleeping_seekers.values()),
+                                                 dtype=np.int64, count=len(self.sleeping_seekers))
+        
+        meta = {
+            "entity_id_counter": self.entity_id_counter,
+            "current_tick": self.scheduler.current_tick,
+            "sequence": self.scheduler.sequence,
+            "created_counts": [[is_player, kind, count] for (is_player, kind), count in self.created_counts.items()],
+            "lost_counts": [[is_player, kind, count] for (is_player, kind), count in self.lost_counts.items()],
+            "kill_counts": [[is_player, kind, count] for (is_player, kind), count in self.kill_counts.items()],
+        }
+        return meta, arrays
+        
+    def load_snapshot(self, meta, arrays, add_flow_field=None):
+        """Replace every entity with the state from get_snapshot
+
+        add_flow_field, if given, is called with each flow field units were following,
+        e.g. to put it back in a FlowFieldCache.
+        """
+        self.clear()
+        units = self.load_entities(ENTITY_UNIT, "unit", arrays)
+        buildings = self.load_entities(ENTITY_BUILDING, "building", arrays)
+        # Every saved reference is to an entity in the save, so a local table answers them all
+        by_id = dict(zip(arrays["unit.id"].tolist() + arrays["building.id"].tolist(), units + buildings))
+                
+        fields = [FlowField.from_arrays(tuple(goal), integration, direction_x, direction_y)
+                  for goal, integration, direction_x, direction_y in zip(
+                      arrays["flow_field.goal"].tolist(), arrays["flow_field.integration"],
+                      arrays["flow_field.direction_x"], arrays["flow_field.direction_y"])]
+        if add_flow_field is not None:
+            for field in fields:
+                add_flow_field(field)
+                
+        path_points = [tuple(point) for point in arrays["path.points"].tolist()]
+        path_start = 0
+        if self.arrays is not None:
+            # Move targets go straight into their columns; NaN marks a unit without one
+            rows = self.arrays.get_rows(units)
+            self.arrays.target_x[rows] = np.nan_to_num(arrays["unit.target_x"])
+            self.arrays.target_y[rows] = np.nan_to_num(arrays["unit.target_y"])
+            self.arrays.has_target[rows] = ~np.isnan(arrays["unit.target_x"])
+        unit_columns = zip(units, arrays["unit.attack_target"].tolist(),
+                           arrays["unit.target_x"].tolist(), arrays["unit.target_y"].tolist(),
+                           arrays["unit.flow_x"].tolist(), arrays["unit.flow_y"].tolist(),
+                           arrays["unit.flow_field"].tolist(), arrays["unit.path_length"].tolist())
+        for unit, target_id, target_x, target_y, flow_x, flow_y, field_index, path_length in unit_columns:
+            if self.arrays is None:
+                unit.target_x = None if math.isnan(target_x) else target_x
+                unit.target_y = None if math.isnan(target_y) else target_y
+            if target_id >= 0:
+                unit.attack_target = by_id[target_id]
+            unit.path = path_points[path_start:path_start + path_length]
+            path_start += path_length
+            if field_index >= 0:
+                unit.flow_target = (flow_x, flow_y)
+                unit.flow_field = fields[field_index]
+            else:
+                unit.flow_target = None
+                unit.flow_field = None
+                
+        building_columns = zip(buildings, arrays["building.attack_target"].tolist(),
+                               arrays["building.is_completed"].tolist(), arrays["building.construction_started"].tolist(),
+                               arrays["building.construction_due"].tolist(), arrays["building.production"].tolist(),
+                               arrays["building.production_started"].tolist(), arrays["building.production_due"].tolist())
+        for (building, target_id, is_completed, construction_started, construction_due,
+             production, production_started, production_due) in building_columns:
+            building.attack_target = None if target_id < 0 else by_id[target_id]
+            building.scheduler = self.scheduler
+            building.is_completed = is_completed
+            building.construction_started = construction_started
+            building.construction_due = construction_due
+            building.current_production = None if production < 0 else ENTITY_TYPES.get_by_id(production).name
+            building.production_started = production_started
+            building.production_due = production_due
+            
+        self.scheduler.current_tick = meta["current_tick"]
+        self.scheduler.sequence = meta["sequence"]
+        self.scheduler.events = [
+            (due, sequence, by_id[entity_id], TIMER_EVENTS[event])
+            for due, sequence, entity_id, event in zip(arrays["timer.due"].tolist(), arrays["timer.sequence"].tolist(),
+                                                       arrays["timer.entity"].tolist(), arrays["timer.event"].tolist())]
+        heapq.heapify(self.scheduler.events)
+        
+        # Entities were added asleep; put the saved active set back in its order
+        self.active = {}
+        for entity_id in arrays["active"].tolist():
+            entity = by_id[entity_id]
+            self.active[entity.handle] = entity
+        if self.arrays is not None:
+            self.arrays.awake[self.arrays.get_rows(list(self.active.values()))] = True
+        else:
+            for entity in self.active.values():
+                entity.awake = True
+        self.sleeping_seekers = {}
+        for entity_id in arrays["sleeping_seekers"].tolist():
+            entity = by_id[entity_id]
+            self.sleeping_seekers[entity.handle] = entity
+        self.sleeper_positions = None
+        
+        self.entity_id_counter = meta["entity_id_counter"]
+        for is_player, kind, count in meta["created_counts"]:
+            self.created_counts[(is_player, kind)] = count
+        for is_player, kind, count in meta["lost_counts"]:
+            self.lost_counts[(is_player, kind)] = count
+        for is_player, kind, count in meta.get("kill_counts", ()):
+            self.kill_counts[(is_player, kind)] = count
+        
+    def load_entities(self, kind, prefix, arrays):
+        """Create and index one kind of entity from its snapshot table, asleep; returns them in table order
+
+        With EntityArrays, the rows are filled column by column in one go
+        instead of entity by entity.
+        """
+        ids = arrays[prefix + ".id"].tolist()
+        type_ids = arrays[prefix + ".type_id"]
+        is_player = arrays[prefix + ".is_player"].tolist()
+        if self.arrays is not None:
+            entity_class = ArrayUnit if kind == ENTITY_UNIT else ArrayBuilding
+            entities = self.arrays.add_rows(entity_class, type_ids, {
+                name: arrays[prefix + "." + name] for name in ("id", "is_player", "x", "y", "health", "attack_ready_tick")})
+        else:
+            entities = []
+            columns = zip(ids, type_ids.tolist(), is_player, arrays[prefix + ".x"].tolist(), arrays[prefix + ".y"].tolist(),
+                          arrays[prefix + ".health"].tolist(), arrays[prefix + ".attack_ready_tick"].tolist())
+            for entity_id, type_id, entity_is_player, x, y, health, attack_ready_tick in columns:
+                entity = self.make_entity(kind, entity_id, ENTITY_TYPES.get_by_id(type_id).name, 0, 0, entity_is_player)
+                entity.x = x
+                entity.y = y
+                entity.health = health
+                entity.attack_ready_tick = attack_ready_tick
+                entities.append(entity)
+                
+        # The same indexing as add_entity, reading ids and teams from the table rather than the entities
+        insert = self.slots.insert
+        for entity, entity_id, entity_is_player in zip(entities, ids, is_player):
+            handle = insert(entity)
+            entity.handle = handle
+            entity.manager = self
+            self.ids[entity_id] = handle
+            self.groups[(entity_is_player, kind)][handle] = entity
+            self.spatial_hash.insert(entity)
+        return entities
+        
+    def get_state_checksum(self):
+        """Get a CRC of every entity's id, position and health, to check two runs stayed in step"""
+        state = np.array([(entity.id, entity.x, entity.y, entity.health)
+                          for entity in sorted(self.entities, key=attrgetter("id"))], dtype=np.float64)
+        return zlib.crc32(state.tobytes())
+        
+    def get_previous_positions(self):
+        """Get {handle: (x, y)} of where every entity that moved in the last tick started it"""
+        if self.previous_positions is None:
+            self.previous_positions = dict(self.moved_from)
+            if self.array_moves is not None:
+                rows, old_x, old_y = self.array_moves
+                entities = self.arrays.entities
+                for row, x, y in zip(rows.tolist(), old_x.tolist(), old_y.tolist()):
+                    # Units killed after moving have already given up their row
+                    if entities[row] is not None:
+                        self.previous_positions[entities[row].handle] = (x, y)
+        return self.previous_positions
+        
+    def get_render_position(self, entity, interpolation=1.0):
+        """Get an entity's position interpolation of the way from the previous tick to the current one"""
+        start = self.get_previous_positions().get(entity.handle)
+        if start is None:
+            return entity.x, entity.y
+        return (start[0] + (entity.x - start[0]) * interpolation,
+                start[1] + (entity.y - start[1]) * interpolation)
+        
+    def render(self, screen, camera_x, camera_y, interpolation=1.0):
+        """Render all entities, interpolated between the last two ticks"""
         # Sort entities by y position for proper z-ordering
         sorted_entities = sorted(self.entities, key=lambda e: e.y)
         
         for entity in sorted_entities:
-            entity.render(screen, camera_x, camera_y) 
\ No newline at end of file
+            render_x, render_y = self.get_render_position(entity, interpolation)
+            # Shift the camera rather than the entity so it draws at its interpolated position
+            entity.render(screen, camera_x + entity.x - render_x, camera_y + entity.y - render_y) 
\ No newline at end of file
@@ -0,0 +1,116 @@
+import json
+import os
+from game.constants import TILE_SIZE, ENTITY_UNIT, ENTITY_BUILDING
+
+# Unit and building stats, one entry per type name under its kind
+ENTITY_TYPES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "entity_types.json")
+
+# Stats a type gets when its data entry leaves them out
+BASE_STATS = {
+    "max_health": 100,
+    "radius": 16,
+    "width": 1,
+    "height": 1,
+    "can_move": False,
+    "can_attack": False,
+    "attack_damage": 0,
+    "attack_range": 0,
+    "attack_cooldown_max": 60,  # 1 second at 60 FPS
+    "move_speed": 0.0,
+    "production_options": (),
+    "production_time": 0,
+    "construction_time": 500,  # 0.2% per tick
+    "symbol": "",
+}
+KIND_STATS = {
+    ENTITY_UNIT: {"can_move": True, "move_speed": 2.0},
+    ENTITY_BUILDING: {},
+}
+
+class EntityType:
+    """Stats shared by every entity of one type"""
+
+    __slots__ = ("type_id", "name", "kind") + tuple(BASE_STATS)
+
+    def __init__(self, type_id, name, kind, stats):
+        self.type_id = type_id
+        self.name = name
+        self.kind = kind
+        for stat, value in stats.items():
+            setattr(self, stat, value)
+
+class EntityTypeRegistry:
+    """Entity types by kind and name, each with a small integer id"""
+
+    def __init__(self):
+        self.types = []  # Indexed by type id
+        self.data_stats = []  # Stats each type was added with, as given in the data file, indexed by type id
+        self.by_name = {ENTITY_UNIT: {}, ENTITY_BUILDING: {}}
+
+    @classmethod
+    def load(cls, path=ENTITY_TYPES_PATH):
+        """Build a registry from a JSON file of {kind: {type name: stats}}"""
+        with open(path) as f:
+            data = json.load(f)
+
+        registry = cls()
+        for kind, types in data.items():
+            if kind not in registry.by_name:
+                raise ValueError(f"Unknown entity kind {kind!r} in {path}")
+            for name, stats in types.items():
+                registry.add(kind, name, stats)
+        return registry
+
+    def add(self, kind, name, stats):
+        """Register a type, filling in missing stats; returns its EntityType"""
+        entity_type = EntityType(len(self.types), name, kind, self.normalize(kind, name, stats))
+        self.types.append(entity_type)
+        self.data_stats.append(dict(stats))
+        self.by_name[kind][name] = entity_type
+        return entity_type
+
+    def override(self, kind, name, stats):
+        """Change a type's stats in place as if its data entry had them; returns the previous values
+
+        Overrides are laid out like the data file, so building sizes are in
+        tiles and a building's radius follows its new size unless it is given.
+        """
+        entity_type = self.get(kind, name)
+        merged = self.normalize(kind, name, {**self.data_stats[entity_type.type_id], **stats})
+        previous = {stat: getattr(entity_type, stat) for stat in merged}
+        for stat, value in merged.items():
+            setattr(entity_type, stat, value)
+        return previous
+
+    def normalize(self, kind, name, stats):
+        """Get the full stats of a type from its data entry"""
+        unknown = set(stats) - set(BASE_STATS)
+        if unknown:
+            raise ValueError(f"Unknown stats {sorted(unknown)} for {kind} type {name!r}")
+
+        merged = {**BASE_STATS, **KIND_STATS[kind], **stats}
+        merged["production_options"] = tuple(merged["production_options"])
+        if kind == ENTITY_BUILDING:
+            # Buildings are sized in tiles and collide as a circle around their footprint
+            merged["width"] *= TILE_SIZE
+            merged["height"] *= TILE_SIZE
+            if "radius" not in stats:
+                merged["radius"] = int(max(merged["width"], merged["height"]) / 2)
+        else:
+            merged["width"] = merged["height"] = TILE_SIZE
+        if not merged["symbol"]:
+            merged["symbol"] = name[:1].upper()
+        return merged
+
+    def get(self, kind, name):
+        """Get a type by kind and name"""
+        try:
+            return self.by_name[kind][name]
+        except KeyError:
+            raise ValueError(f"Unknown {kind} type {name!r}") from None
+
+    def get_by_id(self, type_id):
+        """Get a type by its integer id"""
+        return self.types[type_id]
+
+ENTITY_TYPES = EntityTypeRegistry.load()
@@ -0,0 +1,87 @@
+import numpy as np
+
+# Occupied-cell ranges up to this size are indexed with a dense lookup table
+DENSE_TABLE_MIN_CELLS = 65536
+
+# Below this many query x point combinations, pairing everything beats bucketing
+ALL_PAIRS_MAX = 1024
+
+def neighbor_pairs(query_x, query_y, point_x, point_y, cell_size):
+    """Get every (query, point) index pair whose positions share or touch a grid cell
+
+    Positions are bucketed into square cells of cell_size, so any two positions
+    closer than cell_size on both axes are guaranteed to appear as a pair, in no
+    particular order. Small inputs skip the grid and get every pair, so callers
+    must still check distances.
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if len(query_x) == 0 or len(point_x) == 0:
+        return empty, empty
+    if len(query_x) * len(point_x) <= ALL_PAIRS_MAX:
+        return (np.repeat(np.arange(len(query_x), dtype=np.int64), len(point_x)),
+                np.tile(np.arange(len(point_x), dtype=np.int64), len(query_x)))
+
+    point_cx = np.floor_divide(point_x, cell_size).astype(np.int64)
+    point_cy = np.floor_divide(point_y, cell_size).astype(np.int64)
+    query_cx = np.floor_divide(query_x, cell_size).astype(np.int64)
+    query_cy = np.floor_divide(query_y, cell_size).astype(np.int64)
+
+    # Flatten cell coordinates into sortable keys over the occupied cell range, y varying fastest
+    min_cx = point_cx.min()
+    min_cy = point_cy.min()
+    span_x = point_cx.max() - min_cx + 1
+    span_y = point_cy.max() - min_cy + 1
+    point_keys = (point_cx - min_cx) * span_y + (point_cy - min_cy)
+    order = np.argsort(point_keys)
+
+    # Look cell ranges up in a dense table when the occupied area is small enough,
+    # otherwise binary search the sorted keys
+    cell_count = span_x * span_y
+    use_dense = cell_count <= 4 * len(point_x) + DENSE_TABLE_MIN_CELLS
+    query_order = None
+    if use_dense:
+        cell_sizes = np.bincount(point_keys, minlength=cell_count)
+        cell_ends = np.cumsum(cell_sizes)
+        cell_starts = cell_ends - cell_sizes
+    else:
+        sorted_keys = point_keys[order]
+        # Searching for keys in ascending order is several times faster, so go through the queries by cell
+        query_order = np.argsort((query_cx - min_cx) * span_y + (query_cy - min_cy))
+        query_cx = query_cx[query_order]
+        query_cy = query_cy[query_order]
+
+    # A query's three neighbouring cells in one column have consecutive keys,
+    # so each column is a single range of the sorted points; columns and rows
+    # off the occupied range count nothing
+    low_y = np.clip(query_cy - 1 - min_cy, 0, span_y - 1)
+    high_y = np.clip(query_cy + 1 - min_cy, 0, span_y - 1)
+    rows_valid = (query_cy + 1 - min_cy >= 0) & (query_cy - 1 - min_cy < span_y)
+    starts = []
+    counts = []
+    for offset_x in (-1, 0, 1):
+        cell_x = query_cx + offset_x - min_cx
+        valid = rows_valid & (cell_x >= 0) & (cell_x < span_x)
+        column = np.clip(cell_x, 0, span_x - 1) * span_y
+        if use_dense:
+            low = cell_starts[column + low_y]
+            high = cell_ends[column + high_y]
+        else:
+            low = np.searchsorted(sorted_keys, column + low_y, side="left")
+            high = np.searchsorted(sorted_keys, column + high_y, side="right")
+        starts.append(low)
+        counts.append(np.where(valid, high - low, 0))
+
+    starts = np.concatenate(starts)
+    counts = np.concatenate(counts)
+    total = int(counts.sum())
+    if total == 0:
+        return empty, empty
+
+    # Expand each (query, column) range into individual pairs
+    query_index = np.arange(len(query_x), dtype=np.int64)
+    if query_order is not None:
+        query_index = query_order
+    pair_query = np.repeat(np.tile(query_index, 3), counts)
+    range_begin = np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.repeat(starts, counts) + (np.arange(total) - range_begin)
+    return pair_query, order[positions]
@@ -0,0 +1,68 @@
+import multiprocessing
+import numpy as np
+from game.entities.shared_arrays import SharedArrays, attach_arrays
+from game.entities.entity_arrays import propose_moves, find_collisions
+
+def _step_region(layout, size, movers, reach):
+    """Worker: propose one region's moves and check them for collisions, writing results to the step.* arrays"""
+    arrays = attach_arrays(layout)
+    x, y, radius = arrays["x"], arrays["y"], arrays["radius"]
+    new_x, new_y = propose_moves(x, y, arrays["target_x"], arrays["target_y"], arrays["move_speed"], movers)
+
+    # Only entities within collision reach of the region can block its movers, wherever their own region is
+    others = np.flatnonzero(arrays["alive"][:size])
+    others_x = x[others]
+    others_y = y[others]
+    others = others[(others_x >= new_x.min() - reach) & (others_x <= new_x.max() + reach) &
+                    (others_y >= new_y.min() - reach) & (others_y <= new_y.max() + reach)]
+    arrays["step.x"][movers] = new_x
+    arrays["step.y"][movers] = new_y
+    arrays["step.blocked"][movers] = find_collisions(x, y, radius, others, movers, new_x, new_y)
+
+class RegionPool:
+    """Steps moving units region by region in a pool of worker processes
+
+    Movers are split into strips along x holding equal numbers of them, one per
+    worker. Workers read the entity columns straight from shared memory and
+    check their movers against every entity from the start of the step,
+    including ones across the strip border. Each writes its results only to its
+    own movers' rows of shared step arrays, so merging is reading them back and
+    the outcome is exactly that of the single-process step.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = None
+        self.scratch = SharedArrays()  # step.x, step.y and step.blocked, one row per entity row
+        self.scratch_capacity = 0
+
+    def step_movers(self, arrays, movers):
+        """Get (new_x, new_y, collided) for movers, like propose_moves and EntityArrays.find_blocked"""
+        if arrays.shared is None:
+            raise ValueError("Region workers need entity arrays in shared memory")
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers)
+        if self.scratch_capacity < arrays.capacity:
+            self.scratch.allocate("step.x", np.float64, arrays.capacity)
+            self.scratch.allocate("step.y", np.float64, arrays.capacity)
+            self.scratch.allocate("step.blocked", np.bool_, arrays.capacity)
+            self.scratch.release_replaced()
+            self.scratch_capacity = arrays.capacity
+
+        # Boxes of two entities can only overlap within twice the largest radius, plus the pixel lost to truncation
+        reach = 2 * int(arrays.radius[:arrays.size].max()) + 2
+        layout = {**arrays.shared.get_layout(), **self.scratch.get_layout()}
+        regions = np.array_split(movers[np.argsort(arrays.x[movers], kind="stable")], self.workers)
+        self.pool.starmap(_step_region, [(layout, arrays.size, region, reach) for region in regions if len(region)])
+
+        scratch = {name: array for name, (_, array) in self.scratch.blocks.items()}
+        return scratch["step.x"][movers], scratch["step.y"][movers], scratch["step.blocked"][movers]
+
+    def close(self):
+        """Stop the workers and free the shared step arrays"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.scratch.close()
+        self.scratch_capacity = 0
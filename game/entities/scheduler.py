@@ -0,0 +1,35 @@
+import heapq
+
+class Scheduler:
+    """Tick clock with a priority queue of timed entity events
+
+    Entities schedule an event for the tick it becomes due instead of counting
+    down every tick, so nothing is spent on them until then.
+    """
+
+    def __init__(self):
+        self.current_tick = 0
+        self.events = []  # Heap of (due tick, sequence, entity, event name)
+        self.sequence = 0  # Keeps events due on the same tick in scheduling order
+
+    def clear(self):
+        """Drop every pending event and restart the clock"""
+        self.current_tick = 0
+        self.events = []
+        self.sequence = 0
+
+    def schedule(self, delay, entity, event):
+        """Schedule an event for an entity delay ticks from now; returns the due tick"""
+        due = self.current_tick + max(1, delay)
+        heapq.heappush(self.events, (due, self.sequence, entity, event))
+        self.sequence += 1
+        return due
+
+    def advance(self):
+        """Move the clock on one tick and return the (entity, event) pairs that fell due"""
+        self.current_tick += 1
+        due = []
+        while self.events and self.events[0][0] <= self.current_tick:
+            _, _, entity, event = heapq.heappop(self.events)
+            due.append((entity, event))
+        return due
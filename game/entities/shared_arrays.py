@@ -0,0 +1,68 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+class SharedArrays:
+    """Named 1-D NumPy arrays backed by shared memory blocks, which worker processes map by block name"""
+
+    def __init__(self):
+        self.blocks = {}  # Array name -> (SharedMemory, array)
+        self.replaced = []  # Blocks of reallocated arrays, released once nothing refers to them
+
+    def allocate(self, name, dtype, length):
+        """Create a zeroed array in a new block; a previous array of that name stays valid until release_replaced()"""
+        dtype = np.dtype(dtype)
+        block = shared_memory.SharedMemory(create=True, size=max(1, dtype.itemsize * length))
+        array = np.ndarray(length, dtype=dtype, buffer=block.buf)
+        array[:] = 0
+        if name in self.blocks:
+            self.replaced.append(self.blocks[name][0])
+        self.blocks[name] = (block, array)
+        return array
+
+    def get_layout(self):
+        """Describe every array as {name: (block name, dtype, length)} for attach_arrays"""
+        return {name: (block.name, array.dtype.str, len(array)) for name, (block, array) in self.blocks.items()}
+
+    def release_replaced(self):
+        """Free the blocks of arrays that have been reallocated"""
+        replaced, self.replaced = self.replaced, []
+        for block in replaced:
+            _release(block, unlink=True)
+
+    def close(self):
+        """Free every block; the arrays must not be used afterwards"""
+        blocks = [block for block, _ in self.blocks.values()]
+        self.blocks = {}
+        for block in blocks:
+            _release(block, unlink=True)
+        self.release_replaced()
+
+def _release(block, unlink):
+    if unlink:
+        block.unlink()
+    try:
+        block.close()
+    except BufferError:
+        # An array over the block is still referenced; the mapping goes away with it
+        pass
+
+# Blocks this process has mapped: block name -> (SharedMemory, array)
+_attached = {}
+
+def attach_arrays(layout):
+    """Map arrays described by SharedArrays.get_layout into this process, reusing earlier mappings"""
+    arrays = {}
+    for name, (block_name, dtype, length) in layout.items():
+        entry = _attached.get(block_name)
+        if entry is None:
+            block = shared_memory.SharedMemory(name=block_name)
+            entry = (block, np.ndarray(length, dtype=dtype, buffer=block.buf))
+            _attached[block_name] = entry
+        arrays[name] = entry[1]
+
+    # Unmap blocks the owner has since replaced
+    current = {block_name for block_name, _, _ in layout.values()}
+    for block_name in [block_name for block_name in _attached if block_name not in current]:
+        block = _attached.pop(block_name)[0]
+        _release(block, unlink=False)
+    return arrays
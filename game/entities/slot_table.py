@@ -0,0 +1,74 @@
+class SlotTable:
+    """Generational slot table over a dense list of items
+
+    Every item gets a (slot, generation) handle. Removing an item bumps its slot's
+    generation, so old handles stop resolving even after the slot is reused, and
+    the last item is swapped into its place in the dense list. Lookups, liveness
+    checks and removal are all O(1).
+    """
+
+    def __init__(self):
+        self.items = []  # Dense list of live items, in no particular order after removals
+        self.item_slots = []  # Dense index -> slot
+        self.slot_indices = []  # Slot -> dense index, or -1 when free
+        self.generations = []  # Slot -> current generation
+        self.free_slots = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def insert(self, item):
+        """Store an item and return its (slot, generation) handle"""
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = len(self.generations)
+            self.generations.append(0)
+            self.slot_indices.append(-1)
+        self.slot_indices[slot] = len(self.items)
+        self.items.append(item)
+        self.item_slots.append(slot)
+        return (slot, self.generations[slot])
+
+    def is_alive(self, handle):
+        """Check if a handle still refers to a stored item"""
+        slot, generation = handle
+        return self.generations[slot] == generation and self.slot_indices[slot] != -1
+
+    def get(self, handle):
+        """Get the item behind a handle, or None if it was removed"""
+        if not self.is_alive(handle):
+            return None
+        return self.items[self.slot_indices[handle[0]]]
+
+    def remove(self, handle):
+        """Remove the item behind a handle; returns False if it was already gone"""
+        if not self.is_alive(handle):
+            return False
+        slot = handle[0]
+        index = self.slot_indices[slot]
+
+        # Fill the hole with the last item
+        last_item = self.items.pop()
+        last_slot = self.item_slots.pop()
+        if last_slot != slot:
+            self.items[index] = last_item
+            self.item_slots[index] = last_slot
+            self.slot_indices[last_slot] = index
+
+        self.slot_indices[slot] = -1
+        self.generations[slot] += 1
+        self.free_slots.append(slot)
+        return True
+
+    def clear(self):
+        """Remove every item, invalidating all outstanding handles"""
+        for slot in self.item_slots:
+            self.slot_indices[slot] = -1
+            self.generations[slot] += 1
+            self.free_slots.append(slot)
+        self.items.clear()
+        self.item_slots.clear()
@@ -0,0 +1,144 @@
+import numpy as np
+from game.constants import SPATIAL_CELL_SIZE
+
+class SpatialHash:
+    """Uniform grid that buckets entities by the cells their bounding box covers"""
+
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        # Cell range (x0, y0, x1, y1) each entity currently occupies, keyed by id
+        self.entity_cells = {}
+
+    def clear(self):
+        """Remove all entities from the hash"""
+        self.cells = {}
+        self.entity_cells = {}
+
+    def get_cell_range(self, left, top, right, bottom):
+        """Get the inclusive cell range covered by a world-space box"""
+        size = self.cell_size
+        return (int(left // size), int(top // size), int(right // size), int(bottom // size))
+
+    def get_entity_cell_range(self, entity):
+        """Get the cell range covered by an entity's collision box"""
+        return self.get_cell_range(
+            entity.x - entity.radius,
+            entity.y - entity.radius,
+            entity.x + entity.radius,
+            entity.y + entity.radius
+        )
+
+    def insert(self, entity):
+        """Add an entity to every cell its collision box overlaps"""
+        cell_range = self.get_entity_cell_range(entity)
+        self.entity_cells[entity.id] = cell_range
+        self._add_to_cells(entity, cell_range)
+
+    def remove(self, entity):
+        """Remove an entity from the hash"""
+        cell_range = self.entity_cells.pop(entity.id, None)
+        if cell_range is not None:
+            self._remove_from_cells(entity, cell_range)
+
+    def update(self, entity):
+        """Re-bucket an entity after it moved, touching the grid only if its cells changed"""
+        old_range = self.entity_cells.get(entity.id)
+        new_range = self.get_entity_cell_range(entity)
+        if old_range == new_range:
+            return
+
+        if old_range is not None:
+            self._remove_from_cells(entity, old_range)
+        self.entity_cells[entity.id] = new_range
+        self._add_to_cells(entity, new_range)
+
+    def query_point(self, x, y):
+        """Get the entities bucketed in the cell containing a point"""
+        bucket = self.cells.get((int(x // self.cell_size), int(y // self.cell_size)))
+        if not bucket:
+            return []
+        return list(bucket.values())
+
+    def query_rect(self, left, top, right, bottom):
+        """Get the entities bucketed in any cell overlapping a world-space box"""
+        x0, y0, x1, y1 = self.get_cell_range(left, top, right, bottom)
+
+        # A single cell needs no de-duplication
+        if x0 == x1 and y0 == y1:
+            bucket = self.cells.get((x0, y0))
+            return list(bucket.values()) if bucket else []
+
+        found = {}
+        for cell_x in range(x0, x1 + 1):
+            for cell_y in range(y0, y1 + 1):
+                bucket = self.cells.get((cell_x, cell_y))
+                if bucket:
+                    found.update(bucket)
+        return list(found.values())
+
+    def _add_to_cells(self, entity, cell_range):
+        x0, y0, x1, y1 = cell_range
+        for cell_x in range(x0, x1 + 1):
+            for cell_y in range(y0, y1 + 1):
+                bucket = self.cells.get((cell_x, cell_y))
+                if bucket is None:
+                    bucket = {}
+                    self.cells[(cell_x, cell_y)] = bucket
+                bucket[entity.id] = entity
+
+    def _remove_from_cells(self, entity, cell_range):
+        x0, y0, x1, y1 = cell_range
+        for cell_x in range(x0, x1 + 1):
+            for cell_y in range(y0, y1 + 1):
+                bucket = self.cells.get((cell_x, cell_y))
+                if bucket is not None:
+                    bucket.pop(entity.id, None)
+                    # Drop empty cells so the dict only holds occupied space
+                    if not bucket:
+                        del self.cells[(cell_x, cell_y)]
+
+class ArraySpatialHash:
+    """SpatialHash stand-in for entities stored in EntityArrays, answered straight from its columns
+
+    The vectorized movement step writes positions into the arrays in bulk, so
+    instead of buckets that would need re-filling one entity at a time this
+    masks the position columns once per query. Adding, moving and removing
+    entities cost nothing here; the queries are only made for player input.
+    """
+
+    def __init__(self, arrays, cell_size=SPATIAL_CELL_SIZE):
+        self.arrays = arrays
+        self.cell_size = cell_size
+
+    def clear(self):
+        """Nothing is stored apart from the arrays themselves"""
+        pass
+
+    def insert(self, entity):
+        pass
+
+    def remove(self, entity):
+        pass
+
+    def update(self, entity):
+        pass
+
+    def query_point(self, x, y):
+        """Get the entities whose collision box holds a point"""
+        return self.query_rect(x, y, x, y)
+
+    def query_rect(self, left, top, right, bottom):
+        """Get the entities whose collision box overlaps a world-space box
+
+        Boxes are widened by a pixel so nothing pygame.Rect's truncation would
+        still count as touching is missed.
+        """
+        arrays = self.arrays
+        size = arrays.size
+        x = arrays.x[:size]
+        y = arrays.y[:size]
+        reach = arrays.radius[:size] + 1
+        rows = np.flatnonzero(arrays.alive[:size] & (x + reach >= left) & (x - reach <= right) &
+                              (y + reach >= top) & (y - reach <= bottom))
+        return [arrays.entities[row] for row in rows.tolist()]
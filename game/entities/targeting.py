@@ -0,0 +1,144 @@
+import numpy as np
+from game.entities.grid_query import neighbor_pairs
+from game.constants import AUTO_ACQUIRE_RANGE, ENTITY_UNIT, ENTITY_BUILDING
+
+class TargetAcquisition:
+    """Nearest-hostile queries answered for every seeker in one batch per tick
+
+    Each tick the positions of every team are bucketed into a grid whose cells
+    are as large as the longest search range, so one pass over the neighbouring
+    cells finds every candidate for every seeker of the opposing team at once.
+    With the EntityArrays backend, seekers and hostiles are picked with masks
+    over its columns instead of a check per entity.
+    """
+
+    def needs_target(self, entity):
+        """Check if an entity should look for something to attack this tick"""
+        if not entity.can_attack or entity.health <= 0 or entity.attack_target is not None:
+            return False
+        # Turrets always search; units only while they have no orders
+        return not entity.can_move or entity.target_x is None
+
+    def get_search_range(self, entity):
+        """Get how far an entity looks for hostiles"""
+        if entity.can_move:
+            return max(entity.attack_range, AUTO_ACQUIRE_RANGE)
+        return entity.attack_range
+
+    def get_search_ranges(self, attack_range, can_move):
+        """Get get_search_range for arrays of attack ranges and can_move flags"""
+        return np.where(can_move, np.maximum(attack_range, AUTO_ACQUIRE_RANGE), attack_range)
+
+    def acquire_targets(self, candidates, groups):
+        """Give every idle unit and turret among candidates the nearest hostile within its search range
+
+        groups is EntityManager.groups, so hostiles come straight from the other
+        team's entries instead of a scan over every entity.
+        """
+        seekers = [entity for entity in candidates if self.needs_target(entity)]
+        if not seekers:
+            return
+
+        for is_player in (True, False):
+            team_seekers = [entity for entity in seekers if entity.is_player == is_player]
+            if not team_seekers:
+                continue
+            hostiles = [entity for kind in (ENTITY_UNIT, ENTITY_BUILDING)
+                        for entity in groups[(not is_player, kind)].values() if entity.health > 0]
+            targets = self.find_nearest(team_seekers, hostiles)
+            for seeker, target in zip(team_seekers, targets):
+                if target is not None:
+                    seeker.set_attack_target(target)
+
+    def acquire_array_targets(self, arrays):
+        """Do what acquire_targets does for the awake rows of an EntityArrays, reading only its columns"""
+        size = arrays.size
+        live = arrays.alive[:size] & (arrays.health[:size] > 0)
+        # The same test as needs_target, for every row at once
+        seeking = (live & arrays.awake[:size] & arrays.can_attack[:size] & ~arrays.has_attack_target[:size] &
+                   (~arrays.can_move[:size] | ~arrays.has_target[:size]))
+        seekers = np.flatnonzero(seeking)
+        if len(seekers) == 0:
+            return
+
+        for is_player in (True, False):
+            team_seekers = seekers[arrays.is_player[seekers] == is_player]
+            if len(team_seekers) == 0:
+                continue
+            hostiles = np.flatnonzero(live & (arrays.is_player[:size] != is_player))
+            ranges = self.get_search_ranges(arrays.attack_range[team_seekers], arrays.can_move[team_seekers])
+            seeker_index, hostile_index = self.match_nearest(
+                arrays.x[team_seekers], arrays.y[team_seekers], ranges,
+                arrays.x[hostiles], arrays.y[hostiles], arrays.id[hostiles])
+            for seeker, hostile in zip(team_seekers[seeker_index].tolist(), hostiles[hostile_index].tolist()):
+                arrays.entities[seeker].set_attack_target(arrays.entities[hostile])
+
+    def get_positions(self, seekers):
+        """Get (x, y, search range, is_player) arrays for a list of seekers"""
+        count = len(seekers)
+        return (np.fromiter((entity.x for entity in seekers), dtype=np.float64, count=count),
+                np.fromiter((entity.y for entity in seekers), dtype=np.float64, count=count),
+                np.fromiter((self.get_search_range(entity) for entity in seekers), dtype=np.float64, count=count),
+                np.fromiter((entity.is_player for entity in seekers), dtype=np.bool_, count=count))
+
+    def find_seekers_in_range(self, seeker_positions, other_positions):
+        """Get indices of seekers with a hostile strictly within their search range
+
+        seeker_positions comes from get_positions, so it can be cached between
+        ticks; other_positions holds (x, y, is_player) arrays of the entities to
+        look for.
+        """
+        seeker_x, seeker_y, ranges, seeker_teams = seeker_positions
+        other_x, other_y, other_teams = other_positions
+        if len(seeker_x) == 0 or len(other_x) == 0:
+            return []
+
+        pair_seeker, pair_other = neighbor_pairs(seeker_x, seeker_y, other_x, other_y, max(float(ranges.max()), 1.0))
+        distance = np.hypot(other_x[pair_other] - seeker_x[pair_seeker], other_y[pair_other] - seeker_y[pair_seeker])
+        found = (seeker_teams[pair_seeker] != other_teams[pair_other]) & (distance < ranges[pair_seeker])
+        return np.unique(pair_seeker[found]).tolist()
+
+    def find_nearest(self, seekers, hostiles):
+        """Get the nearest hostile strictly within each seeker's search range, or None"""
+        nearest = [None] * len(seekers)
+        if not hostiles:
+            return nearest
+
+        seeker_x = np.fromiter((entity.x for entity in seekers), dtype=np.float64, count=len(seekers))
+        seeker_y = np.fromiter((entity.y for entity in seekers), dtype=np.float64, count=len(seekers))
+        ranges = np.fromiter((self.get_search_range(entity) for entity in seekers), dtype=np.float64, count=len(seekers))
+        hostile_x = np.fromiter((entity.x for entity in hostiles), dtype=np.float64, count=len(hostiles))
+        hostile_y = np.fromiter((entity.y for entity in hostiles), dtype=np.float64, count=len(hostiles))
+        hostile_ids = np.fromiter((entity.id for entity in hostiles), dtype=np.int64, count=len(hostiles))
+        seeker_index, hostile_index = self.match_nearest(seeker_x, seeker_y, ranges, hostile_x, hostile_y, hostile_ids)
+        for seeker, hostile in zip(seeker_index.tolist(), hostile_index.tolist()):
+            nearest[seeker] = hostiles[hostile]
+        return nearest
+
+    def match_nearest(self, seeker_x, seeker_y, ranges, hostile_x, hostile_y, hostile_ids):
+        """Pair each seeker with the nearest hostile strictly within its range; returns (seeker indices, hostile indices)
+
+        Ties go to the hostile with the lowest id, so the result doesn't depend
+        on the order either list is in. Seekers with nothing in range are left out.
+        """
+        empty = np.zeros(0, dtype=np.int64)
+        if len(seeker_x) == 0 or len(hostile_x) == 0:
+            return empty, empty
+
+        # Cells as wide as the longest range keep every candidate in a neighbouring cell
+        cell_size = max(float(ranges.max()), 1.0)
+        pair_seeker, pair_hostile = neighbor_pairs(seeker_x, seeker_y, hostile_x, hostile_y, cell_size)
+        distance = np.hypot(hostile_x[pair_hostile] - seeker_x[pair_seeker], hostile_y[pair_hostile] - seeker_y[pair_seeker])
+        in_range = distance < ranges[pair_seeker]
+        pair_seeker = pair_seeker[in_range]
+        pair_hostile = pair_hostile[in_range]
+        distance = distance[in_range]
+        if len(pair_seeker) == 0:
+            return empty, empty
+
+        # Sort by seeker, then distance, then id and keep each seeker's first pair
+        order = np.lexsort((hostile_ids[pair_hostile], distance, pair_seeker))
+        pair_seeker = pair_seeker[order]
+        first = np.ones(len(pair_seeker), dtype=np.bool_)
+        first[1:] = pair_seeker[1:] != pair_seeker[:-1]
+        return pair_seeker[first], pair_hostile[order][first]
@@ -1,68 +1,99 @@
 import pygame
 import math
-from game.entities.entity import Entity
+from game.entities.entity import Entity, draw_entity
+from game.constants import TILE_SIZE, ENTITY_UNIT, ARRIVAL_DISTANCE
 
 class Unit(Entity):
+    kind = ENTITY_UNIT
+    
+    __slots__ = ("target_x", "target_y", "attack_target", "path", "flow_field", "flow_target")
+    
     def __init__(self, entity_id, unit_type, x, y, is_player):
         super().__init__(entity_id, unit_type, x, y, is_player)
         
-        # Common attributes for all units
-        self.can_move = True
-        self.move_speed = 2.0
+        # Common attributes for all units; stats come from the unit's type
         self.target_x = None
         self.target_y = None
         self.attack_target = None
-        
-        # Configure unit type specific attributes
-        if unit_type == "worker":
-            self.max_health = 50
-            self.health = 50
-            self.can_attack = True
-            self.attack_damage = 5
-            self.attack_range = 20
-            self.attack_cooldown_max = 45
-            self.radius = 14
-            
-        elif unit_type == "soldier":
-            self.max_health = 100
-            self.health = 100
-            self.can_attack = True
-            self.attack_damage = 10
-            self.attack_range = 25
-            self.attack_cooldown_max = 30
-            self.radius = 16
-            
-        elif unit_type == "tank":
-            self.max_health = 200
-            self.health = 200
-            self.can_attack = True
-            self.attack_damage = 20
-            self.attack_range = 50
-            self.move_speed = 1.5
-            self.attack_cooldown_max = 60
-            self.radius = 20
+        self.path = []  # Remaining waypoints, next one last
+        self.flow_field = None  # Shared field steering a group move order
+        self.flow_target = None  # Exact point to finish on once the field's goal tile is reached
             
     def set_move_target(self, target_x, target_y):
         """Set the movement target for this unit"""
+        self.wake()
         self.target_x = target_x
         self.target_y = target_y
         self.attack_target = None  # Clear attack target when setting move target
+        self.path = []
+        self.flow_field = None
+        
+    def follow_path(self, waypoints):
+        """Walk through a list of world-space waypoints in order"""
+        self.wake()
+        self.path = list(reversed(waypoints))
+        self.advance_waypoint()
+        
+    def follow_flow_field(self, flow_field, target_x, target_y):
+        """Steer tile by tile along a shared flow field, finishing on the target point"""
+        self.wake()
+        self.path = []
+        self.flow_field = flow_field
+        self.flow_target = (target_x, target_y)
+        self.advance_waypoint()
+        
+    def advance_waypoint(self):
+        """Head for the next waypoint, or stop if the path is finished"""
+        if self.path:
+            self.target_x, self.target_y = self.path.pop()
+        elif self.flow_field is not None:
+            tile_x = int(self.x // TILE_SIZE)
+            tile_y = int(self.y // TILE_SIZE)
+            next_tile = self.flow_field.next_tile(tile_x, tile_y)
+            if next_tile is None:
+                self.stop()
+            elif next_tile == (tile_x, tile_y):
+                # On the goal tile, finish on the exact point
+                self.target_x, self.target_y = self.flow_target
+                self.flow_field = None
+            else:
+                self.target_x = (next_tile[0] + 0.5) * TILE_SIZE
+                self.target_y = (next_tile[1] + 0.5) * TILE_SIZE
+        else:
+            self.target_x = None
+            self.target_y = None
+            
+    def stop(self):
+        """Cancel all movement and attack orders"""
+        self.target_x = None
+        self.target_y = None
+        self.attack_target = None
+        self.path = []
+        self.flow_field = None
         
     def set_attack_target(self, target_entity):
         """Set an entity as the attack target"""
+        self.wake()
         self.attack_target = target_entity
+        self.path = []
+        self.flow_field = None
         self.target_x = target_entity.x
         self.target_y = target_entity.y
         
+    def is_idle(self):
+        """Units sleep once they have no move or attack order"""
+        return self.target_x is None and self.attack_target is None
+        
     def update(self, entity_manager, game_map):
         """Update unit logic"""
-        # Decrease attack cooldown if attacking
-        if self.attack_cooldown > 0:
-            self.attack_cooldown -= 1
-            
+        self.update_attack(entity_manager)
+        self.update_movement(entity_manager, game_map)
+        
+    def update_attack(self, entity_manager):
+        """Follow the attack target and hit it when in range"""
         # If has attack target, update its position or remove if dead
         if self.attack_target:
-            if self.attack_target not in entity_manager.entities:
+            if not entity_manager.is_alive(self.attack_target):
                 self.attack_target = None
             else:
                 self.target_x = self.attack_target.x
@@ -70,38 +101,39 @@ class Unit(Entity):
                 
                 # If in range, attack
                 if self.can_attack and self.distance_to(self.attack_target) <= self.attack_range:
-                    if self.attack_cooldown <= 0:
-                        # Deal damage to the target
-                        self.attack_target.apply_damage(self.attack_damage)
-                        self.attack_cooldown = self.attack_cooldown_max
+                    if self.is_attack_ready(entity_manager):
+                        # Deal damage to the target once the tick's combat is resolved
+                        entity_manager.queue_damage(self, self.attack_target, self.attack_damage)
+                        self.start_attack_cooldown(entity_manager)
                         
-        # Move towards target if not in attack range
+    def update_movement(self, entity_manager, game_map):
+        """Step towards the move target; the step is made once every unit has chosen its own"""
         if self.target_x is not None and self.target_y is not None:
-            if not self.attack_target or self.distance_to(self.attack_target) > self.attack_range:
-                # Calculate direction to target
-                dx = self.target_x - self.x
-                dy = self.target_y - self.y
-                distance = math.sqrt(dx * dx + dy * dy)
+            # Calculate direction to target
+            dx = self.target_x - self.x
+            dy = self.target_y - self.y
+            distance = math.sqrt(dx * dx + dy * dy)
+            
+            # The attack target's position was just copied into the move target; stop once it is in range
+            if self.attack_target and distance <= self.attack_range:
+                return
                 
-                # Move if not at target
-                if distance > 5:
-                    # Normalize direction
-                    dx = dx / distance
-                    dy = dy / distance
-                    
-                    # Calculate new position
-                    new_x = self.x + dx * self.move_speed
-                    new_y = self.y + dy * self.move_speed
+            # Move if not at target
+            if distance > ARRIVAL_DISTANCE:
+                # Calculate new position
+                scale = self.move_speed / distance
+                new_x = self.x + dx * scale
+                new_y = self.y + dy * scale
+                
+                # Check for impassable terrain, letting units already stuck on it walk off
+                if not game_map.is_passable(new_x, new_y) and game_map.is_passable(self.x, self.y):
+                    return
                     
-                    # Check for collisions
-                    if not self.check_collision(new_x, new_y, entity_manager):
-                        self.x = new_x
-                        self.y = new_y
-                else:
-                    # Reached target, clear it
-                    if not self.attack_target:
-                        self.target_x = None
-                        self.target_y = None
+                # Collisions are checked against where everything was at the start of the tick
+                entity_manager.queue_move(self, new_x, new_y)
+            elif not self.attack_target:
+                # Reached target, move on to the next waypoint
+                self.advance_waypoint()
     
     def check_collision(self, new_x, new_y, entity_manager):
         """Check if moving to new position would cause a collision"""
@@ -113,35 +145,24 @@ class Unit(Entity):
             self.radius * 2
         )
         
-        # Check collision with other entities
-        for entity in entity_manager.entities:
-            if entity.id != self.id:  # Don't collide with self
-                entity_rect = pygame.Rect(
-                    entity.x - entity.radius,
-                    entity.y - entity.radius,
-                    entity.radius * 2,
-                    entity.radius * 2
-                )
-                if new_rect.colliderect(entity_rect):
-                    return True
-                    
-        return False
+        # Only entities sharing a spatial hash cell with the rect can collide
+        return entity_manager.has_collision(new_rect, ignore_entity=self)
     
     def render(self, screen, camera_x, camera_y):
         """Render the unit on screen"""
-        super().render(screen, camera_x, camera_y)
-        
-        # Draw unit type-specific details
-        screen_x = int(self.x - camera_x)
-        screen_y = int(self.y - camera_y)
+        target = None
+        if self.target_x is not None and self.target_y is not None:
+            target = (int(self.target_x - camera_x), int(self.target_y - camera_y))
+        draw_unit(screen, self.stats, self.is_player, int(self.x - camera_x), int(self.y - camera_y), self.health, target)
+
+def draw_unit(screen, stats, is_player, screen_x, screen_y, health, target=None):
+    """Draw a unit centred on a screen position, with a line to its move target's screen position if it has one"""
+    draw_entity(screen, stats, is_player, screen_x, screen_y, health)
+    
+    # Only render details if on screen
+    if (screen_x >= -stats.radius and screen_x <= screen.get_width() + stats.radius and
+        screen_y >= -stats.radius and screen_y <= screen.get_height() + stats.radius):
         
-        # Only render details if on screen
-        if (screen_x >= -self.radius and screen_x <= screen.get_width() + self.radius and
-            screen_y >= -self.radius and screen_y <= screen.get_height() + self.radius):
-            
-            # Draw target line if moving
-            if self.target_x is not None and self.target_y is not None:
-                target_screen_x = int(self.target_x - camera_x)
-                target_screen_y = int(self.target_y - camera_y)
-                pygame.draw.line(screen, (200, 200, 0), (screen_x, screen_y), 
-                                (target_screen_x, target_screen_y), 1) 
\ No newline at end of file
+        # Draw target line if moving
+        if target is not None:
+            pygame.draw.line(screen, (200, 200, 0), (screen_x, screen_y), target, 1) 
@@ -0,0 +1,82 @@
+import argparse
+import time
+from game.engine import GameEngine
+from game.entities.entity_manager import EntityManager
+from game.constants import STATE_PLAYING, ENTITY_UNIT, ENTITY_BUILDING, FPS
+
+def run_headless(max_ticks, seed=None, map_path=None, setup=None, workers=0):
+    """Play one match with no display, stepping the simulation as fast as possible
+
+    The match ends when one side wins or after max_ticks ticks. setup, if given,
+    is called with the PlayingState once the match has started. workers > 0
+    switches to the array backend and steps movement by region in that many
+    processes. Returns a dict describing the run and the final state of the match.
+    """
+    engine = GameEngine(None, headless=True)
+    playing_state = engine.states[STATE_PLAYING]
+    playing_state.map_seed = seed
+    playing_state.map_path = map_path
+    if workers:
+        playing_state.entity_manager = EntityManager(use_arrays=True, workers=workers)
+    engine.change_state(STATE_PLAYING)
+    if setup is not None:
+        setup(playing_state)
+
+    ticks = 0
+    start = time.perf_counter()
+    try:
+        while engine.running and ticks < max_ticks:
+            engine.update()
+            ticks += 1
+        seconds = time.perf_counter() - start
+        result = describe_match(engine, ticks, seconds)
+    finally:
+        if workers:
+            playing_state.entity_manager.close()
+    result["seed"] = seed
+    result["map_path"] = map_path
+    return result
+
+def describe_match(engine, ticks, seconds):
+    """Summarize a headless engine's match after ticks ticks took seconds to simulate"""
+    playing_state = engine.states[STATE_PLAYING]
+    entity_manager = playing_state.entity_manager
+    return {
+        "ticks": ticks,
+        "seconds": seconds,
+        "ticks_per_second": ticks / seconds if seconds > 0 else float("inf"),
+        "elapsed_time": playing_state.elapsed_time,
+        "winner": playing_state.get_winner(),
+        "final_state": engine.final_state or STATE_PLAYING,
+        "player_units": entity_manager.count_entities(True, ENTITY_UNIT),
+        "player_buildings": entity_manager.count_entities(True, ENTITY_BUILDING),
+        "enemy_units": entity_manager.count_entities(False, ENTITY_UNIT),
+        "enemy_buildings": entity_manager.count_entities(False, ENTITY_BUILDING),
+        "player_units_created": entity_manager.created_counts[(True, ENTITY_UNIT)],
+        "player_units_lost": entity_manager.lost_counts[(True, ENTITY_UNIT)],
+        "enemy_units_created": entity_manager.created_counts[(False, ENTITY_UNIT)],
+        "enemy_units_lost": entity_manager.lost_counts[(False, ENTITY_UNIT)],
+        "player_kills": sum(entity_manager.kill_counts[(True, kind)] for kind in (ENTITY_UNIT, ENTITY_BUILDING)),
+        "enemy_kills": sum(entity_manager.kill_counts[(False, kind)] for kind in (ENTITY_UNIT, ENTITY_BUILDING)),
+        "resources": dict(playing_state.resources),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a match without a window and report how fast it simulated")
+    parser.add_argument("--ticks", type=int, default=60 * 60 * FPS, help="maximum ticks to simulate (default: one hour of game time)")
+    parser.add_argument("--seed", type=int, default=None, help="map generation seed")
+    parser.add_argument("--map", dest="map_path", default=None, help=".engimap file to play on instead of a generated map")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="processes to step unit movement in, one map region each (default: step in-process)")
+    args = parser.parse_args()
+
+    result = run_headless(args.ticks, seed=args.seed, map_path=args.map_path, workers=args.workers)
+    print(f"Simulated {result['ticks']} ticks in {result['seconds']:.2f}s "
+          f"({result['ticks_per_second']:.0f} ticks/s, {result['ticks_per_second'] / FPS:.1f}x real time)")
+    print(f"Game time: {result['elapsed_time']} ticks, state: {result['final_state']}, winner: {result['winner'] or 'none'}")
+    print(f"Player: {result['player_units']} units, {result['player_buildings']} buildings")
+    print(f"Enemy: {result['enemy_units']} units, {result['enemy_buildings']} buildings")
+    print(f"Resources: {result['resources']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+import numpy as np
+from game.constants import (TILE_SIZE, WORLD_WIDTH, WORLD_HEIGHT, WORLD_CHUNK_SIZE,
+                            MAX_RESIDENT_CHUNKS, MAX_CHUNK_SURFACES)
+from game.map.game_map import GameMap, box_sum
+from game.map.engimap import EngimapReader
+
+class ChunkedGameMap(GameMap):
+    """A GameMap streamed in WORLD_CHUNK_SIZE square chunks
+
+    Chunks are generated (or read out of a loaded .engimap) the first time they are
+    touched and kept in a least-recently-used set of at most MAX_RESIDENT_CHUNKS.
+    Evicted chunks that were changed are written to disk and read back on demand,
+    so tile queries work the same as on a fully loaded map.
+    """
+
+    # Streamed maps never hold the whole world, so whole-map searches can't run on them
+    is_streamed = True
+
+    # Noise feature layers as (tile type, coverage, threshold, smoothing), in GameMap.generate_map order
+    FEATURE_LAYERS = (
+        (GameMap.TILE_WATER, 0.2, 0.3, 10),
+        (GameMap.TILE_MOUNTAIN, 0.1, 0.4, 8),
+        (GameMap.TILE_FOREST, 0.15, 0.6, 12),
+    )
+    # GameMap.generate_map places 15 gold tiles out of 100 candidates on a 100x100 map
+    GOLD_PER_TILE = 15 / (100 * 100)
+    GOLD_CANDIDATES_PER_TILE = 100 / (100 * 100)
+
+    def __init__(self, width=WORLD_WIDTH, height=WORLD_HEIGHT, cache_dir=None):
+        # Nothing is allocated for the whole map; tiles live in the chunks
+        super().__init__(0, 0)
+        self.width = width
+        self.height = height
+        self.chunk_size = WORLD_CHUNK_SIZE
+        self.chunks = OrderedDict()  # (chunk x, chunk y) -> tile types indexed [x, y]
+        self.dirty_chunks = set()  # Resident chunks changed since they were created or loaded
+        self.saved_chunks = set()  # Chunks written to cache_dir on eviction
+        self.cache_dir = cache_dir
+        self.owns_cache_dir = False
+        self.chunk_surfaces = OrderedDict()
+        self.seed = 0
+        self.source_path = None  # .engimap file the chunks are read from
+        self.source = None  # EngimapReader over source_path
+
+    def reset_chunks(self):
+        """Forget every chunk, including the ones saved to disk"""
+        self.chunks.clear()
+        self.dirty_chunks.clear()
+        for key in self.saved_chunks:
+            os.remove(self.get_chunk_path(*key))
+        self.saved_chunks.clear()
+
+    def generate_map(self, seed=None):
+        """Start a new generated world; chunks are built as they are reached"""
+        self.reset_chunks()
+        self.close_source()
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.notify_tiles_changed(None)
+
+    def load_engimap(self, path):
+        """Stream a .engimap file; '#' cells become mountains and '.' cells grass"""
+        self.reset_chunks()
+        self.open_source(path)
+        self.notify_tiles_changed(None)
+
+    def open_source(self, path):
+        """Read chunks out of a .engimap file from now on"""
+        self.close_source()
+        self.source = EngimapReader(path)
+        self.source_path = path
+        self.width = self.source.width
+        self.height = self.source.height
+
+    def close_source(self):
+        """Stop reading chunks out of a .engimap file"""
+        if self.source is not None:
+            self.source.close()
+        self.source = None
+        self.source_path = None
+
+    def get_snapshot(self):
+        """Get the world as its seed or source file plus every chunk changed since it was built"""
+        changed = sorted(self.dirty_chunks | self.saved_chunks)
+        size = self.chunk_size
+        chunks = np.zeros((len(changed), size, size), dtype=np.uint8)
+        for index, key in enumerate(changed):
+            # A resident copy is newer than the one saved on eviction
+            tiles = self.chunks.get(key)
+            if tiles is None:
+                tiles = np.load(self.get_chunk_path(*key))
+            chunks[index, :tiles.shape[0], :tiles.shape[1]] = tiles
+
+        # A loaded .engimap is saved as its path and read again on load, never copied into the save
+        meta = {"streamed": True, "width": self.width, "height": self.height, "seed": int(self.seed),
+                "source_path": self.source_path}
+        arrays = {"chunk_keys": np.array(changed, dtype=np.int32).reshape(-1, 2), "chunks": chunks}
+        return meta, arrays
+
+    def load_snapshot(self, meta, arrays):
+        """Replace the world with the state from get_snapshot"""
+        if not meta["streamed"]:
+            raise ValueError("Save was made with a different kind of world")
+        self.reset_chunks()
+        if meta["source_path"] is None:
+            self.close_source()
+        else:
+            self.open_source(meta["source_path"])
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self.seed = meta["seed"]
+        for (chunk_x, chunk_y), tiles in zip(arrays["chunk_keys"].tolist(), arrays["chunks"]):
+            left, top, right, bottom = self.get_chunk_bounds(chunk_x, chunk_y)
+            self.chunks[(chunk_x, chunk_y)] = tiles[:right - left, :bottom - top].copy()
+            self.dirty_chunks.add((chunk_x, chunk_y))
+            while len(self.chunks) > MAX_RESIDENT_CHUNKS:
+                self.evict_chunk()
+        self.notify_tiles_changed(None)
+
+    def close(self):
+        """Delete the on-disk chunk cache if this map created it and release the source file"""
+        self.reset_chunks()
+        self.close_source()
+        if self.owns_cache_dir:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self.cache_dir = None
+            self.owns_cache_dir = False
+
+    def get_chunk_bounds(self, chunk_x, chunk_y):
+        """Get the (left, top, right, bottom) tiles covered by a chunk"""
+        left = chunk_x * self.chunk_size
+        top = chunk_y * self.chunk_size
+        return (left, top, min(left + self.chunk_size, self.width), min(top + self.chunk_size, self.height))
+
+    def get_chunk_path(self, chunk_x, chunk_y):
+        """Get the file an evicted chunk is saved to"""
+        if self.cache_dir is None:
+            self.cache_dir = tempfile.mkdtemp(prefix="gflrts-world-")
+            self.owns_cache_dir = True
+        return os.path.join(self.cache_dir, f"chunk_{chunk_x}_{chunk_y}.npy")
+
+    def get_chunk(self, chunk_x, chunk_y):
+        """Get a chunk's tiles, loading or generating it if it isn't resident"""
+        key = (chunk_x, chunk_y)
+        tiles = self.chunks.get(key)
+        if tiles is not None:
+            self.chunks.move_to_end(key)
+            return tiles
+
+        if key in self.saved_chunks:
+            tiles = np.load(self.get_chunk_path(chunk_x, chunk_y))
+            # The copy on disk may differ from what would be generated, so it stays authoritative
+            self.dirty_chunks.add(key)
+        elif self.source is not None:
+            left, top, right, bottom = self.get_chunk_bounds(chunk_x, chunk_y)
+            walls = self.source.read_window(left, top, right, bottom)
+            tiles = walls.T.view(np.uint8) * np.uint8(self.TILE_MOUNTAIN)
+        else:
+            tiles = self.generate_chunk(chunk_x, chunk_y)
+
+        self.chunks[key] = tiles
+        while len(self.chunks) > MAX_RESIDENT_CHUNKS:
+            self.evict_chunk()
+        return tiles
+
+    def evict_chunk(self):
+        """Drop the least recently used chunk, saving it first if it was changed"""
+        key, tiles = self.chunks.popitem(last=False)
+        if key in self.dirty_chunks:
+            np.save(self.get_chunk_path(*key), tiles)
+            self.saved_chunks.add(key)
+            self.dirty_chunks.discard(key)
+
+    def get_chunk_rng(self, layer, chunk_x, chunk_y):
+        """Get the random generator for one layer of one chunk; it only depends on the seed"""
+        return np.random.default_rng([self.seed, layer, chunk_x, chunk_y])
+
+    def get_noise_window(self, layer, left, top, right, bottom):
+        """Get the raw noise of a tile rectangle, stitched from the per-chunk noise it overlaps"""
+        size = self.chunk_size
+        window = np.empty((right - left, bottom - top), dtype=np.float32)
+        for chunk_x in range(left // size, (right - 1) // size + 1):
+            for chunk_y in range(top // size, (bottom - 1) // size + 1):
+                noise = self.get_chunk_rng(layer, chunk_x, chunk_y).random((size, size), dtype=np.float32)
+                x0 = max(left, chunk_x * size)
+                x1 = min(right, (chunk_x + 1) * size)
+                y0 = max(top, chunk_y * size)
+                y1 = min(bottom, (chunk_y + 1) * size)
+                window[x0 - left:x1 - left, y0 - top:y1 - top] = \
+                    noise[x0 - chunk_x * size:x1 - chunk_x * size, y0 - chunk_y * size:y1 - chunk_y * size]
+        return window
+
+    def generate_chunk(self, chunk_x, chunk_y):
+        """Generate a chunk's tiles from the world seed"""
+        left, top, right, bottom = self.get_chunk_bounds(chunk_x, chunk_y)
+        tiles = np.full((right - left, bottom - top), self.TILE_GRASS, dtype=np.uint8)
+
+        for layer, (tile_type, coverage, threshold, smoothing) in enumerate(self.FEATURE_LAYERS):
+            # Each smoothing pass reaches one tile further, so a margin that wide
+            # around the chunk makes its noise match the neighbouring chunks exactly
+            window_left = max(0, left - smoothing)
+            window_top = max(0, top - smoothing)
+            window_right = min(self.width, right + smoothing)
+            window_bottom = min(self.height, bottom + smoothing)
+            noise = self.get_noise_window(2 * layer, window_left, window_top, window_right, window_bottom)
+            neighbor_counts = box_sum(np.ones_like(noise))
+            for _ in range(smoothing):
+                noise = box_sum(noise) / neighbor_counts
+            noise = noise[left - window_left:right - window_left, top - window_top:bottom - window_top]
+
+            chance = self.get_chunk_rng(2 * layer + 1, chunk_x, chunk_y).random(tiles.shape)
+            tiles[(noise < coverage) & (chance < threshold)] = tile_type
+
+        # Gold is scattered with the same density as on a generated map
+        rng = self.get_chunk_rng(2 * len(self.FEATURE_LAYERS), chunk_x, chunk_y)
+        count = round(tiles.size * self.GOLD_PER_TILE)
+        candidates = round(tiles.size * self.GOLD_CANDIDATES_PER_TILE)
+        xs = rng.integers(0, tiles.shape[0], size=candidates)
+        ys = rng.integers(0, tiles.shape[1], size=candidates)
+        placed = 0
+        for x, y in zip(xs, ys):
+            if placed >= count:
+                break
+            if tiles[x, y] == self.TILE_GRASS:
+                tiles[x, y] = self.TILE_GOLD
+                placed += 1
+        return tiles
+
+    def get_tile(self, tile_x, tile_y):
+        """Get the type of an on-map tile, given in tile coordinates"""
+        size = self.chunk_size
+        tiles = self.get_chunk(tile_x // size, tile_y // size)
+        return tiles[tile_x % size, tile_y % size]
+
+    def rebuild_passability(self):
+        """Passability is read straight from the chunks, so there is nothing to rebuild"""
+        pass
+
+    def is_tile_passable(self, tile_x, tile_y):
+        """Check if a tile, given in tile coordinates, is passable"""
+        if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+            return False
+        return self.is_tile_type_passable(self.get_tile(tile_x, tile_y))
+
+    def set_tile(self, tile_x, tile_y, tile_type):
+        """Change a single tile and notify listeners"""
+        size = self.chunk_size
+        key = (tile_x // size, tile_y // size)
+        tiles = self.get_chunk(*key)
+        if tiles[tile_x % size, tile_y % size] == tile_type:
+            return
+        tiles[tile_x % size, tile_y % size] = tile_type
+        self.dirty_chunks.add(key)
+        self.notify_tiles_changed([(tile_x, tile_y)])
+
+    def is_passable(self, x, y):
+        """Check if a tile is passable"""
+        return self.is_tile_passable(int(x // TILE_SIZE), int(y // TILE_SIZE))
+
+    def are_passable(self, xs, ys):
+        """Check passability for arrays of world positions; off-map positions are impassable"""
+        tile_x = np.floor_divide(xs, TILE_SIZE).astype(np.int64)
+        tile_y = np.floor_divide(ys, TILE_SIZE).astype(np.int64)
+        inside = np.flatnonzero((tile_x >= 0) & (tile_x < self.width) & (tile_y >= 0) & (tile_y < self.height))
+        result = np.zeros(len(tile_x), dtype=np.bool_)
+        if len(inside) == 0:
+            return result
+
+        # Look positions up one chunk at a time
+        size = self.chunk_size
+        tile_x = tile_x[inside]
+        tile_y = tile_y[inside]
+        chunk_x = tile_x // size
+        chunk_y = tile_y // size
+        keys, groups = np.unique(chunk_x * ((self.height + size - 1) // size) + chunk_y, return_inverse=True)
+        for group in range(len(keys)):
+            members = np.flatnonzero(groups == group)
+            first = members[0]
+            tiles = self.get_chunk(int(chunk_x[first]), int(chunk_y[first]))
+            tile_types = tiles[tile_x[members] % size, tile_y[members] % size]
+            result[inside[members]] = (tile_types != self.TILE_WATER) & (tile_types != self.TILE_MOUNTAIN)
+        return result
+
+    def get_reachable_point(self, x, y, target_x, target_y):
+        """A streamed world is never labelled as a whole, so every target is taken as reachable"""
+        return (target_x, target_y)
+
+    def get_tile_type(self, x, y):
+        """Get the type of tile at the given coordinates"""
+        tile_x = int(x // TILE_SIZE)
+        tile_y = int(y // TILE_SIZE)
+        if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+            return -1
+        return int(self.get_tile(tile_x, tile_y))
+
+    def get_tile_block(self, left, top, right, bottom):
+        """Get the tile types of a rectangle of tiles as an array indexed [x, y]"""
+        size = self.chunk_size
+        block = np.empty((right - left, bottom - top), dtype=np.uint8)
+        for chunk_x in range(left // size, (right - 1) // size + 1):
+            for chunk_y in range(top // size, (bottom - 1) // size + 1):
+                tiles = self.get_chunk(chunk_x, chunk_y)
+                x0 = max(left, chunk_x * size)
+                x1 = min(right, chunk_x * size + tiles.shape[0])
+                y0 = max(top, chunk_y * size)
+                y1 = min(bottom, chunk_y * size + tiles.shape[1])
+                block[x0 - left:x1 - left, y0 - top:y1 - top] = \
+                    tiles[x0 - chunk_x * size:x1 - chunk_x * size, y0 - chunk_y * size:y1 - chunk_y * size]
+        return block
+
+    def prefetch_area(self, left, top, right, bottom):
+        """Load the chunks under a world-space rectangle ahead of time"""
+        pixels = self.chunk_size * TILE_SIZE
+        max_x = (self.width - 1) // self.chunk_size
+        max_y = (self.height - 1) // self.chunk_size
+        for chunk_x in range(max(0, int(left // pixels)), min(max_x, int(right // pixels)) + 1):
+            for chunk_y in range(max(0, int(top // pixels)), min(max_y, int(bottom // pixels)) + 1):
+                self.get_chunk(chunk_x, chunk_y)
+
+    def get_chunk_surface(self, chunk_x, chunk_y):
+        """Get the pre-rendered surface of a chunk, keeping only the most recently drawn ones"""
+        key = (chunk_x, chunk_y)
+        if key in self.chunk_surfaces:
+            self.chunk_surfaces.move_to_end(key)
+            return self.chunk_surfaces[key]
+
+        surface = super().get_chunk_surface(chunk_x, chunk_y)
+        while len(self.chunk_surfaces) > MAX_CHUNK_SURFACES:
+            self.chunk_surfaces.popitem(last=False)
+        return surface
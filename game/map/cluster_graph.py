@@ -0,0 +1,441 @@
+import heapq
+import math
+import numpy as np
+from game.constants import CLUSTER_SIZE
+from game.map.grid import octile_distance, STEPS, get_step_masks, integrate_distances
+
+# Sentinel node for the goal in the abstract search
+GOAL = "goal"
+
+# Entrances at least this long get a portal at each end instead of one in the middle
+LONG_ENTRANCE = 6
+
+class ClusterGraph:
+    """Cluster/portal abstraction of a GameMap for hierarchical (HPA*) path search
+
+    The map is cut into CLUSTER_SIZE square clusters. Every run of open tiles along
+    a cluster border becomes an entrance with portal tiles on both sides. Each
+    portal keeps its in-cluster distance to every tile of its cluster, which gives
+    the links between portals, connects a search's start and goal without a
+    search of their own, and is walked downhill to refine a route into tiles.
+    Changed tiles only mark their clusters dirty; those are rebuilt before the
+    next search.
+    """
+
+    def __init__(self, game_map, cluster_size=CLUSTER_SIZE):
+        self.game_map = game_map
+        self.cluster_size = cluster_size
+        self.clusters_x = math.ceil(game_map.width / cluster_size)
+        self.clusters_y = math.ceil(game_map.height / cluster_size)
+        self.entrances = {}  # Border key -> list of (tile, tile) portal pairs
+        self.crossings = {}  # Portal tile -> set of portal tiles across a border
+        self.links = {}  # Cluster -> {portal: {portal: cost}}
+        self.distances = {}  # Cluster -> {portal: in-cluster distance to every tile of the cluster, indexed [y - y0, x - x0]}
+        self.link_paths = {}  # Cluster -> {(portal, portal): tile path}, filled as routes are refined
+        self.dirty_clusters = set()
+        self.needs_full_build = True
+        game_map.add_tile_listener(self.on_tiles_changed)
+
+    def on_tiles_changed(self, changed_tiles):
+        """Mark the clusters touched by changed tiles for rebuilding"""
+        if changed_tiles is None:
+            self.needs_full_build = True
+            return
+
+        size = self.cluster_size
+        for x, y in changed_tiles:
+            cluster_x = x // size
+            cluster_y = y // size
+            self.dirty_clusters.add((cluster_x, cluster_y))
+
+            # Border tiles also change the entrances shared with the neighbouring cluster
+            if x % size == 0 and cluster_x > 0:
+                self.dirty_clusters.add((cluster_x - 1, cluster_y))
+            if x % size == size - 1 and cluster_x < self.clusters_x - 1:
+                self.dirty_clusters.add((cluster_x + 1, cluster_y))
+            if y % size == 0 and cluster_y > 0:
+                self.dirty_clusters.add((cluster_x, cluster_y - 1))
+            if y % size == size - 1 and cluster_y < self.clusters_y - 1:
+                self.dirty_clusters.add((cluster_x, cluster_y + 1))
+
+    def ensure_built(self):
+        """Bring the graph up to date with the map"""
+        if self.needs_full_build:
+            self.build()
+        elif self.dirty_clusters:
+            self.rebuild_clusters(self.dirty_clusters)
+        self.dirty_clusters = set()
+
+    def build(self):
+        """Build the whole graph from scratch"""
+        self.clusters_x = math.ceil(self.game_map.width / self.cluster_size)
+        self.clusters_y = math.ceil(self.game_map.height / self.cluster_size)
+        self.entrances = {}
+        self.crossings = {}
+        self.links = {}
+        self.distances = {}
+        self.link_paths = {}
+        clusters = [(cluster_x, cluster_y) for cluster_x in range(self.clusters_x) for cluster_y in range(self.clusters_y)]
+        for cluster in clusters:
+            for border in self.get_borders(cluster):
+                if border not in self.entrances:
+                    self.build_entrances(border)
+        self.build_links(clusters)
+        self.needs_full_build = False
+
+    def rebuild_clusters(self, clusters):
+        """Rebuild the entrances and in-cluster links around a set of clusters"""
+        borders = set()
+        for cluster in clusters:
+            borders.update(self.get_borders(cluster))
+
+        neighbors = set()
+        for border in borders:
+            neighbors.update(self.get_border_clusters(border))
+        neighbors -= set(clusters)
+        old_portals = {cluster: self.get_portals(cluster) for cluster in neighbors}
+
+        for border in borders:
+            self.build_entrances(border)
+
+        # Untouched neighbours only need new links if their portals moved
+        relink = set(clusters)
+        relink.update(cluster for cluster in neighbors if self.get_portals(cluster) != old_portals[cluster])
+        self.build_links(relink)
+
+    def get_cluster(self, tile):
+        """Get the cluster containing a tile"""
+        return (tile[0] // self.cluster_size, tile[1] // self.cluster_size)
+
+    def get_bounds(self, cluster):
+        """Get the (x0, y0, x1, y1) tile bounds of a cluster, exclusive at the far end"""
+        size = self.cluster_size
+        x0 = cluster[0] * size
+        y0 = cluster[1] * size
+        return (x0, y0, min(x0 + size, self.game_map.width), min(y0 + size, self.game_map.height))
+
+    def get_borders(self, cluster):
+        """Get the keys of the borders around a cluster
+
+        ("h", x, y) is the border between clusters (x, y) and (x + 1, y),
+        ("v", x, y) the one between (x, y) and (x, y + 1).
+        """
+        cluster_x, cluster_y = cluster
+        borders = []
+        if cluster_x > 0:
+            borders.append(("h", cluster_x - 1, cluster_y))
+        if cluster_x < self.clusters_x - 1:
+            borders.append(("h", cluster_x, cluster_y))
+        if cluster_y > 0:
+            borders.append(("v", cluster_x, cluster_y - 1))
+        if cluster_y < self.clusters_y - 1:
+            borders.append(("v", cluster_x, cluster_y))
+        return borders
+
+    def get_border_clusters(self, border):
+        """Get the two clusters on either side of a border"""
+        kind, cluster_x, cluster_y = border
+        if kind == "h":
+            return ((cluster_x, cluster_y), (cluster_x + 1, cluster_y))
+        return ((cluster_x, cluster_y), (cluster_x, cluster_y + 1))
+
+    def build_entrances(self, border):
+        """Find the open runs along a border and place portal pairs on them"""
+        for tile, other in self.entrances.pop(border, []):
+            self.remove_crossing(tile, other)
+            self.remove_crossing(other, tile)
+
+        kind, cluster_x, cluster_y = border
+        passable = self.game_map.is_tile_passable
+        near_bounds = self.get_bounds((cluster_x, cluster_y))
+        if kind == "h":
+            # Tiles on the last column of the left cluster and the first of the right one
+            edge = near_bounds[2] - 1
+            pairs = [((edge, y), (edge + 1, y)) for y in range(near_bounds[1], near_bounds[3])]
+        else:
+            edge = near_bounds[3] - 1
+            pairs = [((x, edge), (x, edge + 1)) for x in range(near_bounds[0], near_bounds[2])]
+
+        entrances = []
+        run = []
+        for tile, other in pairs + [(None, None)]:
+            if tile is not None and passable(*tile) and passable(*other):
+                run.append((tile, other))
+                continue
+            if run:
+                if len(run) >= LONG_ENTRANCE:
+                    entrances.extend((run[0], run[-1]))
+                else:
+                    entrances.append(run[len(run) // 2])
+                run = []
+
+        for tile, other in entrances:
+            self.crossings.setdefault(tile, set()).add(other)
+            self.crossings.setdefault(other, set()).add(tile)
+        self.entrances[border] = entrances
+
+    def remove_crossing(self, tile, other):
+        crossing = self.crossings.get(tile)
+        if crossing is not None:
+            crossing.discard(other)
+            if not crossing:
+                del self.crossings[tile]
+
+    def get_portals(self, cluster):
+        """Get every portal tile inside a cluster"""
+        portals = set()
+        for border in self.get_borders(cluster):
+            for tile, other in self.entrances.get(border, []):
+                portals.add(tile if self.get_cluster(tile) == cluster else other)
+        return sorted(portals)
+
+    def build_links(self, clusters):
+        """Measure every portal's distance to each tile of its cluster, for a set of clusters at once
+
+        Clusters are handled together: the first portal of every cluster is
+        spread out in one pass, then the second, and so on, with steps across
+        cluster borders masked off so each pass stays inside its own clusters.
+        """
+        clusters = list(clusters)
+        if not clusters:
+            return
+        portals = {cluster: self.get_portals(cluster) for cluster in clusters}
+        for cluster in clusters:
+            self.links[cluster] = {}
+            self.distances[cluster] = {}
+            self.link_paths[cluster] = {}
+
+        # Work on the window of the map covering the clusters, which starts on a cluster corner
+        bounds = [self.get_bounds(cluster) for cluster in clusters]
+        x0 = min(bound[0] for bound in bounds)
+        y0 = min(bound[1] for bound in bounds)
+        x1 = max(bound[2] for bound in bounds)
+        y1 = max(bound[3] for bound in bounds)
+        width = x1 - x0
+        passable = np.frombuffer(self.game_map.passability, dtype=np.uint8).reshape(
+            self.game_map.height, self.game_map.width)[y0:y1, x0:x1] != 0
+        step_masks = get_step_masks(passable)
+        # Steps out of a cluster's first or last row or column would cross its border
+        column = np.arange(width) % self.cluster_size
+        row = np.arange(y1 - y0) % self.cluster_size
+        for mask, (dx, dy, _) in zip(step_masks, STEPS):
+            if dx:
+                mask[:, column == (self.cluster_size - 1 if dx > 0 else 0)] = False
+            if dy:
+                mask[row == (self.cluster_size - 1 if dy > 0 else 0), :] = False
+
+        for slot in range(max(len(cluster_portals) for cluster_portals in portals.values())):
+            sources = [(cluster, cluster_portals[slot]) for cluster, cluster_portals in portals.items()
+                       if slot < len(cluster_portals)]
+            distances = np.full(passable.size, np.inf, dtype=np.float32)
+            frontier = [(y - y0) * width + (x - x0) for _, (x, y) in sources]
+            distances[frontier] = 0.0
+            integrate_distances(distances, step_masks, frontier)
+            distances = distances.reshape(passable.shape)
+
+            for cluster, portal in sources:
+                cluster_x0, cluster_y0, cluster_x1, cluster_y1 = self.get_bounds(cluster)
+                self.distances[cluster][portal] = distances[cluster_y0 - y0:cluster_y1 - y0,
+                                                            cluster_x0 - x0:cluster_x1 - x0].copy()
+                links = {}
+                for other in portals[cluster]:
+                    cost = distances[other[1] - y0, other[0] - x0]
+                    if other != portal and cost < math.inf:
+                        links[other] = float(cost)
+                self.links[cluster][portal] = links
+
+    def connect(self, tile):
+        """Get the in-cluster costs from a tile to the portals of its cluster
+
+        Returns ({portal: cost}, paths), where paths is None when the route to a
+        portal is walked from the portal's distances, or {portal: path from tile}
+        for a blocked tile, which those distances don't cover.
+        """
+        cluster = self.get_cluster(tile)
+        if not self.game_map.is_tile_passable(*tile):
+            # A unit stuck on a blocked tile can still step off it, so it gets a search of its own
+            return self.search_cluster(tile, cluster, self.get_portals(cluster))
+
+        x0, y0, _, _ = self.get_bounds(cluster)
+        costs = {}
+        for portal, distances in self.distances[cluster].items():
+            cost = distances[tile[1] - y0, tile[0] - x0]
+            if cost < math.inf:
+                costs[portal] = float(cost)
+        return costs, None
+
+    def get_link_path(self, portal, other):
+        """Get the tile path between two portals of the same cluster"""
+        paths = self.link_paths[self.get_cluster(portal)]
+        path = paths.get((portal, other))
+        if path is None:
+            path = self.walk_to_portal(portal, other)
+            paths[(portal, other)] = path
+        return path
+
+    def walk_to_portal(self, tile, portal):
+        """Follow a portal's distances downhill from a tile in its cluster to the portal, returning the tile path"""
+        width = self.game_map.width
+        passability = self.game_map.passability
+        cluster = self.get_cluster(portal)
+        x0, y0, x1, y1 = self.get_bounds(cluster)
+        distances = self.distances[cluster][portal]
+
+        x, y = tile
+        path = [tile]
+        while (x, y) != portal:
+            index = y * width + x
+            best_cost = math.inf
+            best = None
+            for dx, dy, step_cost in STEPS:
+                nx = x + dx
+                ny = y + dy
+                if nx < x0 or nx >= x1 or ny < y0 or ny >= y1 or not passability[index + dy * width + dx]:
+                    continue
+                if dx and dy and not (passability[index + dx] and passability[index + dy * width]):
+                    continue
+                cost = distances[ny - y0, nx - x0] + step_cost
+                if cost < best_cost:
+                    best_cost = cost
+                    best = (nx, ny)
+            x, y = best
+            path.append(best)
+        return tuple(path)
+
+    def search_cluster(self, source, cluster, targets):
+        """Dijkstra from a tile that never leaves the cluster, stopping once all targets are settled
+
+        Returns ({tile: cost}, {tile: path from source}) for the targets that were reached.
+        """
+        width = self.game_map.width
+        passability = self.game_map.passability
+        x0, y0, x1, y1 = self.get_bounds(cluster)
+
+        source_index = source[1] * width + source[0]
+        remaining = {t[1] * width + t[0] for t in targets}
+        came_from = {source_index: None}
+        cost = {source_index: 0.0}
+        settled = set()
+        open_heap = [(0.0, source_index)]
+        found_costs = {}
+        found_paths = {}
+        while open_heap and remaining:
+            base_cost, index = heapq.heappop(open_heap)
+            if index in settled:
+                continue
+            settled.add(index)
+            if index in remaining:
+                remaining.discard(index)
+                tile = (index % width, index // width)
+                found_costs[tile] = base_cost
+                found_paths[tile] = self.build_path(came_from, index)
+
+            x = index % width
+            y = index // width
+            for dx, dy, step_cost in STEPS:
+                nx = x + dx
+                ny = y + dy
+                if nx < x0 or nx >= x1 or ny < y0 or ny >= y1:
+                    continue
+                neighbor = index + dy * width + dx
+                if not passability[neighbor]:
+                    continue
+                # Diagonal steps may not cut the corner of a blocked tile
+                if dx and dy and not (passability[index + dx] and passability[index + dy * width]):
+                    continue
+                new_cost = base_cost + step_cost
+                if new_cost < cost.get(neighbor, math.inf):
+                    cost[neighbor] = new_cost
+                    came_from[neighbor] = index
+                    heapq.heappush(open_heap, (new_cost, neighbor))
+        return found_costs, found_paths
+
+    def build_path(self, came_from, index):
+        width = self.game_map.width
+        path = []
+        while index is not None:
+            path.append((index % width, index // width))
+            index = came_from[index]
+        path.reverse()
+        return tuple(path)
+
+    def find_path(self, start, goal):
+        """Search the abstract graph and stitch the in-cluster paths into a tile path
+
+        Returns None when the goal cannot be reached through the portal graph.
+        """
+        self.ensure_built()
+
+        # Connect the start and goal to the portals of their own clusters
+        start_costs, start_paths = self.connect(start)
+        goal_costs, goal_paths = self.connect(goal)
+        if not start_costs or not goal_costs:
+            return None
+
+        goal_x, goal_y = goal
+        came_from = {}
+        cost = {}
+        open_heap = []
+        counter = 0
+        for portal, portal_cost in start_costs.items():
+            cost[portal] = portal_cost
+            came_from[portal] = None
+            heapq.heappush(open_heap, (portal_cost + octile_distance(portal[0] - goal_x, portal[1] - goal_y), counter, portal))
+            counter += 1
+
+        settled = set()
+        while open_heap:
+            _, _, portal = heapq.heappop(open_heap)
+            if portal in settled:
+                continue
+            settled.add(portal)
+            if portal == GOAL:
+                return self.stitch(came_from[GOAL], came_from, start, goal, start_paths, goal_paths)
+
+            base_cost = cost[portal]
+            edges = [(other, 1.0) for other in self.crossings.get(portal, ())]
+            edges.extend(self.links[self.get_cluster(portal)].get(portal, {}).items())
+            if portal in goal_costs:
+                # Portals of the goal's cluster can walk straight to the goal
+                edges.append((GOAL, goal_costs[portal]))
+
+            for other, edge_cost in edges:
+                new_cost = base_cost + edge_cost
+                if new_cost < cost.get(other, math.inf):
+                    cost[other] = new_cost
+                    came_from[other] = portal
+                    if other == GOAL:
+                        estimate = new_cost
+                    else:
+                        estimate = new_cost + octile_distance(other[0] - goal_x, other[1] - goal_y)
+                    heapq.heappush(open_heap, (estimate, counter, other))
+                    counter += 1
+        return None
+
+    def stitch(self, last_portal, came_from, start, goal, start_paths, goal_paths):
+        """Refine an abstract portal route into the full tile path"""
+        portals = []
+        portal = last_portal
+        while portal is not None:
+            portals.append(portal)
+            portal = came_from[portal]
+        portals.reverse()
+
+        if start_paths is None:
+            tiles = list(self.walk_to_portal(start, portals[0]))
+        else:
+            tiles = list(start_paths[portals[0]])
+        for previous, portal in zip(portals, portals[1:]):
+            if self.get_cluster(portal) == self.get_cluster(previous):
+                tiles.extend(self.get_link_path(previous, portal)[1:])
+            else:
+                # Crossing a border is a single step
+                tiles.append(portal)
+
+        # Goal paths run from the goal outwards, so walk them backwards
+        if goal_paths is None:
+            goal_path = self.walk_to_portal(goal, portals[-1])
+        else:
+            goal_path = goal_paths[portals[-1]]
+        tiles.extend(reversed(goal_path[:-1]))
+        return tuple(tiles)
\ No newline at end of file
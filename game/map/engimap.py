@@ -0,0 +1,230 @@
+import os
+import struct
+import numpy as np
+
+# Binary .engimap header: magic, format version, encoding, width, height
+BINARY_MAGIC = b"EMAP"
+BINARY_VERSION = 1
+HEADER = struct.Struct("<4sHBxII")
+ENCODING_BITPACKED = 0
+ENCODING_RLE = 1
+
+WALL = ord("#")
+FLOOR = ord(".")
+
+def read_engimap(path):
+    """Read a text or binary .engimap file into a (height, width) bool array of walls"""
+    with open(path, "rb") as f:
+        magic = f.read(len(BINARY_MAGIC))
+    if magic == BINARY_MAGIC:
+        return read_binary(path)
+
+    with open(path, "rb") as f:
+        return parse_text(f.read())
+
+def parse_text(data):
+    """Parse '#'/'.' text rows into a (height, width) bool array of walls"""
+    data = data.replace(b"\r\n", b"\n").strip(b"\n")
+    if not data:
+        return np.zeros((0, 0), dtype=np.bool_)
+
+    width = data.find(b"\n")
+    if width == -1:
+        width = len(data)
+    height = data.count(b"\n") + 1
+
+    if len(data) == height * (width + 1) - 1:
+        # Every row has the same length, so reshape in place and drop the newline column
+        grid = np.frombuffer(data + b"\n", dtype=np.uint8).reshape(height, width + 1)[:, :width]
+        return grid == WALL
+
+    # Ragged rows are padded with floor to the longest row
+    rows = data.split(b"\n")
+    width = max(len(row) for row in rows)
+    grid = np.frombuffer(b"".join(row.ljust(width, b".") for row in rows), dtype=np.uint8)
+    return grid.reshape(len(rows), width) == WALL
+
+def read_binary(path):
+    """Read a binary .engimap file into a (height, width) bool array of walls
+
+    The whole grid is unpacked into memory either way, so the packed bytes are
+    simply read rather than memory-mapped.
+    """
+    with open(path, "rb") as f:
+        magic, version, encoding, width, height = HEADER.unpack(f.read(HEADER.size))
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported engimap version {version}")
+
+        if encoding == ENCODING_BITPACKED:
+            packed = np.frombuffer(f.read((width * height + 7) // 8), dtype=np.uint8)
+            # unpackbits gives 0/1 bytes, which view as bools without another copy
+            return np.unpackbits(packed, count=width * height).reshape(height, width).view(np.bool_)
+
+        if encoding == ENCODING_RLE:
+            runs = np.frombuffer(f.read(), dtype="<u4")
+            # Runs alternate floor, wall, floor, ... starting with a (possibly empty) floor run
+            values = np.arange(len(runs)) % 2 == 1
+            return np.repeat(values, runs).reshape(height, width)
+
+    raise ValueError(f"Unknown engimap encoding {encoding}")
+
+class EngimapReader:
+    """Reads rectangular windows of walls out of a .engimap file without loading it whole
+
+    The file is memory-mapped. Bit-packed files are unpacked a window at a time,
+    text files get an index of where each row starts, and run-length files get
+    the run each row starts in, so the only whole-map memory is one or two
+    numbers per row.
+    """
+
+    # Bytes or runs scanned at a time while indexing a file
+    SCAN_BLOCK = 1 << 20
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic = f.read(len(BINARY_MAGIC))
+            if magic == BINARY_MAGIC:
+                f.seek(0)
+                magic, version, self.encoding, self.width, self.height = HEADER.unpack(f.read(HEADER.size))
+                if version != BINARY_VERSION:
+                    raise ValueError(f"Unsupported engimap version {version}")
+                if self.encoding not in (ENCODING_BITPACKED, ENCODING_RLE):
+                    raise ValueError(f"Unknown engimap encoding {self.encoding}")
+            else:
+                self.encoding = None
+        self.data = None
+
+        if self.encoding == ENCODING_BITPACKED:
+            if self.width * self.height:
+                self.data = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size)
+        elif self.encoding == ENCODING_RLE:
+            if self.width * self.height:
+                self.index_runs()
+        else:
+            self.index_rows()
+
+    def index_rows(self):
+        """Find where each text row starts and how long it is, matching parse_text"""
+        self.width = self.height = 0
+        self.row_starts = self.row_lengths = np.zeros(0, dtype=np.int64)
+        if os.path.getsize(self.path) == 0:
+            return
+        self.data = np.memmap(self.path, dtype=np.uint8, mode="r")
+
+        newlines = []
+        for start in range(0, len(self.data), self.SCAN_BLOCK):
+            block = self.data[start:start + self.SCAN_BLOCK]
+            newlines.append(np.flatnonzero(block == ord("\n")) + start)
+        newlines = np.concatenate(newlines)
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [len(self.data)]))
+        # A row ending in "\r\n" doesn't include the "\r"
+        ends[:-1] -= (newlines > 0) & (self.data[np.maximum(newlines - 1, 0)] == ord("\r"))
+        lengths = np.maximum(ends - starts, 0)
+
+        # Blank rows at either end are dropped, as parse_text strips them
+        filled = np.flatnonzero(lengths)
+        if len(filled) == 0:
+            return
+        rows = slice(filled[0], filled[-1] + 1)
+        self.row_starts = starts[rows]
+        self.row_lengths = lengths[rows]
+        self.width = int(self.row_lengths.max())
+        self.height = len(self.row_starts)
+
+    def index_runs(self):
+        """Find the run each row starts in and the cell that run starts at"""
+        self.data = np.memmap(self.path, dtype="<u4", mode="r", offset=HEADER.size)
+        self.row_runs = np.zeros(self.height, dtype=np.int64)
+        self.row_run_starts = np.zeros(self.height, dtype=np.int64)
+        row_cells = np.arange(self.height, dtype=np.int64) * self.width
+        end = 0
+        for start in range(0, len(self.data), self.SCAN_BLOCK):
+            run_ends = end + np.cumsum(self.data[start:start + self.SCAN_BLOCK], dtype=np.int64)
+            # Rows starting inside this block of runs
+            first, last = np.searchsorted(row_cells, (end, run_ends[-1]))
+            cells = row_cells[first:last]
+            runs = np.searchsorted(run_ends, cells, side="right")
+            self.row_runs[first:last] = runs + start
+            self.row_run_starts[first:last] = run_ends[runs] - self.data[start + runs]
+            end = run_ends[-1]
+
+    def read_window(self, left, top, right, bottom):
+        """Get the walls of the tiles in [left, right) x [top, bottom) as a (rows, columns) bool array"""
+        rows = bottom - top
+        columns = right - left
+        if rows <= 0 or columns <= 0:
+            return np.zeros((max(rows, 0), max(columns, 0)), dtype=np.bool_)
+        if self.encoding == ENCODING_BITPACKED:
+            return self.read_bitpacked_window(left, top, rows, columns)
+        if self.encoding == ENCODING_RLE:
+            return self.read_rle_window(left, top, rows, columns)
+        return self.read_text_window(left, top, rows, columns)
+
+    def read_bitpacked_window(self, left, top, rows, columns):
+        """Unpack only the bytes covering each row of the window"""
+        first_bits = (np.arange(top, top + rows, dtype=np.int64) * self.width) + left
+        byte_count = (7 + columns + 7) // 8
+        byte_index = np.minimum(first_bits[:, None] // 8 + np.arange(byte_count), len(self.data) - 1)
+        bits = np.unpackbits(self.data[byte_index], axis=1)
+        columns_index = (first_bits % 8)[:, None] + np.arange(columns)
+        return bits[np.arange(rows)[:, None], columns_index].view(np.bool_)
+
+    def read_text_window(self, left, top, rows, columns):
+        """Copy each row's slice of the window; short rows are padded with floor"""
+        window = np.zeros((rows, columns), dtype=np.bool_)
+        for row, (start, length) in enumerate(zip(self.row_starts[top:top + rows].tolist(),
+                                                  self.row_lengths[top:top + rows].tolist())):
+            if length > left:
+                cells = self.data[start + left:start + min(length, left + columns)]
+                window[row, :len(cells)] = cells == WALL
+        return window
+
+    def read_rle_window(self, left, top, rows, columns):
+        """Expand the runs covering the window's rows, clipped to those rows"""
+        first = self.row_runs[top]
+        last = self.row_runs[top + rows] if top + rows < self.height else len(self.data) - 1
+        lengths = np.asarray(self.data[first:last + 1], dtype=np.int64)
+        # Cut the first run to start at the window's first row and the last to end after its last row
+        cell_count = rows * self.width
+        run_ends = np.minimum(np.cumsum(lengths) - (top * self.width - self.row_run_starts[top]), cell_count)
+        lengths = np.diff(run_ends, prepend=0).clip(min=0)
+        values = np.arange(first, last + 1) % 2 == 1
+        return np.repeat(values, lengths).reshape(rows, self.width)[:, left:left + columns]
+
+    def close(self):
+        """Release the memory-mapped file"""
+        self.data = None
+
+def write_engimap(path, walls, encoding="text"):
+    """Write a (height, width) bool array of walls as a text, "bitpacked" or "rle" .engimap file"""
+    walls = np.asarray(walls, dtype=np.bool_)
+    height, width = walls.shape
+
+    if encoding == "text":
+        grid = np.where(walls, WALL, FLOOR).astype(np.uint8)
+        with open(path, "wb") as f:
+            f.write(b"\n".join(row.tobytes() for row in grid))
+        return
+
+    with open(path, "wb") as f:
+        if encoding == "bitpacked":
+            f.write(HEADER.pack(BINARY_MAGIC, BINARY_VERSION, ENCODING_BITPACKED, width, height))
+            f.write(np.packbits(walls.ravel()).tobytes())
+        elif encoding == "rle":
+            f.write(HEADER.pack(BINARY_MAGIC, BINARY_VERSION, ENCODING_RLE, width, height))
+            f.write(run_lengths(walls.ravel()).astype("<u4").tobytes())
+        else:
+            raise ValueError(f"Unknown engimap encoding {encoding}")
+
+def run_lengths(cells):
+    """Get alternating floor/wall run lengths of a flat bool array, starting with floor"""
+    if len(cells) == 0:
+        return np.zeros(0, dtype=np.int64)
+    change = np.flatnonzero(cells[1:] != cells[:-1]) + 1
+    bounds = np.concatenate(([0], change, [len(cells)]))
+    runs = np.diff(bounds)
+    if cells[0]:
+        runs = np.concatenate(([0], runs))
+    return runs
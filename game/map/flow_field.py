@@ -0,0 +1,101 @@
+from collections import OrderedDict
+import numpy as np
+from game.constants import TILE_SIZE, FLOW_FIELD_CACHE_SIZE
+from game.map.grid import STEPS, shift, get_step_masks, integrate_distances
+
+class FlowField:
+    """Distance-to-goal and next-step direction for every tile of the map"""
+
+    def __init__(self, goal, passable):
+        self.goal = goal
+        step_masks = get_step_masks(passable)
+        self.integration = self.integrate(goal, step_masks)
+        self.direction_x, self.direction_y = self.build_directions(step_masks)
+
+    @classmethod
+    def from_arrays(cls, goal, integration, direction_x, direction_y):
+        """Rebuild a field from its arrays, e.g. out of a save file, without integrating again"""
+        field = cls.__new__(cls)
+        field.goal = goal
+        field.integration = integration
+        field.direction_x = direction_x
+        field.direction_y = direction_y
+        return field
+
+    def integrate(self, goal, step_masks):
+        """Expand a wavefront out from the goal until every reachable tile has its distance"""
+        _, height, width = step_masks.shape
+        integration = np.full(height * width, np.inf, dtype=np.float32)
+        goal_x, goal_y = goal
+        integration[goal_y * width + goal_x] = 0
+        integrate_distances(integration, step_masks, [goal_y * width + goal_x])
+        return integration.reshape(height, width)
+
+    def build_directions(self, step_masks):
+        """Point every reachable tile at its cheapest neighbour"""
+        shape = step_masks.shape[1:]
+        best = np.full(shape, np.inf, dtype=np.float32)
+        direction_x = np.zeros(shape, dtype=np.int8)
+        direction_y = np.zeros(shape, dtype=np.int8)
+        for (dx, dy, cost), mask in zip(STEPS, step_masks):
+            candidate = np.where(mask, shift(self.integration, dx, dy, np.inf) + np.float32(cost), np.inf)
+            better = candidate < best
+            best[better] = candidate[better]
+            direction_x[better] = dx
+            direction_y[better] = dy
+
+        # The goal itself has nowhere left to go
+        goal_x, goal_y = self.goal
+        direction_x[goal_y, goal_x] = 0
+        direction_y[goal_y, goal_x] = 0
+        return direction_x, direction_y
+
+    def is_reachable(self, tile_x, tile_y):
+        """Check if a tile has a route to the goal"""
+        height, width = self.integration.shape
+        if not (0 <= tile_x < width and 0 <= tile_y < height):
+            return False
+        return bool(np.isfinite(self.integration[tile_y, tile_x]))
+
+    def next_tile(self, tile_x, tile_y):
+        """Get the tile to step into next, or None if the tile cannot reach the goal"""
+        if not self.is_reachable(tile_x, tile_y):
+            return None
+        return (tile_x + int(self.direction_x[tile_y, tile_x]), tile_y + int(self.direction_y[tile_y, tile_x]))
+
+class FlowFieldCache:
+    """Flow fields shared between every order sent to the same destination tile"""
+
+    def __init__(self, game_map):
+        self.game_map = game_map
+        self.fields = OrderedDict()
+        # Streamed maps never build fields, so there is nothing to invalidate
+        if not game_map.is_streamed:
+            game_map.add_tile_listener(self.on_tiles_changed)
+
+    def on_tiles_changed(self, changed_tiles):
+        """Any tile change can reroute a whole field, so drop them all"""
+        self.fields.clear()
+
+    def get_field(self, target_x, target_y):
+        """Get the flow field towards the tile under a world position, or None if it is blocked"""
+        goal = (int(target_x // TILE_SIZE), int(target_y // TILE_SIZE))
+        if not self.game_map.is_tile_passable(*goal):
+            return None
+
+        field = self.fields.get(goal)
+        if field is not None:
+            self.fields.move_to_end(goal)
+            return field
+
+        passable = np.frombuffer(self.game_map.passability, dtype=np.uint8).reshape(
+            self.game_map.height, self.game_map.width) != 0
+        return self.add_field(FlowField(goal, passable))
+
+    def add_field(self, field):
+        """Cache a field as the most recently used one for its goal"""
+        self.fields[field.goal] = field
+        self.fields.move_to_end(field.goal)
+        if len(self.fields) > FLOW_FIELD_CACHE_SIZE:
+            self.fields.popitem(last=False)
+        return field
@@ -1,6 +1,15 @@
+import math
 import pygame
-import random
-from game.constants import TILE_SIZE, MAP_WIDTH, MAP_HEIGHT
+import numpy as np
+from game.constants import TILE_SIZE, MAP_WIDTH, MAP_HEIGHT, CHUNK_SIZE, COLOR_BLACK
+from game.map.engimap import read_engimap
+from game.map.regions import RegionMap
+
+def box_sum(grid):
+    """Sum every cell's 3x3 neighbourhood, treating cells outside the grid as zero"""
+    padded = np.pad(grid, 1)
+    rows = padded[:-2, :] + padded[1:-1, :] + padded[2:, :]
+    return rows[:, :-2] + rows[:, 1:-1] + rows[:, 2:]
 
 class GameMap:
     # Tile types
@@ -10,10 +19,15 @@ class GameMap:
     TILE_FOREST = 3
     TILE_GOLD = 4
     
-    def __init__(self):
-        self.width = MAP_WIDTH
-        self.height = MAP_HEIGHT
-        self.tiles = [[self.TILE_GRASS for y in range(self.height)] for x in range(self.width)]
+    # The whole map is held in memory, so whole-map searches (paths, flow fields) can run on it
+    is_streamed = False
+    
+    def __init__(self, width=MAP_WIDTH, height=MAP_HEIGHT):
+        self.width = width
+        self.height = height
+        # Tile types indexed as tiles[x, y]
+        self.tiles = np.full((self.width, self.height), self.TILE_GRASS, dtype=np.uint8)
+        self.rng = np.random.default_rng()
         self.tile_colors = {
             self.TILE_GRASS: (100, 200, 100),
             self.TILE_WATER: (50, 150, 255),
@@ -21,11 +35,22 @@ class GameMap:
             self.TILE_FOREST: (0, 100, 0),
             self.TILE_GOLD: (255, 215, 0)
         }
+        # Packed row-major passability grid, one byte per tile (1 = passable)
+        self.passability = bytearray(b"\x01" * (self.width * self.height))
+        # Callbacks run with the changed (x, y) tiles, or None when the whole map changed
+        self.tile_listeners = []
+        # Pre-rendered CHUNK_SIZE x CHUNK_SIZE tile surfaces keyed by chunk coordinates
+        self.chunk_surfaces = {}
+        # Connected regions of passable tiles, kept up to date through a tile listener.
+        # Labelling needs the whole map, so streamed maps go without
+        self.regions = None if self.is_streamed else RegionMap(self)
+        
+    def generate_map(self, seed=None):
+        """Generate a random map; the same seed always produces the same map"""
+        self.rng = np.random.default_rng(seed)
         
-    def generate_map(self):
-        """Generate a random map"""
         # Start with all grass
-        self.tiles = [[self.TILE_GRASS for y in range(self.height)] for x in range(self.width)]
+        self.tiles = np.full((self.width, self.height), self.TILE_GRASS, dtype=np.uint8)
         
         # Add water bodies
         self.generate_noise_based_features(self.TILE_WATER, 0.2, 0.3, 10)
@@ -39,129 +64,251 @@ class GameMap:
         # Add gold resources
         self.generate_resources(self.TILE_GOLD, 15)
         
+        self.rebuild_passability()
+        self.notify_tiles_changed(None)
+        
+    def load_engimap(self, path):
+        """Load a text or binary .engimap file; '#' cells become mountains and '.' cells grass"""
+        walls = read_engimap(path)
+        self.height, self.width = walls.shape
+        # Files store rows of y; tiles are indexed [x, y]. Grass is 0, so scaling the walls is enough
+        self.tiles = walls.T.view(np.uint8) * np.uint8(self.TILE_MOUNTAIN)
+        
+        # Walls are already row-major, so the passability grid is just the floor cells
+        self.passability = bytearray((~walls).view(np.uint8))
+        self.notify_tiles_changed(None)
+        
+    def get_snapshot(self):
+        """Get a copy of the map's state as (metadata, {name: array}) for save files"""
+        return {"streamed": self.is_streamed, "width": self.width, "height": self.height}, {"tiles": self.tiles.copy()}
+        
+    def load_snapshot(self, meta, arrays):
+        """Replace the map with the state from get_snapshot"""
+        if meta["streamed"] != self.is_streamed:
+            raise ValueError("Save was made with a different kind of world")
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self.tiles = arrays["tiles"]
+        self.rebuild_passability()
+        self.notify_tiles_changed(None)
+        
     def generate_noise_based_features(self, tile_type, coverage, threshold, smoothing):
         """Generate map features using noise"""
         # Create noise map
-        noise = [[random.random() for y in range(self.height)] for x in range(self.width)]
+        noise = self.rng.random((self.width, self.height), dtype=np.float32)
+        
+        # Number of in-bounds cells in each 3x3 neighbourhood
+        neighbor_counts = box_sum(np.ones((self.width, self.height), dtype=np.float32))
         
-        # Smooth the noise
+        # Smooth the noise by averaging every cell with its in-bounds neighbours
         for _ in range(smoothing):
-            smoothed = [[0 for y in range(self.height)] for x in range(self.width)]
-            for x in range(self.width):
-                for y in range(self.height):
-                    # Get neighboring values
-                    neighbors = []
-                    for dx in [-1, 0, 1]:
-                        for dy in [-1, 0, 1]:
-                            nx, ny = x + dx, y + dy
-                            if 0 <= nx < self.width and 0 <= ny < self.height:
-                                neighbors.append(noise[nx][ny])
-                    # Set smoothed value to average of neighbors
-                    smoothed[x][y] = sum(neighbors) / len(neighbors)
-            noise = smoothed
+            noise = box_sum(noise) / neighbor_counts
         
         # Apply noise to create features
-        for x in range(self.width):
-            for y in range(self.height):
-                if noise[x][y] < coverage and random.random() < threshold:
-                    self.tiles[x][y] = tile_type
+        chance = self.rng.random((self.width, self.height))
+        self.tiles[(noise < coverage) & (chance < threshold)] = tile_type
                     
     def generate_resources(self, resource_type, count):
         """Place resources at random locations"""
         placed = 0
-        attempts = 0
         
-        while placed < count and attempts < 100:
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
-            
+        # Draw every candidate position up front, then keep the first ones on grass
+        xs = self.rng.integers(0, self.width, size=100)
+        ys = self.rng.integers(0, self.height, size=100)
+        for x, y in zip(xs, ys):
+            if placed >= count:
+                break
+                
             # Only place on grass
-            if self.tiles[x][y] == self.TILE_GRASS:
-                self.tiles[x][y] = resource_type
+            if self.tiles[x, y] == self.TILE_GRASS:
+                self.tiles[x, y] = resource_type
                 placed += 1
             
-            attempts += 1
+    def is_tile_type_passable(self, tile_type):
+        """Check if units can walk over a tile type"""
+        return tile_type != self.TILE_WATER and tile_type != self.TILE_MOUNTAIN
+        
+    def rebuild_passability(self):
+        """Rebuild the packed passability grid from the tiles"""
+        passable = (self.tiles != self.TILE_WATER) & (self.tiles != self.TILE_MOUNTAIN)
+        # Tiles are indexed [x, y]; the packed grid is row-major [y, x]
+        self.passability = bytearray(passable.T.astype(np.uint8).tobytes())
+        
+    def is_tile_passable(self, tile_x, tile_y):
+        """Check if a tile, given in tile coordinates, is passable"""
+        if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+            return False
+        return self.passability[tile_y * self.width + tile_x] == 1
+        
+    def set_tile(self, tile_x, tile_y, tile_type):
+        """Change a single tile and notify listeners"""
+        if self.tiles[tile_x, tile_y] == tile_type:
+            return
+        self.tiles[tile_x, tile_y] = tile_type
+        self.passability[tile_y * self.width + tile_x] = 1 if self.is_tile_type_passable(tile_type) else 0
+        self.notify_tiles_changed([(tile_x, tile_y)])
+        
+    def add_tile_listener(self, listener):
+        """Register a callback to run whenever tiles change"""
+        self.tile_listeners.append(listener)
+        
+    def notify_tiles_changed(self, changed_tiles):
+        """Tell listeners which tiles changed; None means the whole map"""
+        self.invalidate_tiles(changed_tiles)
+        for listener in self.tile_listeners:
+            listener(changed_tiles)
             
     def is_passable(self, x, y):
         """Check if a tile is passable"""
         # Convert to tile coordinates
-        tile_x = int(x / TILE_SIZE)
-        tile_y = int(y / TILE_SIZE)
+        tile_x = int(x // TILE_SIZE)
+        tile_y = int(y // TILE_SIZE)
         
         # Check if out of bounds
         if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
             return False
             
         # Check if tile is passable
-        tile_type = self.tiles[tile_x][tile_y]
-        return tile_type != self.TILE_WATER and tile_type != self.TILE_MOUNTAIN
+        return self.passability[tile_y * self.width + tile_x] == 1
+        
+    def are_passable(self, xs, ys):
+        """Check passability for arrays of world positions; off-map positions are impassable"""
+        tile_x = np.floor_divide(xs, TILE_SIZE).astype(np.int64)
+        tile_y = np.floor_divide(ys, TILE_SIZE).astype(np.int64)
+        inside = (tile_x >= 0) & (tile_x < self.width) & (tile_y >= 0) & (tile_y < self.height)
+        result = np.zeros(len(tile_x), dtype=np.bool_)
+        grid = np.frombuffer(self.passability, dtype=np.uint8)
+        result[inside] = grid[tile_y[inside] * self.width + tile_x[inside]] != 0
+        return result
+        
+    def get_region(self, tile_x, tile_y):
+        """Get the connected region of a tile; blocked and off-map tiles are region 0"""
+        return self.regions.get_region(tile_x, tile_y)
+        
+    def are_tiles_connected(self, start, goal):
+        """Check if a walk exists between two tiles without searching for it"""
+        region = self.get_region(*start)
+        return region != 0 and region == self.get_region(*goal)
+        
+    def get_reachable_point(self, x, y, target_x, target_y):
+        """Get the target if it can be walked to from (x, y), otherwise the centre of the closest tile that can"""
+        tile_x = int(x // TILE_SIZE)
+        tile_y = int(y // TILE_SIZE)
+        region = self.get_region(tile_x, tile_y)
+        # Units stuck on blocked tiles are left for the path search to walk out
+        if region == 0 or region == self.get_region(int(target_x // TILE_SIZE), int(target_y // TILE_SIZE)):
+            return (target_x, target_y)
+            
+        nearest_x, nearest_y = self.regions.find_nearest_tile(region, int(target_x // TILE_SIZE), int(target_y // TILE_SIZE))
+        return ((nearest_x + 0.5) * TILE_SIZE, (nearest_y + 0.5) * TILE_SIZE)
         
     def get_tile_type(self, x, y):
         """Get the type of tile at the given coordinates"""
         # Convert to tile coordinates
-        tile_x = int(x / TILE_SIZE)
-        tile_y = int(y / TILE_SIZE)
+        tile_x = int(x // TILE_SIZE)
+        tile_y = int(y // TILE_SIZE)
         
         # Check if out of bounds
         if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
             return -1
             
-        return self.tiles[tile_x][tile_y]
+        return int(self.tiles[tile_x, tile_y])
+        
+    def get_tile_block(self, left, top, right, bottom):
+        """Get the tile types of a rectangle of tiles as an array indexed [x, y]"""
+        return self.tiles[left:right, top:bottom]
+        
+    def prefetch_area(self, left, top, right, bottom):
+        """Make sure the tiles under a world-space rectangle are ready; the whole map always is"""
+        pass
+        
+    def invalidate_tiles(self, changed_tiles):
+        """Mark the pre-rendered chunks holding the given tiles as stale; None means every chunk"""
+        if changed_tiles is None:
+            self.chunk_surfaces.clear()
+            return
+            
+        for tile_x, tile_y in changed_tiles:
+            self.chunk_surfaces.pop((tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE), None)
+            
+    def get_chunk_surface(self, chunk_x, chunk_y):
+        """Get the pre-rendered surface of a chunk, drawing it if it is missing or stale"""
+        surface = self.chunk_surfaces.get((chunk_x, chunk_y))
+        if surface is not None:
+            return surface
+            
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        surface = pygame.Surface((chunk_pixels, chunk_pixels))
+        if pygame.display.get_surface() is not None:
+            # Match the display format so blits don't convert pixels every frame
+            surface = surface.convert()
+        surface.fill(COLOR_BLACK)
+        
+        start_x = chunk_x * CHUNK_SIZE
+        start_y = chunk_y * CHUNK_SIZE
+        tiles = self.get_tile_block(start_x, start_y, min(self.width, start_x + CHUNK_SIZE), min(self.height, start_y + CHUNK_SIZE))
+        for x in range(tiles.shape[0]):
+            for y in range(tiles.shape[1]):
+                self.draw_tile(surface, int(tiles[x, y]), x * TILE_SIZE, y * TILE_SIZE)
+                
+        self.chunk_surfaces[(chunk_x, chunk_y)] = surface
+        return surface
         
     def render(self, screen, camera_x, camera_y):
         """Render the visible portion of the map"""
-        # Calculate visible tile range
-        start_x = max(0, int(camera_x / TILE_SIZE))
-        start_y = max(0, int(camera_y / TILE_SIZE))
-        end_x = min(self.width, start_x + int(screen.get_width() / TILE_SIZE) + 2)
-        end_y = min(self.height, start_y + int(screen.get_height() / TILE_SIZE) + 2)
-        
-        # Render visible tiles
-        for x in range(start_x, end_x):
-            for y in range(start_y, end_y):
-                # Calculate screen position
-                screen_x = int(x * TILE_SIZE - camera_x)
-                screen_y = int(y * TILE_SIZE - camera_y)
-                
-                # Get tile color
-                tile_type = self.tiles[x][y]
-                tile_color = self.tile_colors[tile_type]
-                
-                # Draw tile
-                pygame.draw.rect(screen, tile_color, (screen_x, screen_y, TILE_SIZE, TILE_SIZE))
-                
-                # Draw tile border
-                pygame.draw.rect(screen, (50, 50, 50), (screen_x, screen_y, TILE_SIZE, TILE_SIZE), 1)
-                
-                # Draw special tile indicators
-                if tile_type == self.TILE_GOLD:
-                    # Draw gold symbol
-                    gold_color = (255, 200, 0)
-                    radius = TILE_SIZE // 4
-                    pygame.draw.circle(screen, gold_color, 
-                                     (screen_x + TILE_SIZE // 2, screen_y + TILE_SIZE // 2), radius)
-                
-                elif tile_type == self.TILE_FOREST:
-                    # Draw simple tree
-                    tree_color = (0, 80, 0)
-                    trunk_color = (100, 50, 0)
-                    
-                    # Tree trunk
-                    pygame.draw.rect(screen, trunk_color, (
-                        screen_x + TILE_SIZE // 2 - 2,
-                        screen_y + TILE_SIZE // 2,
-                        4,
-                        TILE_SIZE // 2 - 2
-                    ))
-                    
-                    # Tree crown
-                    pygame.draw.circle(screen, tree_color, 
-                                     (screen_x + TILE_SIZE // 2, screen_y + TILE_SIZE // 3), TILE_SIZE // 3)
+        # Calculate visible chunk range
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        start_x = max(0, int(camera_x // chunk_pixels))
+        start_y = max(0, int(camera_y // chunk_pixels))
+        end_x = min(math.ceil(self.width / CHUNK_SIZE), int((camera_x + screen.get_width()) // chunk_pixels) + 1)
+        end_y = min(math.ceil(self.height / CHUNK_SIZE), int((camera_y + screen.get_height()) // chunk_pixels) + 1)
+        
+        # Blit one pre-rendered surface per visible chunk
+        for chunk_x in range(start_x, end_x):
+            for chunk_y in range(start_y, end_y):
+                surface = self.get_chunk_surface(chunk_x, chunk_y)
+                screen.blit(surface, (int(chunk_x * chunk_pixels - camera_x), int(chunk_y * chunk_pixels - camera_y)))
                 
-                elif tile_type == self.TILE_MOUNTAIN:
-                    # Draw mountain symbol
-                    pygame.draw.polygon(screen, (120, 120, 120), [
-                        (screen_x + TILE_SIZE // 2, screen_y + 4),
-                        (screen_x + 4, screen_y + TILE_SIZE - 4),
-                        (screen_x + TILE_SIZE - 4, screen_y + TILE_SIZE - 4)
-                    ]) 
\ No newline at end of file
+    def draw_tile(self, surface, tile_type, screen_x, screen_y):
+        """Draw a single tile onto a surface"""
+        # Get tile color
+        tile_color = self.tile_colors[tile_type]
+        
+        # Draw tile
+        pygame.draw.rect(surface, tile_color, (screen_x, screen_y, TILE_SIZE, TILE_SIZE))
+        
+        # Draw tile border
+        pygame.draw.rect(surface, (50, 50, 50), (screen_x, screen_y, TILE_SIZE, TILE_SIZE), 1)
+        
+        # Draw special tile indicators
+        if tile_type == self.TILE_GOLD:
+            # Draw gold symbol
+            gold_color = (255, 200, 0)
+            radius = TILE_SIZE // 4
+            pygame.draw.circle(surface, gold_color, 
+                             (screen_x + TILE_SIZE // 2, screen_y + TILE_SIZE // 2), radius)
+        
+        elif tile_type == self.TILE_FOREST:
+            # Draw simple tree
+            tree_color = (0, 80, 0)
+            trunk_color = (100, 50, 0)
+            
+            # Tree trunk
+            pygame.draw.rect(surface, trunk_color, (
+                screen_x + TILE_SIZE // 2 - 2,
+                screen_y + TILE_SIZE // 2,
+                4,
+                TILE_SIZE // 2 - 2
+            ))
+            
+            # Tree crown
+            pygame.draw.circle(surface, tree_color, 
+                             (screen_x + TILE_SIZE // 2, screen_y + TILE_SIZE // 3), TILE_SIZE // 3)
+        
+        elif tile_type == self.TILE_MOUNTAIN:
+            # Draw mountain symbol
+            pygame.draw.polygon(surface, (120, 120, 120), [
+                (screen_x + TILE_SIZE // 2, screen_y + 4),
+                (screen_x + 4, screen_y + TILE_SIZE - 4),
+                (screen_x + TILE_SIZE - 4, screen_y + TILE_SIZE - 4)
+            ]) 
\ No newline at end of file
@@ -0,0 +1,87 @@
+import math
+import numpy as np
+
+# Neighbour offsets as (dx, dy)
+STRAIGHT_STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+DIAGONAL_STEPS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+DIAGONAL_COST = math.sqrt(2)
+
+# Neighbour offsets as (dx, dy, step cost)
+STEPS = tuple((dx, dy, 1.0) for dx, dy in STRAIGHT_STEPS) + tuple((dx, dy, DIAGONAL_COST) for dx, dy in DIAGONAL_STEPS)
+
+def octile_distance(dx, dy):
+    """Cost of the shortest 8-way walk across dx by dy tiles on open ground"""
+    dx = abs(dx)
+    dy = abs(dy)
+    return max(dx, dy) + (DIAGONAL_COST - 1) * min(dx, dy)
+
+def passable_neighbors(passability, width, height, index):
+    """Yield (neighbor index, step cost) for passable tiles around a row-major index, without cutting corners"""
+    x = index % width
+    y = index // width
+
+    for dx, dy in STRAIGHT_STEPS:
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < width and 0 <= ny < height and passability[ny * width + nx]:
+            yield ny * width + nx, 1.0
+
+    for dx, dy in DIAGONAL_STEPS:
+        nx, ny = x + dx, y + dy
+        if (0 <= nx < width and 0 <= ny < height and passability[ny * width + nx] and
+                passability[y * width + nx] and passability[ny * width + x]):
+            yield ny * width + nx, DIAGONAL_COST
+
+def shift(grid, dx, dy, fill):
+    """Get grid[y + dy, x + dx] for every cell, padding off-map reads with fill"""
+    height, width = grid.shape
+    result = np.full_like(grid, fill)
+    dst_x = slice(max(0, -dx), width - max(0, dx))
+    dst_y = slice(max(0, -dy), height - max(0, dy))
+    src_x = slice(max(0, dx), width - max(0, -dx))
+    src_y = slice(max(0, dy), height - max(0, -dy))
+    result[dst_y, dst_x] = grid[src_y, src_x]
+    return result
+
+def get_step_masks(passable):
+    """Mark the cells of a (height, width) bool grid that can take each of STEPS; returns (len(STEPS), height, width)
+
+    A step needs both of its ends passable, and a diagonal step also the two
+    tiles at the corner it passes, so a step is allowed from one end exactly
+    when the reverse step is allowed from the other.
+    """
+    masks = np.empty((len(STEPS),) + passable.shape, dtype=np.bool_)
+    for mask, (dx, dy, _) in zip(masks, STEPS):
+        np.logical_and(passable, shift(passable, dx, dy, False), out=mask)
+        if dx and dy:
+            # Diagonal steps may not cut the corner of a blocked tile
+            mask &= shift(passable, dx, 0, False) & shift(passable, 0, dy, False)
+    return masks
+
+def integrate_distances(distances, step_masks, frontier):
+    """Spread walking distances out from the frontier cells of a flattened grid, in place
+
+    distances holds a float per cell, inf where not yet reached, and frontier
+    the flat indices whose distances were just set. Each pass relaxes only the
+    neighbours of the cells that improved in the pass before, so the work
+    follows the wavefront rather than sweeping the whole grid per step.
+    """
+    width = step_masks.shape[2]
+    masks = step_masks.reshape(len(STEPS), -1)
+    offsets = np.array([dy * width + dx for dx, dy, _ in STEPS], dtype=np.int64)
+    costs = np.array([cost for _, _, cost in STEPS], dtype=distances.dtype)
+    frontier = np.asarray(frontier, dtype=np.int64)
+    owner = np.empty(len(distances), dtype=np.int64)  # Scratch for dropping repeated cells without sorting
+    while len(frontier):
+        step, source = np.nonzero(masks[:, frontier])
+        source = frontier[source]
+        neighbor = source + offsets[step]
+        candidate = distances[source] + costs[step]
+        better = candidate < distances[neighbor]
+        neighbor = neighbor[better]
+        np.minimum.at(distances, neighbor, candidate[better])
+
+        # Each improved cell joins the next frontier once, through whichever entry wrote it last
+        order = np.arange(len(neighbor))
+        owner[neighbor] = order
+        frontier = neighbor[owner[neighbor] == order]
+    return distances
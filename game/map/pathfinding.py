@@ -0,0 +1,238 @@
+import heapq
+import math
+from collections import OrderedDict
+from game.constants import TILE_SIZE, PATH_CACHE_SIZE, HIERARCHICAL_MIN_DISTANCE
+from game.map.grid import octile_distance, passable_neighbors
+from game.map.cluster_graph import ClusterGraph
+
+class Pathfinder:
+    """A* path search over the GameMap passability grid, with a path cache and batched requests"""
+
+    def __init__(self, game_map):
+        self.game_map = game_map
+        self.cache = OrderedDict()  # (start tile, goal tile) -> tuple of tiles
+        self.pending_requests = []
+        self.cluster_graph = None
+        # Streamed maps never search paths, so they only use the request queue
+        if not game_map.is_streamed:
+            # Long searches run on the cluster/portal abstraction and are refined locally
+            self.cluster_graph = ClusterGraph(game_map)
+            game_map.add_tile_listener(self.on_tiles_changed)
+
+    def on_tiles_changed(self, changed_tiles):
+        """Drop cached paths that the changed tiles may have invalidated"""
+        if changed_tiles is None:
+            self.cache.clear()
+            return
+
+        # A newly opened tile can shorten any path, so start over
+        if any(self.game_map.is_tile_passable(x, y) for x, y in changed_tiles):
+            self.cache.clear()
+            return
+
+        blocked = set(changed_tiles)
+        for key in [key for key, path in self.cache.items() if not blocked.isdisjoint(path)]:
+            del self.cache[key]
+
+    def prepare(self):
+        """Build the cluster graph for a new map now, so the first long search of the match doesn't stall a tick"""
+        self.cluster_graph.ensure_built()
+
+    def to_tile(self, x, y):
+        """Convert a world position to tile coordinates"""
+        return (int(x // TILE_SIZE), int(y // TILE_SIZE))
+
+    def request_path(self, unit, target_x, target_y):
+        """Queue a path request; all requests are answered together by process_requests"""
+        self.pending_requests.append((unit, target_x, target_y))
+
+    def process_requests(self):
+        """Answer every queued request, sharing one search between units heading to the same tile"""
+        if not self.pending_requests:
+            return
+
+        groups = OrderedDict()
+        for unit, target_x, target_y in self.pending_requests:
+            goal = self.to_tile(target_x, target_y)
+            groups.setdefault(goal, []).append((unit, target_x, target_y))
+        self.pending_requests = []
+
+        for goal, requests in groups.items():
+            starts = [self.to_tile(unit.x, unit.y) for unit, _, _ in requests]
+            paths = self.find_paths(starts, goal)
+            for (unit, target_x, target_y), start in zip(requests, starts):
+                if unit.health <= 0:
+                    continue
+                path = paths.get(start)
+                if path is None:
+                    unit.stop()
+                else:
+                    unit.follow_path(self.to_waypoints(path, target_x, target_y))
+
+    def find_path(self, start, goal):
+        """Find a tile path from start to goal, or None if there is none"""
+        return self.find_paths([start], goal).get(start)
+
+    def find_paths(self, starts, goal):
+        """Find tile paths from several starts to one goal, returning {start: path or None}"""
+        paths = {}
+        missing = []
+        for start in starts:
+            if start in paths or start in missing:
+                continue
+            cached = self.cache.get((start, goal))
+            if cached is not None:
+                self.cache.move_to_end((start, goal))
+                paths[start] = cached
+            else:
+                missing.append(start)
+
+        if not missing:
+            return paths
+
+        found = {}
+        goal_region = self.game_map.get_region(*goal)
+        if goal_region:
+            # Starts in another region can never get there, so they skip the search;
+            # starts on blocked tiles (region 0) still need one to walk out
+            candidates = [start for start in missing if self.game_map.get_region(*start) in (0, goal_region)]
+            
+            # Far-away starts are searched on the cluster graph, one at a time. The
+            # graph only speeds searches up: a start it finds no route for, e.g.
+            # through entrances a tile change left out, gets the flat search instead
+            flat = []
+            for start in candidates:
+                path = None
+                if octile_distance(start[0] - goal[0], start[1] - goal[1]) >= HIERARCHICAL_MIN_DISTANCE:
+                    path = self.cluster_graph.find_path(start, goal)
+                if path is not None:
+                    found[start] = path
+                else:
+                    flat.append(start)
+                    
+            # Units stuck on impassable tiles can only be walked out of with a forward search
+            walkable = [start for start in flat if self.game_map.is_tile_passable(*start)]
+            stuck = [start for start in flat if start not in walkable]
+            if len(walkable) > 1:
+                found.update(self.search_to_goal(walkable, goal))
+            else:
+                stuck += walkable
+            for start in stuck:
+                path = self.search(start, goal)
+                if path is not None:
+                    found[start] = path
+
+        for start in missing:
+            path = found.get(start)
+            paths[start] = path
+            if path is not None:
+                self.store(start, goal, path)
+        return paths
+
+    def store(self, start, goal, path):
+        """Cache a path, evicting the least recently used entry when full"""
+        self.cache[(start, goal)] = path
+        if len(self.cache) > PATH_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+    def neighbors(self, index):
+        """Yield (neighbor index, step cost) for passable tiles, without cutting corners"""
+        return passable_neighbors(self.game_map.passability, self.game_map.width, self.game_map.height, index)
+
+    def search(self, start, goal):
+        """A* search with an octile distance heuristic"""
+        width = self.game_map.width
+        start_index = start[1] * width + start[0]
+        goal_index = goal[1] * width + goal[0]
+        goal_x, goal_y = goal
+
+        def heuristic(index):
+            return octile_distance(index % width - goal_x, index // width - goal_y)
+
+        came_from = {start_index: None}
+        cost = {start_index: 0.0}
+        open_heap = [(heuristic(start_index), 0, start_index)]
+        counter = 1
+        while open_heap:
+            _, _, index = heapq.heappop(open_heap)
+            if index == goal_index:
+                return self.build_path(came_from, index, reverse=True)
+
+            base_cost = cost[index]
+            for neighbor, step_cost in self.neighbors(index):
+                new_cost = base_cost + step_cost
+                if new_cost < cost.get(neighbor, math.inf):
+                    cost[neighbor] = new_cost
+                    came_from[neighbor] = index
+                    heapq.heappush(open_heap, (new_cost + heuristic(neighbor), counter, neighbor))
+                    counter += 1
+        return None
+
+    def search_to_goal(self, starts, goal):
+        """A* outwards from the goal until every start is reached, sharing one search
+
+        The heuristic is the octile distance to the bounding box of the starts,
+        which stays consistent for all of them at once.
+        """
+        width = self.game_map.width
+        goal_index = goal[1] * width + goal[0]
+        remaining = {start[1] * width + start[0]: start for start in starts}
+        min_x = min(x for x, _ in starts)
+        max_x = max(x for x, _ in starts)
+        min_y = min(y for _, y in starts)
+        max_y = max(y for _, y in starts)
+
+        def heuristic(index):
+            x = index % width
+            y = index // width
+            return octile_distance(max(0, min_x - x, x - max_x), max(0, min_y - y, y - max_y))
+
+        came_from = {goal_index: None}
+        cost = {goal_index: 0.0}
+        settled = set()
+        open_heap = [(heuristic(goal_index), 0, goal_index)]
+        counter = 1
+        found = {}
+        while open_heap and remaining:
+            _, _, index = heapq.heappop(open_heap)
+            if index in settled:
+                continue
+            settled.add(index)
+            if index in remaining:
+                # Parents point towards the goal, so the walk is already start-to-goal
+                found[remaining.pop(index)] = self.build_path(came_from, index, reverse=False)
+
+            base_cost = cost[index]
+            for neighbor, step_cost in self.neighbors(index):
+                new_cost = base_cost + step_cost
+                if new_cost < cost.get(neighbor, math.inf):
+                    cost[neighbor] = new_cost
+                    came_from[neighbor] = index
+                    heapq.heappush(open_heap, (new_cost + heuristic(neighbor), counter, neighbor))
+                    counter += 1
+        return found
+
+    def build_path(self, came_from, index, reverse):
+        """Walk parent links into a tuple of (x, y) tiles"""
+        width = self.game_map.width
+        path = []
+        while index is not None:
+            path.append((index % width, index // width))
+            index = came_from[index]
+        if reverse:
+            path.reverse()
+        return tuple(path)
+
+    def to_waypoints(self, path, target_x, target_y):
+        """Turn a tile path into world-space waypoints, dropping tiles on straight runs"""
+        waypoints = []
+        for i in range(1, len(path) - 1):
+            prev_x, prev_y = path[i - 1]
+            x, y = path[i]
+            next_x, next_y = path[i + 1]
+            if (x - prev_x, y - prev_y) != (next_x - x, next_y - y):
+                waypoints.append(((x + 0.5) * TILE_SIZE, (y + 0.5) * TILE_SIZE))
+
+        # Finish on the exact point that was clicked
+        waypoints.append((target_x, target_y))
+        return waypoints
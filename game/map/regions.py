@@ -0,0 +1,162 @@
+import numpy as np
+from game.map.grid import STRAIGHT_STEPS
+
+# Changes touching more tiles than this relabel the whole map instead
+MAX_INCREMENTAL_TILES = 256
+
+def label_components(passable):
+    """Label the connected passable cells of a (height, width) bool array
+
+    Returns (labels, count) where blocked cells are 0 and regions are 1..count.
+    Diagonal steps may not cut corners, so diagonal neighbours are only joined
+    through an open orthogonal tile and 4-connectivity gives the same regions.
+    """
+    height, width = passable.shape
+    cells = passable.ravel()
+    index = np.arange(cells.size).reshape(height, width)
+    right = passable[:, :-1] & passable[:, 1:]
+    down = passable[:-1, :] & passable[1:, :]
+    edge_a = np.concatenate((index[:, :-1][right], index[:-1, :][down]))
+    edge_b = np.concatenate((index[:, 1:][right], index[1:, :][down]))
+
+    # Hook the larger root of every edge under the smaller one, then jump pointers
+    # until every cell points straight at its root; repeat until no edge spans two roots
+    parent = np.arange(cells.size)
+    while len(edge_a):
+        root_a = parent[edge_a]
+        root_b = parent[edge_b]
+        spans = root_a != root_b
+        if not spans.any():
+            break
+        edge_a = edge_a[spans]
+        edge_b = edge_b[spans]
+        np.minimum.at(parent, np.maximum(root_a[spans], root_b[spans]), np.minimum(root_a[spans], root_b[spans]))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+    labels = np.zeros(cells.size, dtype=np.int32)
+    roots, compact = np.unique(parent[cells], return_inverse=True)
+    labels[cells] = compact + 1
+    return labels.reshape(height, width), len(roots)
+
+class RegionMap:
+    """Connected regions of a GameMap's passable tiles, for O(1) reachability checks
+
+    Labels are built lazily for the whole map and then kept up to date tile by
+    tile: opening a tile merges the regions around it, and closing one only
+    relabels its own region, and only when the tiles around it lose contact.
+    """
+
+    def __init__(self, game_map):
+        self.game_map = game_map
+        self.labels = None  # (height, width) region ids; 0 is blocked
+        self.next_label = 1
+        self.needs_full_build = True
+        game_map.add_tile_listener(self.on_tiles_changed)
+
+    def on_tiles_changed(self, changed_tiles):
+        """Update the labels around changed tiles, or relabel everything for big changes"""
+        if changed_tiles is None or len(changed_tiles) > MAX_INCREMENTAL_TILES:
+            self.needs_full_build = True
+        if self.needs_full_build:
+            return
+
+        for tile_x, tile_y in changed_tiles:
+            if self.game_map.is_tile_passable(tile_x, tile_y):
+                self.open_tile(tile_x, tile_y)
+            else:
+                self.close_tile(tile_x, tile_y)
+
+    def ensure_built(self):
+        """Label the whole map if it changed wholesale since the last query"""
+        if not self.needs_full_build:
+            return
+        passable = np.frombuffer(self.game_map.passability, dtype=np.uint8).reshape(
+            self.game_map.height, self.game_map.width) != 0
+        self.labels, count = label_components(passable)
+        self.next_label = count + 1
+        self.needs_full_build = False
+
+    def get_region(self, tile_x, tile_y):
+        """Get the region of a tile; blocked and off-map tiles are region 0"""
+        self.ensure_built()
+        height, width = self.labels.shape
+        if not (0 <= tile_x < width and 0 <= tile_y < height):
+            return 0
+        return int(self.labels[tile_y, tile_x])
+
+    def get_open_neighbors(self, tile_x, tile_y):
+        """Get the labelled tiles orthogonally next to a tile"""
+        height, width = self.labels.shape
+        neighbors = []
+        for dx, dy in STRAIGHT_STEPS:
+            x, y = tile_x + dx, tile_y + dy
+            if 0 <= x < width and 0 <= y < height and self.labels[y, x]:
+                neighbors.append((x, y))
+        return neighbors
+
+    def open_tile(self, tile_x, tile_y):
+        """Give a newly passable tile a region, merging every region it touches"""
+        if self.labels[tile_y, tile_x]:
+            return
+        touching = {int(self.labels[y, x]) for x, y in self.get_open_neighbors(tile_x, tile_y)}
+        if not touching:
+            self.labels[tile_y, tile_x] = self.next_label
+            self.next_label += 1
+            return
+
+        region = min(touching)
+        self.labels[tile_y, tile_x] = region
+        touching.discard(region)
+        if touching:
+            self.labels[np.isin(self.labels, list(touching))] = region
+
+    def close_tile(self, tile_x, tile_y):
+        """Remove a newly blocked tile from its region, splitting the region if it was a bridge"""
+        region = self.labels[tile_y, tile_x]
+        if not region:
+            return
+        self.labels[tile_y, tile_x] = 0
+
+        # If the open neighbours still touch inside the 3x3 block around the tile, nothing split
+        neighbors = self.get_open_neighbors(tile_x, tile_y)
+        if len(neighbors) <= 1:
+            return
+        left = max(0, tile_x - 1)
+        top = max(0, tile_y - 1)
+        local, _ = label_components(self.labels[top:tile_y + 2, left:tile_x + 2] != 0)
+        if len({int(local[y - top, x - left]) for x, y in neighbors}) == 1:
+            return
+
+        # Relabel the region within its bounding box; the first piece keeps the old id
+        rows, columns = np.nonzero(self.labels == region)
+        window = self.labels[rows.min():rows.max() + 1, columns.min():columns.max() + 1]
+        member = window == region
+        pieces, count = label_components(member)
+        window[member] = np.where(pieces[member] == 1, region, pieces[member] + self.next_label - 2)
+        self.next_label += count - 1
+
+    def find_nearest_tile(self, region, tile_x, tile_y):
+        """Get the tile of a region closest to a tile, or None if the region has no tiles"""
+        self.ensure_built()
+        height, width = self.labels.shape
+        radius = 8
+        while True:
+            left = max(0, tile_x - radius)
+            top = max(0, tile_y - radius)
+            right = min(width, tile_x + radius + 1)
+            bottom = min(height, tile_y + radius + 1)
+            rows, columns = np.nonzero(self.labels[top:bottom, left:right] == region)
+            covers_map = left == 0 and top == 0 and right == width and bottom == height
+            if len(rows):
+                distances = (columns + left - tile_x) ** 2 + (rows + top - tile_y) ** 2
+                best = int(np.argmin(distances))
+                # Anything outside the window is further than radius away
+                if distances[best] <= radius * radius or covers_map:
+                    return (int(columns[best]) + left, int(rows[best]) + top)
+            elif covers_map:
+                return None
+            radius *= 2
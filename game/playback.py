@@ -0,0 +1,116 @@
+import argparse
+import bisect
+import copy
+import time
+from collections import deque
+from game.engine import GameEngine
+from game.replay import Replay
+from game.headless import describe_match
+from game.entities.entity_manager import EntityManager
+from game.constants import STATE_PLAYING, FPS
+
+# Ticks between the snapshots taken while playing, which seeking restarts from
+SNAPSHOT_INTERVAL = 60 * FPS
+
+class ReplayPlayer:
+    """Plays a replay headless, as fast as the simulation runs, and seeks within it
+
+    Snapshots of the simulation are taken every SNAPSHOT_INTERVAL ticks on the way
+    forward, so seeking back only re-simulates from the nearest earlier snapshot.
+    """
+
+    def __init__(self, replay, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.replay = replay
+        self.snapshot_interval = snapshot_interval
+        self.command_ticks = [command.tick for command in replay.commands]
+        self.snapshots = {}  # Tick -> copy of the simulation state at the start of that tick
+
+        self.engine = GameEngine(None, headless=True)
+        self.playing_state = self.engine.states[STATE_PLAYING]
+        self.playing_state.map_seed = replay.seed
+        self.playing_state.map_path = replay.map_path
+        self.playing_state.entity_manager = EntityManager(use_arrays=replay.use_arrays)
+        self.engine.change_state(STATE_PLAYING)
+        self.playing_state.pending_commands.extend(replay.commands)
+
+    @property
+    def tick(self):
+        return self.playing_state.elapsed_time
+
+    def get_snapshot_memo(self):
+        """Memo that makes deepcopy share the map and cached flow fields instead of copying them"""
+        playing_state = self.playing_state
+        memo = {id(playing_state.game_map): playing_state.game_map}
+        for field in playing_state.flow_fields.fields.values():
+            memo[id(field)] = field
+        return memo
+
+    def take_snapshot(self):
+        """Remember the simulation state at the current tick"""
+        playing_state = self.playing_state
+        state = (playing_state.entity_manager, playing_state.pathfinder.pending_requests,
+                 playing_state.resources, playing_state.elapsed_time)
+        self.snapshots[self.tick] = copy.deepcopy(state, self.get_snapshot_memo())
+
+    def restore_snapshot(self, tick):
+        """Put the simulation back to a snapshot taken at tick"""
+        playing_state = self.playing_state
+        # Copy again so the snapshot stays untouched for later seeks
+        (playing_state.entity_manager, playing_state.pathfinder.pending_requests,
+         playing_state.resources, playing_state.elapsed_time) = copy.deepcopy(self.snapshots[tick], self.get_snapshot_memo())
+        playing_state.selected_entities = []
+        first = bisect.bisect_left(self.command_ticks, tick)
+        playing_state.pending_commands = deque(self.replay.commands[first:])
+        self.engine.running = True
+        self.engine.final_state = None
+
+    def step(self):
+        """Simulate one tick"""
+        if self.tick % self.snapshot_interval == 0 and self.tick not in self.snapshots:
+            self.take_snapshot()
+        self.engine.update()
+
+    def seek(self, tick):
+        """Move the simulation to the start of tick, restoring a snapshot if that is behind us"""
+        if tick < self.tick:
+            self.restore_snapshot(max(snapshot for snapshot in self.snapshots if snapshot <= tick))
+        else:
+            # Jump ahead to a later snapshot if one was already taken
+            later = [snapshot for snapshot in self.snapshots if self.tick < snapshot <= tick]
+            if later:
+                self.restore_snapshot(max(later))
+        while self.tick < tick and self.engine.running:
+            self.step()
+
+    def play(self, ticks=None):
+        """Play to the end of the recording, or for ticks more ticks"""
+        end = self.replay.ticks if ticks is None else self.tick + ticks
+        self.seek(end)
+
+    def matches_recording(self):
+        """Check the simulation ended up where the recording did; only meaningful at the recording's last tick"""
+        return self.replay.checksum == self.playing_state.entity_manager.get_state_checksum()
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a replay back without a window")
+    parser.add_argument("path", help="replay file")
+    parser.add_argument("--seek", type=int, default=None, help="tick to stop at instead of the end of the recording")
+    args = parser.parse_args()
+
+    replay = Replay.load(args.path)
+    player = ReplayPlayer(replay)
+    start = time.perf_counter()
+    player.seek(replay.ticks if args.seek is None else args.seek)
+    seconds = time.perf_counter() - start
+
+    result = describe_match(player.engine, player.tick, seconds)
+    print(f"Played {result['ticks']} ticks of {replay.ticks} in {seconds:.2f}s "
+          f"({result['ticks_per_second'] / FPS:.0f}x real time), {len(replay.commands)} commands")
+    if player.tick == replay.ticks:
+        print("Final state matches the recording" if player.matches_recording() else "Final state DIFFERS from the recording")
+    print(f"Winner: {result['winner'] or 'none'}")
+    print(f"Player: {result['player_units']} units, {result['player_buildings']} buildings")
+    print(f"Enemy: {result['enemy_units']} units, {result['enemy_buildings']} buildings")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import json
+import struct
+import zlib
+from game.commands import Command
+
+REPLAY_MAGIC = b"GFLRPLAY"
+REPLAY_VERSION = 1
+# Magic, format version, then the length of the JSON match header that follows
+REPLAY_PREFIX = struct.Struct("<8sHI")
+
+class Replay:
+    """A match's setup plus every command issued in it, enough to re-run it exactly
+
+    The file is a short JSON header (map seed or map file, final tick and state
+    checksum) followed by the zlib-compressed binary command stream.
+    """
+
+    def __init__(self, seed=None, map_path=None, commands=(), ticks=0, checksum=None, use_arrays=False):
+        self.seed = seed
+        self.map_path = map_path
+        self.use_arrays = use_arrays  # Entity backend the match ran on, which playback uses too
+        self.commands = list(commands)
+        self.ticks = ticks  # Tick the recording stopped at
+        self.checksum = checksum  # EntityManager.get_state_checksum() at that tick, to verify playback
+
+    def save(self, path):
+        """Write the replay to a file"""
+        header = json.dumps({
+            "seed": self.seed,
+            "map_path": self.map_path,
+            "ticks": self.ticks,
+            "checksum": self.checksum,
+            "use_arrays": self.use_arrays,
+        }).encode("utf-8")
+        body = zlib.compress(b"".join(command.encode() for command in self.commands), 9)
+        with open(path, "wb") as f:
+            f.write(REPLAY_PREFIX.pack(REPLAY_MAGIC, REPLAY_VERSION, len(header)))
+            f.write(header)
+            f.write(body)
+
+    @classmethod
+    def load(cls, path):
+        """Read a replay written by save"""
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < REPLAY_PREFIX.size:
+            raise ValueError(f"{path} is not a replay file")
+        magic, version, header_length = REPLAY_PREFIX.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+        if version != REPLAY_VERSION:
+            raise ValueError(f"Unsupported replay version {version} in {path}")
+
+        offset = REPLAY_PREFIX.size
+        header = json.loads(data[offset:offset + header_length].decode("utf-8"))
+        body = zlib.decompress(data[offset + header_length:])
+
+        commands = []
+        position = 0
+        while position < len(body):
+            command, position = Command.decode(body, position)
+            commands.append(command)
+        return cls(header["seed"], header["map_path"], commands, header["ticks"], header["checksum"],
+                   header.get("use_arrays", False))
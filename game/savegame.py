@@ -0,0 +1,61 @@
+import json
+import struct
+import zlib
+import numpy as np
+
+SAVE_MAGIC = b"GFLRSAVE"
+SAVE_VERSION = 1
+# Magic, format version, then the length of the JSON header that follows
+SAVE_PREFIX = struct.Struct("<8sHI")
+# Fast compression; tiles and entity columns are repetitive enough that it still shrinks them well
+SAVE_COMPRESSION_LEVEL = 1
+
+def write_save_file(path, meta, arrays):
+    """Write metadata and named arrays to a versioned, compressed save file
+
+    The JSON header holds the metadata and each array's name, dtype and shape;
+    the arrays follow as one zlib stream of their raw bytes, in header order.
+    """
+    layout = []
+    compressor = zlib.compressobj(SAVE_COMPRESSION_LEVEL)
+    chunks = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        layout.append([name, array.dtype.str, list(array.shape)])
+        chunks.append(compressor.compress(array.reshape(-1).view(np.uint8)))
+    chunks.append(compressor.flush())
+
+    header = json.dumps({"meta": meta, "arrays": layout}).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(SAVE_PREFIX.pack(SAVE_MAGIC, SAVE_VERSION, len(header)))
+        f.write(header)
+        for chunk in chunks:
+            f.write(chunk)
+
+def read_save_file(path):
+    """Read a file written by write_save_file; returns (meta, {name: array})"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < SAVE_PREFIX.size:
+        raise ValueError(f"{path} is not a save file")
+    magic, version, header_length = SAVE_PREFIX.unpack_from(data)
+    if magic != SAVE_MAGIC:
+        raise ValueError(f"{path} is not a save file")
+    if version != SAVE_VERSION:
+        raise ValueError(f"Unsupported save version {version} in {path}")
+
+    offset = SAVE_PREFIX.size
+    header = json.loads(data[offset:offset + header_length].decode("utf-8"))
+    body = zlib.decompress(data[offset + header_length:])
+
+    arrays = {}
+    position = 0
+    for name, dtype, shape in header["arrays"]:
+        dtype = np.dtype(dtype)
+        size = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        # Copy out of the shared buffer so every array is writable on its own
+        arrays[name] = np.frombuffer(body, dtype=dtype, count=size // dtype.itemsize, offset=position).reshape(shape).copy()
+        position += size
+    if position != len(body):
+        raise ValueError(f"{path} is corrupt: expected {position} bytes of data, found {len(body)}")
+    return header["meta"], arrays
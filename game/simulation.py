@@ -0,0 +1,294 @@
+import math
+import queue
+import threading
+import time
+import numpy as np
+from operator import attrgetter
+from game.constants import FPS, MAX_TICKS_PER_FRAME, ENTITY_UNIT, ENTITY_BUILDING
+from game.entities.entity_types import ENTITY_TYPES
+from game.entities.unit import draw_unit
+from game.entities.building import draw_building
+from game.entities.entity_manager import get_column
+
+def _get_production_progress(building):
+    """Fraction of the current unit a building has made, NaN when idle"""
+    if building.current_production is None or building.production_cooldown <= 0:
+        return math.nan
+    return ((building.scheduler.current_tick - building.production_started) /
+            (building.production_due - building.production_started))
+
+class SnapshotEntity:
+    """One entity as a RenderSnapshot saw it, standing in for the live entity on the main thread
+
+    Two of them are equal when they are the same entity, so a selection can
+    hold entities from different snapshots.
+    """
+
+    __slots__ = ("id", "type", "is_player", "can_move", "health", "max_health")
+
+    def __init__(self, entity_id, stats, is_player, health):
+        self.id = entity_id
+        self.type = stats.name
+        self.is_player = is_player
+        self.can_move = stats.can_move
+        self.health = health
+        self.max_health = stats.max_health
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotEntity) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+class RenderSnapshot:
+    """What drawing needs from one tick, copied out of the simulation so rendering never reads live state
+
+    Units and buildings each get a table of columns ordered by id. With the
+    EntityArrays backend the tables are sliced straight out of its columns. A
+    snapshot is never changed after the simulation thread publishes it.
+    """
+
+    def __init__(self, playing_state):
+        self.published_at = time.perf_counter()
+        self.tick = playing_state.elapsed_time
+        self.resources = dict(playing_state.resources)
+        entity_manager = playing_state.entity_manager
+        self.player_units = entity_manager.count_entities(True, ENTITY_UNIT)
+        self.player_buildings = entity_manager.count_entities(True, ENTITY_BUILDING)
+
+        if entity_manager.arrays is not None:
+            self.units, self.buildings, buildings = self.get_array_tables(entity_manager.arrays)
+        else:
+            # Ids are handed out in increasing order, so the id index is already sorted
+            entities = [entity_manager.get_entity(handle) for handle in entity_manager.ids.values()]
+            units = [entity for entity in entities if entity.kind == ENTITY_UNIT]
+            buildings = [entity for entity in entities if entity.kind == ENTITY_BUILDING]
+            self.units = self.get_columns(units)
+            self.units["target_x"] = get_column(
+                units, lambda unit: math.nan if unit.target_x is None else unit.target_x, np.float64)
+            self.units["target_y"] = get_column(
+                units, lambda unit: math.nan if unit.target_y is None else unit.target_y, np.float64)
+            self.buildings = self.get_columns(buildings)
+        # Buildings are few and their progress lives on the objects, so those columns are gathered one by one
+        self.buildings["construction"] = get_column(
+            buildings, lambda building: math.nan if building.is_completed else building.construction_progress, np.float64)
+        self.buildings["production"] = get_column(buildings, _get_production_progress, np.float64)
+
+    @staticmethod
+    def get_columns(entities):
+        """Gather the columns every entity kind has"""
+        return {
+            "id": get_column(entities, attrgetter("id"), np.int64),
+            "type_id": get_column(entities, attrgetter("type_id"), np.uint16),
+            "is_player": get_column(entities, attrgetter("is_player"), np.bool_),
+            "x": get_column(entities, attrgetter("x"), np.float64),
+            "y": get_column(entities, attrgetter("y"), np.float64),
+            "radius": get_column(entities, attrgetter("radius"), np.float64),
+            "health": get_column(entities, attrgetter("health"), np.int64),
+        }
+
+    @staticmethod
+    def get_array_tables(arrays):
+        """Slice the unit and building tables out of EntityArrays columns; returns (units, buildings, building entities)"""
+        rows = np.flatnonzero(arrays.alive[:arrays.size])
+        rows = rows[np.argsort(arrays.id[rows])]
+        unit_types = np.array([entity_type.kind == ENTITY_UNIT for entity_type in ENTITY_TYPES.types])
+        is_unit = unit_types[arrays.type_id[rows]]
+        tables = []
+        for table_rows in (rows[is_unit], rows[~is_unit]):
+            tables.append({
+                "id": arrays.id[table_rows],
+                "type_id": arrays.type_id[table_rows],
+                "is_player": arrays.is_player[table_rows],
+                "x": arrays.x[table_rows],
+                "y": arrays.y[table_rows],
+                "radius": arrays.radius[table_rows].astype(np.float64),
+                "health": arrays.health[table_rows],
+            })
+        unit_rows = rows[is_unit]
+        has_target = arrays.has_target[unit_rows]
+        tables[0]["target_x"] = np.where(has_target, arrays.target_x[unit_rows], math.nan)
+        tables[0]["target_y"] = np.where(has_target, arrays.target_y[unit_rows], math.nan)
+        return tables[0], tables[1], [arrays.entities[row] for row in rows[~is_unit].tolist()]
+
+    def find_row(self, entity_id):
+        """Get (table name, row) of an entity, or None if it isn't in the snapshot"""
+        for table in ("units", "buildings"):
+            ids = getattr(self, table)["id"]
+            row = int(np.searchsorted(ids, entity_id))
+            if row < len(ids) and ids[row] == entity_id:
+                return table, row
+        return None
+
+    def get_entity(self, entity_id):
+        """Get a SnapshotEntity for an entity, or None if it isn't in the snapshot"""
+        found = self.find_row(entity_id)
+        if found is None:
+            return None
+        table, row = found
+        columns = getattr(self, table)
+        return SnapshotEntity(entity_id, ENTITY_TYPES.get_by_id(int(columns["type_id"][row])),
+                              bool(columns["is_player"][row]), int(columns["health"][row]))
+
+    def get_render_positions(self, table, previous, interpolation):
+        """Get a table's (x, y) interpolated from the previous snapshot; entities new since then don't move"""
+        columns = getattr(self, table)
+        x, y, ids = columns["x"], columns["y"], columns["id"]
+        if previous is None or interpolation >= 1.0:
+            return x, y
+        old = getattr(previous, table)
+        if len(old["id"]) == 0 or len(ids) == 0:
+            return x, y
+        # Both tables are ordered by id, so each row's earlier position is a binary search away
+        match = np.minimum(np.searchsorted(old["id"], ids), len(old["id"]) - 1)
+        existed = old["id"][match] == ids
+        old_x = np.where(existed, old["x"][match], x)
+        old_y = np.where(existed, old["y"][match], y)
+        return old_x + (x - old_x) * interpolation, old_y + (y - old_y) * interpolation
+
+    def get_combined(self, name):
+        """Get one column of units and buildings together, units first"""
+        return np.concatenate([self.units[name], self.buildings[name]])
+
+    def find_entity_at(self, x, y):
+        """Get the id of the oldest entity covering a world position, or None"""
+        ids = self.get_combined("id")
+        inside = ((self.get_combined("x") - x) ** 2 + (self.get_combined("y") - y) ** 2 <=
+                  self.get_combined("radius") ** 2)
+        return int(ids[inside].min()) if inside.any() else None
+
+    def find_entities_in_rect(self, rect):
+        """Get the ids of every entity overlapping a world rect, in id order"""
+        x, y, radius = self.get_combined("x"), self.get_combined("y"), self.get_combined("radius")
+        overlaps = ((x + radius > rect.left) & (x - radius < rect.right) &
+                    (y + radius > rect.top) & (y - radius < rect.bottom))
+        return np.sort(self.get_combined("id")[overlaps]).tolist()
+
+    def get_position(self, entity_id, previous=None, interpolation=1.0):
+        """Get one entity's render position and radius, or None if it isn't in the snapshot"""
+        found = self.find_row(entity_id)
+        if found is None:
+            return None
+        table, row = found
+        x, y = self.get_render_positions(table, previous, interpolation)
+        return x[row], y[row], getattr(self, table)["radius"][row]
+
+    def render(self, screen, camera_x, camera_y, previous=None, interpolation=1.0):
+        """Draw every entity, interpolated from the previous snapshot and ordered by y like EntityManager.render"""
+        unit_x, unit_y = self.get_render_positions("units", previous, interpolation)
+        building_x, building_y = self.get_render_positions("buildings", previous, interpolation)
+        unit_count = len(unit_x)
+        order = np.argsort(np.concatenate([unit_y, building_y]), kind="stable")
+
+        units = self.units
+        buildings = self.buildings
+        for index in order.tolist():
+            if index < unit_count:
+                stats = ENTITY_TYPES.get_by_id(int(units["type_id"][index]))
+                target = None
+                if not math.isnan(units["target_x"][index]):
+                    target = (int(units["target_x"][index] - camera_x), int(units["target_y"][index] - camera_y))
+                draw_unit(screen, stats, bool(units["is_player"][index]), int(unit_x[index] - camera_x),
+                          int(unit_y[index] - camera_y), int(units["health"][index]), target)
+            else:
+                row = index - unit_count
+                stats = ENTITY_TYPES.get_by_id(int(buildings["type_id"][row]))
+                construction = float(buildings["construction"][row])
+                production = float(buildings["production"][row])
+                draw_building(screen, stats, bool(buildings["is_player"][row]), int(building_x[row] - camera_x),
+                              int(building_y[row] - camera_y), int(buildings["health"][row]),
+                              None if math.isnan(construction) else construction,
+                              None if math.isnan(production) else production)
+
+class SimulationThread:
+    """Runs a PlayingState's ticks on a worker thread at the fixed tick rate
+
+    After every tick the thread publishes a RenderSnapshot as the newer half of
+    a (previous, current) pair. Publishing swaps that one reference, so the
+    render loop reads whichever pair is current without either side taking a
+    lock. Player input comes back as Commands through a queue and is stamped by
+    the simulation thread with the tick it takes effect on, keeping replays exact.
+    """
+
+    def __init__(self, playing_state):
+        self.playing_state = playing_state
+        self.tick_duration = 1.0 / FPS
+        self.frames = (None, None)  # (previous, current) snapshots
+        self.commands = queue.SimpleQueue()
+        self.requested_state = None  # State the match asked to change to, acted on by the main thread
+        self.error = None  # Exception that stopped the thread, re-raised on the main thread
+        self.stopping = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        """Start ticking; the state must not be touched from the main thread until stop()"""
+        if self.thread is not None:
+            return
+        self.requested_state = None
+        self.publish()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name="simulation", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop ticking, waiting for the tick in progress to finish"""
+        if self.thread is None:
+            return
+        self.stopping.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def submit(self, command):
+        """Queue a player order from the main thread; it takes effect at the next tick boundary"""
+        self.commands.put(command)
+
+    def publish(self):
+        """Make the state as of the last tick the one rendered"""
+        self.frames = (self.frames[1], RenderSnapshot(self.playing_state))
+
+    def get_interpolation(self):
+        """How far rendering should be from the previous snapshot towards the current one"""
+        current = self.frames[1]
+        if current is None:
+            return 1.0
+        return min(1.0, (time.perf_counter() - current.published_at) / self.tick_duration)
+
+    def poll(self):
+        """Called by the main thread each frame; returns a state the match asked to change to, if any"""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        requested, self.requested_state = self.requested_state, None
+        return requested
+
+    def request_state(self, state):
+        """Ask the main thread to change state, and stop ticking after this tick"""
+        self.requested_state = state
+        self.stopping.set()
+
+    def run(self):
+        playing_state = self.playing_state
+        next_tick = time.perf_counter()
+        try:
+            while not self.stopping.is_set():
+                now = time.perf_counter()
+                if now < next_tick:
+                    # Wake early if stop() is called while waiting
+                    self.stopping.wait(next_tick - now)
+                    continue
+                if now - next_tick > MAX_TICKS_PER_FRAME * self.tick_duration:
+                    # Too far behind to catch up, so drop the backlog instead of spiralling
+                    next_tick = now
+
+                while not self.commands.empty():
+                    playing_state.issue_command(self.commands.get())
+                playing_state.update()
+                self.publish()
+                next_tick += self.tick_duration
+        except Exception as e:
+            self.error = e
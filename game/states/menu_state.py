@@ -80,8 +80,8 @@ class MenuState(BaseState):
         self.game_engine.change_state(STATE_PLAYING)
     
     def load_game(self):
-        # Placeholder for load game functionality
-        pass
+        if self.game_engine.states[STATE_PLAYING].load_latest_save():
+            self.game_engine.change_state(STATE_PLAYING)
     
     def show_options(self):
         # Placeholder for options menu
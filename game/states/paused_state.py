@@ -1,6 +1,6 @@
 import pygame
 from game.states.base_state import BaseState
-from game.constants import STATE_PLAYING, STATE_MENU, COLOR_BLACK, COLOR_WHITE, SCREEN_WIDTH, SCREEN_HEIGHT
+from game.constants import STATE_PLAYING, STATE_MENU, COLOR_BLACK, COLOR_WHITE, SCREEN_WIDTH, SCREEN_HEIGHT, SAVE_GAME_PATH
 
 class PausedState(BaseState):
     def __init__(self, game_engine):
@@ -19,6 +19,7 @@ class PausedState(BaseState):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
                 # Return to game
+                self.game_engine.states[STATE_PLAYING].resuming = True
                 self.game_engine.change_state(STATE_PLAYING)
             elif event.key == pygame.K_UP:
                 # Move selection up
@@ -33,14 +34,15 @@ class PausedState(BaseState):
     def execute_option(self, option_index):
         option = self.options[option_index]
         
+        playing_state = self.game_engine.states[STATE_PLAYING]
         if option == "Resume":
+            playing_state.resuming = True
             self.game_engine.change_state(STATE_PLAYING)
         elif option == "Save Game":
-            # Placeholder for save game functionality
-            pass
+            playing_state.save_game(SAVE_GAME_PATH)
         elif option == "Load Game":
-            # Placeholder for load game functionality
-            pass
+            if playing_state.load_latest_save():
+                self.game_engine.change_state(STATE_PLAYING)
         elif option == "Options":
             # Placeholder for options menu
             pass
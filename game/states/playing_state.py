@@ -1,30 +1,171 @@
+import os
 import pygame
+import numpy as np
+from collections import deque
 from game.states.base_state import BaseState
-from game.constants import STATE_PAUSED, STATE_VICTORY, COLOR_GREEN, COLOR_BLUE, COLOR_BLACK
+from game.constants import STATE_PAUSED, STATE_VICTORY, COLOR_GREEN, COLOR_BLUE, COLOR_BLACK, FLOW_FIELD_MIN_GROUP, \
+    USE_CHUNKED_WORLD, WORLD_CHUNK_SIZE, TILE_SIZE, ENTITY_UNIT, ENTITY_BUILDING, SAVE_GAME_PATH, AUTOSAVE_PATH, \
+    AUTOSAVE_INTERVAL
 from game.entities.entity_manager import EntityManager
 from game.map.game_map import GameMap
+from game.map.chunked_map import ChunkedGameMap
+from game.map.pathfinding import Pathfinder
+from game.map.flow_field import FlowFieldCache
+from game.commands import Command, COMMAND_MOVE, COMMAND_ATTACK, COMMAND_PRODUCE
+from game.replay import Replay
+from game.savegame import write_save_file, read_save_file
+from game.autosave import Autosaver, read_autosave, get_autosave_time
+from game.simulation import SimulationThread
 
 class PlayingState(BaseState):
     def __init__(self, game_engine):
         super().__init__(game_engine)
         self.entity_manager = EntityManager()
-        self.game_map = GameMap()
+        self.game_map = ChunkedGameMap() if USE_CHUNKED_WORLD else GameMap()
+        self.pathfinder = Pathfinder(self.game_map)
+        self.flow_fields = FlowFieldCache(self.game_map)
         self.camera_x = 0
         self.camera_y = 0
         self.camera_speed = 10
         self.selected_entities = []
         self.selection_start = None
         self.selection_rect = None
-        self.font = pygame.font.SysFont(None, 24)
+        # Headless runs never render, so they skip font loading
+        self.font = None if game_engine.headless else pygame.font.SysFont(None, 24)
         self.resources = {"gold": 1000, "wood": 500}
         self.elapsed_time = 0
+        self.map_path = None  # .engimap file to play on instead of a generated map
+        self.map_seed = None  # Seed for the generated map, None for a random one
+        self.match_seed = None  # Seed the current map was generated from
+        # Orders wait here for the tick they are stamped with, so input never lands mid-tick
+        self.pending_commands = deque()
+        self.recorded_commands = []  # Every order issued this match, for replays
+        self.replay_path = None  # Where to save a replay of the match once it ends
+        self.replay_saved = True  # Whether the current match's replay is written, or there is no match yet
+        self.resuming = False  # Set to re-enter the current match instead of starting a new one
+        # Headless runs are thrown away when they finish, so only windowed play autosaves
+        self.autosaver = None if game_engine.headless else Autosaver(AUTOSAVE_PATH)
+        # Streamed worlds load chunks on demand while drawing as well as while simulating, so they stay on one thread
+        self.simulation = SimulationThread(self) if game_engine.threaded and not self.game_map.is_streamed else None
         
     def enter(self):
-        # Initialize or reset game state
+        # Coming back from the pause menu or a loaded save keeps the match as it is
+        if self.resuming:
+            self.resuming = False
+        else:
+            self.start_match()
+        if self.simulation:
+            self.simulation.start()
+            
+    def start_match(self):
+        """Initialize or reset game state"""
+        # The match being replaced is over, so its replay is complete
+        self.save_replay()
+        self.replay_saved = False
         self.entity_manager.clear()
-        self.game_map.generate_map()
+        self.elapsed_time = 0
+        self.pending_commands.clear()
+        self.recorded_commands = []
+        if self.autosaver:
+            self.autosaver.reset()
+        if self.map_path:
+            self.match_seed = None
+            self.game_map.load_engimap(self.map_path)
+        else:
+            # Pick the seed here so a replay can regenerate the same map
+            self.match_seed = self.map_seed if self.map_seed is not None else int(np.random.SeedSequence().entropy)
+            self.game_map.generate_map(self.match_seed)
+        self.prepare_pathfinding()
         self.setup_initial_units()
         
+    def prepare_pathfinding(self):
+        """Build the search structures for a newly loaded map before its first tick"""
+        # Streamed worlds never search paths, since units head straight for their target
+        if not self.game_map.is_streamed:
+            self.pathfinder.prepare()
+            
+    def exit(self):
+        # Leaving play may only be a pause, so the replay is written when the match ends instead
+        if self.simulation:
+            self.simulation.stop()
+            
+    def get_snapshot(self):
+        """Get a copy of the match as (metadata, {name: array}), taken between ticks"""
+        map_meta, map_arrays = self.game_map.get_snapshot()
+        entity_meta, entity_arrays = self.entity_manager.get_snapshot()
+        arrays = {"map." + name: array for name, array in map_arrays.items()}
+        arrays.update(("entities." + name, array) for name, array in entity_arrays.items())
+        
+        # Path searches queued this tick are answered after loading
+        requests = self.pathfinder.pending_requests
+        arrays["path_requests.unit"] = np.array([unit.id for unit, _, _ in requests], dtype=np.int64)
+        arrays["path_requests.target"] = np.array([(x, y) for _, x, y in requests], dtype=np.float64).reshape(-1, 2)
+        
+        meta = {
+            "map": map_meta,
+            "entities": entity_meta,
+            "elapsed_time": self.elapsed_time,
+            "resources": dict(self.resources),
+            "match_seed": self.match_seed,
+            "map_path": self.map_path,
+        }
+        return meta, arrays
+        
+    def load_snapshot(self, meta, arrays):
+        """Replace the match with one from get_snapshot; the next enter() resumes it"""
+        self.save_replay()
+        self.replay_saved = False
+        self.game_map.load_snapshot(meta["map"], {name[4:]: array for name, array in arrays.items() if name.startswith("map.")})
+        self.prepare_pathfinding()
+        self.entity_manager.load_snapshot(meta["entities"], {name[9:]: array for name, array in arrays.items()
+                                                             if name.startswith("entities.")},
+                                          self.flow_fields.add_field)
+        self.pathfinder.pending_requests = [
+            (self.entity_manager.get_entity_by_id(unit_id), x, y)
+            for unit_id, (x, y) in zip(arrays["path_requests.unit"].tolist(), arrays["path_requests.target"].tolist())]
+        
+        self.elapsed_time = meta["elapsed_time"]
+        self.resources = meta["resources"]
+        self.match_seed = meta["match_seed"]
+        self.map_path = meta["map_path"]
+        self.selected_entities = []
+        self.pending_commands.clear()
+        # Replays start from a generated map, so a loaded match isn't recorded from scratch
+        self.recorded_commands = []
+        if self.autosaver:
+            self.autosaver.reset()
+        self.resuming = True
+        
+    def save_game(self, path):
+        """Write the match to a save file"""
+        write_save_file(path, *self.get_snapshot())
+        
+    def load_game(self, path):
+        """Replace the match with one from a save file; the next enter() resumes it"""
+        self.load_snapshot(*read_save_file(path))
+        
+    def load_latest_save(self):
+        """Load whichever of the save slot and the autosave was written last; returns False if there is neither"""
+        autosave_time = get_autosave_time(AUTOSAVE_PATH)
+        if os.path.exists(SAVE_GAME_PATH) and (autosave_time is None or os.path.getmtime(SAVE_GAME_PATH) >= autosave_time):
+            self.load_game(SAVE_GAME_PATH)
+        elif autosave_time is not None:
+            self.load_snapshot(*read_autosave(AUTOSAVE_PATH))
+        else:
+            return False
+        return True
+        
+    def get_replay(self):
+        """Get a replay of the match so far"""
+        return Replay(self.match_seed, self.map_path, self.recorded_commands, self.elapsed_time,
+                      self.entity_manager.get_state_checksum(), self.entity_manager.arrays is not None)
+        
+    def save_replay(self):
+        """Write the match's replay to replay_path once the match is over; later calls do nothing until a new match"""
+        if self.replay_path and not self.replay_saved:
+            self.get_replay().save(self.replay_path)
+        self.replay_saved = True
+        
     def setup_initial_units(self):
         # Create starting units and buildings for the player
         self.entity_manager.create_unit("worker", 10, 10, is_player=True)
@@ -75,7 +216,7 @@ class PlayingState(BaseState):
         world_y = pos[1] + self.camera_y
         
         # Check if clicked directly on an entity
-        clicked_entity = self.entity_manager.get_entity_at_position(world_x, world_y)
+        clicked_entity = self.find_entity_at(world_x, world_y)
         
         if clicked_entity and clicked_entity.is_player:
             # If shift is not held, clear current selection
@@ -110,7 +251,7 @@ class PlayingState(BaseState):
                 self.selected_entities = []
                 
             # Add all player entities in the selection rectangle
-            for entity in self.entity_manager.get_entities_in_rect(world_rect):
+            for entity in self.find_entities_in_rect(world_rect):
                 if entity.is_player and entity not in self.selected_entities:
                     self.selected_entities.append(entity)
                     
@@ -127,16 +268,115 @@ class PlayingState(BaseState):
         world_y = pos[1] + self.camera_y
         
         # Check if clicked on an enemy to attack
-        target = self.entity_manager.get_entity_at_position(world_x, world_y)
+        target = self.find_entity_at(world_x, world_y)
+        movers = [entity for entity in self.selected_entities if entity.can_move and self.is_in_match(entity)]
+        if not movers:
+            return
+            
+        if target and not target.is_player:
+            self.submit_command(Command.attack(movers, target))
+        else:
+            self.submit_command(Command.move(movers, world_x, world_y))
+            
+    def find_entity_at(self, world_x, world_y):
+        """Get the entity under a world position
+
+        When the simulation runs on its own thread, this and the other input
+        lookups read the last published snapshot and return SnapshotEntity
+        stand-ins, so the main thread never touches live entities.
+        """
+        if self.simulation:
+            snapshot = self.simulation.frames[1]
+            entity_id = snapshot.find_entity_at(world_x, world_y)
+            return None if entity_id is None else snapshot.get_entity(entity_id)
+        return self.entity_manager.get_entity_at_position(world_x, world_y)
         
-        for entity in self.selected_entities:
-            if entity.can_move:
-                if target and not target.is_player:
-                    # Attack target
-                    entity.set_attack_target(target)
+    def find_entities_in_rect(self, rect):
+        """Get the entities inside a world rect, from the last published snapshot when the simulation is threaded"""
+        if self.simulation:
+            snapshot = self.simulation.frames[1]
+            return [snapshot.get_entity(entity_id) for entity_id in snapshot.find_entities_in_rect(rect)]
+        return self.entity_manager.get_entities_in_rect(rect)
+        
+    def is_in_match(self, entity):
+        """Check if a selected entity is still in the match, as of the last published snapshot when threaded"""
+        if self.simulation:
+            return self.simulation.frames[1].find_row(entity.id) is not None
+        return self.entity_manager.is_alive(entity)
+        
+    def submit_command(self, command):
+        """Issue an order from player input, through the simulation thread if there is one"""
+        if self.simulation:
+            self.simulation.submit(command)
+        else:
+            self.issue_command(command)
+            
+    def issue_command(self, command):
+        """Queue an order for the start of the next tick and record it"""
+        command.tick = self.elapsed_time
+        self.pending_commands.append(command)
+        self.recorded_commands.append(command)
+        
+    def apply_commands(self):
+        """Carry out the orders stamped for this tick"""
+        while self.pending_commands and self.pending_commands[0].tick <= self.elapsed_time:
+            self.execute_command(self.pending_commands.popleft())
+            
+    def execute_command(self, command):
+        """Carry out one order on whichever of its entities are still alive"""
+        entities = [entity for entity in map(self.entity_manager.get_entity_by_id, command.entity_ids) if entity is not None]
+        if command.action == COMMAND_MOVE:
+            self.order_move([entity for entity in entities if entity.can_move], command.x, command.y)
+        elif command.action == COMMAND_ATTACK:
+            target = self.entity_manager.get_entity_by_id(command.target_id)
+            if target is not None:
+                self.order_attack([entity for entity in entities if entity.can_move], target)
+        elif command.action == COMMAND_PRODUCE:
+            for building in entities:
+                if building.kind == ENTITY_BUILDING:
+                    building.start_production(self.entity_manager, command.unit_type)
+                    
+    def order_attack(self, movers, target):
+        for entity in movers:
+            # Ignore the order for units that could never get within range of the target
+            reach_x, reach_y = self.game_map.get_reachable_point(entity.x, entity.y, target.x, target.y)
+            if target.distance_to_point(reach_x, reach_y) > entity.attack_range + TILE_SIZE:
+                continue
+                
+            # Attack target
+            entity.set_attack_target(target)
+            
+    def order_move(self, movers, world_x, world_y):
+        if self.game_map.is_streamed:
+            # Streamed worlds are never fully loaded, so units head straight for the target
+            for entity in movers:
+                entity.set_move_target(world_x, world_y)
+            return
+            
+        # Units that can't reach the clicked tile head for the closest tile they can reach instead
+        reachable = []
+        for entity in movers:
+            target_x, target_y = self.game_map.get_reachable_point(entity.x, entity.y, world_x, world_y)
+            if (target_x, target_y) == (world_x, world_y):
+                reachable.append(entity)
+            else:
+                entity.set_move_target(target_x, target_y)
+                self.pathfinder.request_path(entity, target_x, target_y)
+                
+        if len(reachable) >= FLOW_FIELD_MIN_GROUP:
+            # Large groups all sample one shared flow field instead of searching one by one
+            flow_field = self.flow_fields.get_field(world_x, world_y)
+            for entity in reachable:
+                if flow_field is None:
+                    entity.stop()
                 else:
-                    # Move to position
                     entity.set_move_target(world_x, world_y)
+                    entity.follow_flow_field(flow_field, world_x, world_y)
+        else:
+            for entity in reachable:
+                # Move to position, following a path once the batched search has run
+                entity.set_move_target(world_x, world_y)
+                self.pathfinder.request_path(entity, world_x, world_y)
         
     def calculate_selection_rect(self, start, end):
         x = min(start[0], end[0])
@@ -146,19 +386,49 @@ class PlayingState(BaseState):
         return pygame.Rect(x, y, width, height)
         
     def update(self):
+        # Orders take effect at the tick boundary they were stamped for
+        self.apply_commands()
+        
         # Update elapsed game time
         self.elapsed_time += 1
         
         # Check win/loss conditions
         if self.check_victory_condition():
-            self.game_engine.change_state(STATE_VICTORY)
+            self.save_replay()
+            if self.simulation:
+                # Leaving play touches the screen and fonts, so the main thread does it
+                self.simulation.request_state(STATE_VICTORY)
+            else:
+                self.game_engine.change_state(STATE_VICTORY)
+            
+        # Stream in the world around the camera; units load the chunks they walk into
+        margin = WORLD_CHUNK_SIZE * TILE_SIZE
+        screen = pygame.display.get_surface()
+        view_width, view_height = screen.get_size() if screen else (0, 0)
+        self.game_map.prefetch_area(self.camera_x - margin, self.camera_y - margin,
+                                    self.camera_x + view_width + margin, self.camera_y + view_height + margin)
             
+        # Answer this tick's path requests in one batch
+        self.pathfinder.process_requests()
+        
         # Update all entities
         self.entity_manager.update(self.game_map)
         
+        # Copy the state now, between ticks; compressing and writing it happens off this thread
+        if self.autosaver and self.elapsed_time % AUTOSAVE_INTERVAL == 0:
+            self.autosaver.save(self.get_snapshot)
+        
     def check_victory_condition(self):
         # Simple victory condition: destroy all enemy buildings
-        return len(self.entity_manager.get_enemy_buildings()) == 0
+        return self.entity_manager.count_entities(False, ENTITY_BUILDING) == 0
+        
+    def get_winner(self):
+        """Get "player" or "enemy" once the other side has lost all its buildings, else None"""
+        if self.check_victory_condition():
+            return "player"
+        if self.entity_manager.count_entities(True, ENTITY_BUILDING) == 0:
+            return "enemy"
+        return None
         
     def render(self, screen):
         # Fill background
@@ -167,8 +437,12 @@ class PlayingState(BaseState):
         # Render map
         self.game_map.render(screen, self.camera_x, self.camera_y)
         
-        # Render entities
-        self.entity_manager.render(screen, self.camera_x, self.camera_y)
+        # Render entities between the last two ticks
+        interpolation = self.game_engine.interpolation
+        if self.simulation:
+            self.render_snapshot(screen, interpolation)
+            return
+        self.entity_manager.render(screen, self.camera_x, self.camera_y, interpolation)
         
         # Render selection rectangle if active
         if self.selection_rect:
@@ -176,9 +450,10 @@ class PlayingState(BaseState):
             
         # Render selection indicators
         for entity in self.selected_entities:
+            render_x, render_y = self.entity_manager.get_render_position(entity, interpolation)
             rect = pygame.Rect(
-                entity.x - self.camera_x - entity.radius,
-                entity.y - self.camera_y - entity.radius,
+                render_x - self.camera_x - entity.radius,
+                render_y - self.camera_y - entity.radius,
                 entity.radius * 2,
                 entity.radius * 2
             )
@@ -187,10 +462,36 @@ class PlayingState(BaseState):
         # Render UI
         self.render_ui(screen)
         
-    def render_ui(self, screen):
-        # Render resources
-        gold_text = f"Gold: {self.resources['gold']}"
-        wood_text = f"Wood: {self.resources['wood']}"
+    def render_snapshot(self, screen, interpolation):
+        """Render entities and the UI from the simulation thread's last two published snapshots"""
+        previous, current = self.simulation.frames
+        current.render(screen, self.camera_x, self.camera_y, previous, interpolation)
+        
+        if self.selection_rect:
+            pygame.draw.rect(screen, COLOR_GREEN, self.selection_rect, 1)
+            
+        for entity in self.selected_entities:
+            position = current.get_position(entity.id, previous, interpolation)
+            if position is None:
+                continue
+            render_x, render_y, radius = position
+            rect = pygame.Rect(render_x - self.camera_x - radius, render_y - self.camera_y - radius, radius * 2, radius * 2)
+            pygame.draw.rect(screen, COLOR_GREEN, rect, 2)
+            
+        self.render_ui(screen, current)
+        
+    def render_ui(self, screen, snapshot=None):
+        # Render resources; a threaded simulation passes in its last published snapshot to read from
+        if snapshot is None:
+            resources = self.resources
+            player_units = self.entity_manager.count_entities(True, ENTITY_UNIT)
+            player_buildings = self.entity_manager.count_entities(True, ENTITY_BUILDING)
+        else:
+            resources = snapshot.resources
+            player_units = snapshot.player_units
+            player_buildings = snapshot.player_buildings
+        gold_text = f"Gold: {resources['gold']}"
+        wood_text = f"Wood: {resources['wood']}"
         
         gold_surface = self.font.render(gold_text, True, COLOR_GREEN)
         wood_surface = self.font.render(wood_text, True, COLOR_GREEN)
@@ -198,9 +499,19 @@ class PlayingState(BaseState):
         screen.blit(gold_surface, (10, 10))
         screen.blit(wood_surface, (10, 40))
         
+        # Render army size
+        army_text = f"Units: {player_units}  Buildings: {player_buildings}"
+        army_surface = self.font.render(army_text, True, COLOR_GREEN)
+        screen.blit(army_surface, (10, 70))
+        
         # Render selected entity info
         if len(self.selected_entities) == 1:
             entity = self.selected_entities[0]
+            if snapshot is not None:
+                # The selection was taken from an older snapshot, so look its health up again
+                entity = snapshot.get_entity(entity.id)
+                if entity is None:
+                    return
             info_text = f"{entity.type} - HP: {entity.health}/{entity.max_health}"
             info_surface = self.font.render(info_text, True, COLOR_BLUE)
-            screen.blit(info_surface, (10, 70)) 
\ No newline at end of file
+            screen.blit(info_surface, (10, 100)) 
\ No newline at end of file
@@ -1,9 +1,17 @@
+import argparse
 import pygame
 import sys
 from game.engine import GameEngine
-from game.constants import SCREEN_WIDTH, SCREEN_HEIGHT, GAME_TITLE
+from game.constants import SCREEN_WIDTH, SCREEN_HEIGHT, GAME_TITLE, MAX_RENDER_FPS, STATE_PLAYING, \
+    USE_SIMULATION_THREAD
 
 def main():
+    parser = argparse.ArgumentParser(description=GAME_TITLE)
+    parser.add_argument("--record", metavar="PATH", default=None, help="save a replay of each match to PATH")
+    parser.add_argument("--threaded", action="store_true", default=USE_SIMULATION_THREAD,
+                        help="run the simulation on its own thread so slow ticks don't hold up rendering")
+    args = parser.parse_args()
+    
     # Initialize pygame
     pygame.init()
     pygame.display.set_caption(GAME_TITLE)
@@ -11,26 +19,30 @@ def main():
     clock = pygame.time.Clock()
     
     # Create game engine
-    game_engine = GameEngine(screen)
+    game_engine = GameEngine(screen, threaded=args.threaded)
+    game_engine.states[STATE_PLAYING].replay_path = args.record
     
     # Main game loop
     while True:
         # Process events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                # Let the current state finish up, then write the replay of the match in progress
+                game_engine.current_state.exit()
+                game_engine.states[STATE_PLAYING].save_replay()
                 pygame.quit()
                 sys.exit()
             game_engine.handle_event(event)
         
-        # Update game state
-        game_engine.update()
+        # Run the simulation at its fixed tick rate for the real time that passed
+        elapsed = clock.tick(MAX_RENDER_FPS) / 1000.0
+        game_engine.advance(elapsed)
         
         # Render
         game_engine.render()
         
         # Update display
         pygame.display.flip()
-        clock.tick(60)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,37 @@
+import random
+from game.engine import GameEngine
+from game.entities.entity_manager import EntityManager
+from game.commands import Command
+from game.constants import STATE_PLAYING, ENTITY_UNIT, ENTITY_BUILDING
+
+def start_match(use_arrays=False, seed=5, workers=0):
+    """Start a headless match on a generated map; returns (engine, playing_state)"""
+    engine = GameEngine(None, headless=True)
+    playing_state = engine.states[STATE_PLAYING]
+    playing_state.map_seed = seed
+    playing_state.entity_manager = EntityManager(use_arrays=use_arrays, workers=workers)
+    engine.change_state(STATE_PLAYING)
+    return engine, playing_state
+
+def add_battle(playing_state, count=120, seed=1):
+    """Add two armies in the middle of the map and order part of each one around"""
+    entity_manager = playing_state.entity_manager
+    rng = random.Random(seed)
+    for index in range(count):
+        entity_manager.create_unit(rng.choice(["worker", "soldier", "tank"]), rng.randint(15, 45),
+                                   rng.randint(15, 45), index % 2 == 0)
+    entity_manager.create_building("turret", 30, 30, False)
+    entity_manager.create_building("barracks", 20, 20, True).start_production(entity_manager, "soldier")
+
+    player_units = entity_manager.get_group_entities(True, ENTITY_UNIT)
+    enemy_units = entity_manager.get_group_entities(False, ENTITY_UNIT)
+    # A group large enough for a flow field, a small group that searches paths, and an attack order
+    playing_state.issue_command(Command.move(player_units[:12], 1500, 1400))
+    playing_state.issue_command(Command.move(player_units[12:15], 400, 1600))
+    playing_state.issue_command(Command.attack(enemy_units[:6], entity_manager.get_group_entities(True, ENTITY_BUILDING)[0]))
+
+def get_state(playing_state):
+    """Summarize a match well enough to tell two runs apart"""
+    entity_manager = playing_state.entity_manager
+    return (playing_state.elapsed_time, entity_manager.get_state_checksum(), dict(entity_manager.kill_counts),
+            entity_manager.count_entities(True), entity_manager.count_entities(False))
@@ -0,0 +1,15 @@
+from conftest import start_match, add_battle, get_state
+
+def run_battle(use_arrays, ticks):
+    engine, playing_state = start_match(use_arrays)
+    add_battle(playing_state)
+    for _ in range(ticks):
+        engine.update()
+    return get_state(playing_state)
+
+def test_object_and_array_backends_play_the_same_match():
+    object_state = run_battle(False, 400)
+    array_state = run_battle(True, 400)
+    assert object_state == array_state
+    # The armies met, so the comparison covered combat as well as movement
+    assert sum(object_state[2].values()) > 0
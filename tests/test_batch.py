@@ -0,0 +1,42 @@
+import pytest
+from game.batch import apply_stat_overrides, restore_stats, parse_seeds
+from game.entities.entity_types import ENTITY_TYPES
+from game.constants import TILE_SIZE, ENTITY_UNIT, ENTITY_BUILDING
+
+def test_overrides_are_read_like_the_data_file():
+    barracks = ENTITY_TYPES.get(ENTITY_BUILDING, "barracks")
+    soldier = ENTITY_TYPES.get(ENTITY_UNIT, "soldier")
+    stock = {stat: getattr(barracks, stat) for stat in ("width", "height", "radius", "max_health")}
+    stock_damage = soldier.attack_damage
+
+    previous = apply_stat_overrides({
+        ENTITY_BUILDING: {"barracks": {"width": 4, "max_health": 50}},
+        ENTITY_UNIT: {"soldier": {"attack_damage": 99}},
+    })
+    try:
+        # Sizes are in tiles and the radius follows the new footprint
+        assert barracks.width == 4 * TILE_SIZE
+        assert barracks.height == stock["height"]
+        assert barracks.radius == int(max(barracks.width, barracks.height) / 2)
+        assert barracks.max_health == 50
+        assert soldier.attack_damage == 99
+    finally:
+        restore_stats(previous)
+
+    assert {stat: getattr(barracks, stat) for stat in stock} == stock
+    assert soldier.attack_damage == stock_damage
+
+def test_explicit_radius_override_is_kept():
+    turret = ENTITY_TYPES.get(ENTITY_BUILDING, "turret")
+    previous = apply_stat_overrides({ENTITY_BUILDING: {"turret": {"width": 3, "radius": 5}}})
+    try:
+        assert (turret.width, turret.radius) == (3 * TILE_SIZE, 5)
+    finally:
+        restore_stats(previous)
+
+def test_unknown_stats_are_rejected():
+    with pytest.raises(ValueError):
+        apply_stat_overrides({ENTITY_UNIT: {"soldier": {"speed": 3}}})
+
+def test_parse_seeds():
+    assert parse_seeds("1, 3-5,9") == [1, 3, 4, 5, 9]
@@ -0,0 +1,56 @@
+import pytest
+from game.entities.entity_manager import EntityManager
+from game.constants import ENTITY_UNIT, ENTITY_BUILDING
+
+@pytest.fixture(params=[False, True], ids=["objects", "arrays"])
+def entity_manager(request):
+    entity_manager = EntityManager(use_arrays=request.param)
+    yield entity_manager
+    entity_manager.close()
+
+def test_all_attacks_of_a_tick_land_and_the_biggest_hit_gets_the_kill(entity_manager):
+    victim = entity_manager.create_unit("worker", 10, 10, is_player=False)
+    survivor = entity_manager.create_unit("worker", 12, 10, is_player=False)
+    soldier = entity_manager.create_unit("soldier", 8, 10, is_player=True)
+    tank = entity_manager.create_unit("tank", 8, 12, is_player=True)
+    turret = entity_manager.create_building("turret", 14, 14, is_player=True)
+
+    # Neither hit kills alone; the killer is whoever hit hardest, whatever the queue order
+    entity_manager.queue_damage(turret, victim, victim.health // 2 + 1)
+    entity_manager.queue_damage(soldier, victim, victim.health - 1)
+    entity_manager.queue_damage(soldier, survivor, 1)
+    # An attack by an entity that dies in the same tick still lands
+    entity_manager.queue_damage(victim, tank, 5)
+    tank_health = tank.health
+    entity_manager.resolve_combat()
+
+    assert not entity_manager.is_alive(victim)
+    assert survivor.health == survivor.max_health - 1
+    assert tank.health == tank_health - 5
+    assert entity_manager.kill_counts[(True, ENTITY_UNIT)] == 1
+    assert entity_manager.kill_counts[(True, ENTITY_BUILDING)] == 0
+
+def test_equal_hits_credit_the_lowest_id(entity_manager):
+    victim = entity_manager.create_unit("worker", 10, 10, is_player=False)
+    turret = entity_manager.create_building("turret", 14, 14, is_player=True)
+    soldier = entity_manager.create_unit("soldier", 8, 10, is_player=True)
+    assert turret.id < soldier.id
+
+    half = (victim.health + 1) // 2
+    entity_manager.queue_damage(soldier, victim, half)
+    entity_manager.queue_damage(turret, victim, half)
+    entity_manager.resolve_combat()
+
+    assert not entity_manager.is_alive(victim)
+    assert entity_manager.kill_counts[(True, ENTITY_BUILDING)] == 1
+    assert entity_manager.kill_counts[(True, ENTITY_UNIT)] == 0
+
+def test_overkill_is_credited_once(entity_manager):
+    victim = entity_manager.create_unit("worker", 10, 10, is_player=False)
+    attackers = [entity_manager.create_unit("soldier", 8, 10 + index, is_player=True) for index in range(3)]
+    for attacker in attackers:
+        entity_manager.queue_damage(attacker, victim, victim.health)
+    entity_manager.resolve_combat()
+    assert not entity_manager.is_alive(victim)
+    assert entity_manager.kill_counts[(True, ENTITY_UNIT)] == 1
+    assert entity_manager.lost_counts[(False, ENTITY_UNIT)] == 1
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from game.map.engimap import EngimapReader, read_engimap, write_engimap
+from game.map.chunked_map import ChunkedGameMap
+
+@pytest.fixture
+def walls():
+    rng = np.random.default_rng(3)
+    # Long runs as well as scattered walls, with a wall in the first cell
+    walls = rng.random((70, 83)) < 0.3
+    walls[10:20, :] = False
+    walls[30:33, 5:60] = True
+    walls[0, 0] = True
+    return walls
+
+@pytest.mark.parametrize("encoding", ["text", "bitpacked", "rle"])
+def test_windows_match_whole_read(tmp_path, monkeypatch, walls, encoding):
+    # Index in small blocks so rows and runs straddle block boundaries
+    monkeypatch.setattr(EngimapReader, "SCAN_BLOCK", 7)
+    path = tmp_path / "map.engimap"
+    write_engimap(path, walls, encoding)
+    reader = EngimapReader(path)
+    assert (reader.width, reader.height) == (83, 70)
+
+    rng = np.random.default_rng(4)
+    windows = [(0, 0, 83, 70), (0, 0, 1, 1), (82, 69, 83, 70), (5, 28, 64, 40)]
+    for _ in range(50):
+        left, right = sorted(rng.integers(0, 84, size=2))
+        top, bottom = sorted(rng.integers(0, 71, size=2))
+        windows.append((left, top, right, bottom))
+    for left, top, right, bottom in windows:
+        window = reader.read_window(left, top, right, bottom)
+        assert window.dtype == np.bool_
+        assert np.array_equal(window, walls[top:bottom, left:right])
+    reader.close()
+
+def test_text_window_matches_parse_text(tmp_path):
+    # CRLF endings, ragged rows, a blank row inside and blank rows around the map
+    path = tmp_path / "map.engimap"
+    path.write_bytes(b"\r\n\n#.#\r\n..##.#\r\n\r\n#\r\n.#..\n\n")
+    expected = read_engimap(path)
+    reader = EngimapReader(path)
+    assert (reader.height, reader.width) == expected.shape
+    assert np.array_equal(reader.read_window(0, 0, reader.width, reader.height), expected)
+    assert np.array_equal(reader.read_window(2, 1, 6, 4), expected[1:4, 2:6])
+
+def test_streamed_engimap_saves_only_its_path(tmp_path, walls):
+    path = tmp_path / "map.engimap"
+    write_engimap(path, walls, "bitpacked")
+    game_map = ChunkedGameMap(cache_dir=str(tmp_path / "chunks"))
+    game_map.load_engimap(str(path))
+    game_map.set_tile(3, 4, game_map.TILE_WATER)
+    meta, arrays = game_map.get_snapshot()
+    assert meta["source_path"] == str(path)
+    assert set(arrays) == {"chunk_keys", "chunks"}
+
+    loaded = ChunkedGameMap(cache_dir=str(tmp_path / "loaded"))
+    loaded.load_snapshot(meta, arrays)
+    block = loaded.get_tile_block(0, 0, loaded.width, loaded.height)
+    expected = walls.T * np.uint8(loaded.TILE_MOUNTAIN)
+    expected[3, 4] = loaded.TILE_WATER
+    assert np.array_equal(block, expected)
+    assert loaded.regions is None and loaded.tile_listeners == []
+    game_map.close()
+    loaded.close()
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from game.map.game_map import GameMap
+from game.map.chunked_map import ChunkedGameMap
+from game.constants import TILE_SIZE
+
+@pytest.fixture(params=[GameMap, ChunkedGameMap], ids=["resident", "streamed"])
+def game_map(request):
+    game_map = request.param(40, 30)
+    game_map.generate_map(seed=7)
+    yield game_map
+    if isinstance(game_map, ChunkedGameMap):
+        game_map.close()
+
+def test_scalar_and_vector_passability_agree(game_map):
+    rng = np.random.default_rng(0)
+    # Include positions just left of and above the map, where truncation and flooring differ
+    xs = rng.uniform(-2 * TILE_SIZE, 42 * TILE_SIZE, 2000)
+    ys = rng.uniform(-2 * TILE_SIZE, 32 * TILE_SIZE, 2000)
+    xs[:50] = rng.uniform(-TILE_SIZE, 0, 50)
+    vector = game_map.are_passable(xs, ys)
+    scalar = [game_map.is_passable(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+    assert vector.tolist() == scalar
+    assert not any(scalar[:50])
+
+def test_tile_type_off_the_map_is_minus_one(game_map):
+    assert game_map.get_tile_type(-0.5, 10) == -1
+    assert game_map.get_tile_type(10, -TILE_SIZE + 1) == -1
+    assert game_map.get_tile_type(0, 0) != -1
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from game.entities import grid_query
+from game.entities.grid_query import neighbor_pairs
+
+@pytest.mark.parametrize("spread", [50.0, 2000.0, 1e6])
+@pytest.mark.parametrize("dense_min_cells", [grid_query.DENSE_TABLE_MIN_CELLS, 0])
+def test_every_close_pair_is_found_once(monkeypatch, spread, dense_min_cells):
+    # Zero table cells forces the binary search path
+    monkeypatch.setattr(grid_query, "DENSE_TABLE_MIN_CELLS", dense_min_cells)
+    rng = np.random.default_rng(int(spread))
+    for _ in range(20):
+        query_x, query_y = rng.uniform(-spread, spread, (2, rng.integers(1, 300)))
+        point_x, point_y = rng.uniform(-spread, spread, (2, rng.integers(1, 300)))
+        cell_size = rng.uniform(1, 200)
+        pair_query, pair_point = neighbor_pairs(query_x, query_y, point_x, point_y, cell_size)
+
+        pairs = set(zip(pair_query.tolist(), pair_point.tolist()))
+        assert len(pairs) == len(pair_query)
+        close = ((np.abs(query_x[:, None] - point_x[None, :]) < cell_size) &
+                 (np.abs(query_y[:, None] - point_y[None, :]) < cell_size))
+        assert set(map(tuple, np.argwhere(close).tolist())) <= pairs
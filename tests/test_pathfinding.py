@@ -0,0 +1,80 @@
+import math
+import random
+import numpy as np
+from game.map.game_map import GameMap
+from game.map.pathfinding import Pathfinder
+from game.map.cluster_graph import ClusterGraph
+from game.constants import HIERARCHICAL_MIN_DISTANCE
+
+def get_cost(path):
+    return sum(math.hypot(x1 - x0, y1 - y0) for (x0, y0), (x1, y1) in zip(path, path[1:]))
+
+def assert_walkable(game_map, path, start, goal):
+    """Check a path joins start to goal in single steps over open tiles, without cutting corners"""
+    assert path[0] == start and path[-1] == goal
+    for (x0, y0), (x1, y1) in zip(path, path[1:]):
+        assert max(abs(x1 - x0), abs(y1 - y0)) == 1
+        assert game_map.is_tile_passable(x1, y1)
+        if x0 != x1 and y0 != y1:
+            assert game_map.is_tile_passable(x1, y0) and game_map.is_tile_passable(x0, y1)
+
+def get_far_pairs(game_map, count, seed):
+    """Get connected (start, goal) tile pairs far enough apart to use the cluster graph"""
+    rng = random.Random(seed)
+    pairs = []
+    while len(pairs) < count:
+        start = (rng.randrange(game_map.width), rng.randrange(game_map.height))
+        goal = (rng.randrange(game_map.width), rng.randrange(game_map.height))
+        if (game_map.are_tiles_connected(start, goal) and
+                max(abs(start[0] - goal[0]), abs(start[1] - goal[1])) >= HIERARCHICAL_MIN_DISTANCE):
+            pairs.append((start, goal))
+    return pairs
+
+def test_hierarchical_paths_are_walkable_and_near_optimal():
+    ratios = []
+    for seed in range(4):
+        game_map = GameMap(96, 96)
+        game_map.generate_map(seed)
+        pathfinder = Pathfinder(game_map)
+        pathfinder.prepare()
+        for start, goal in get_far_pairs(game_map, 25, seed):
+            path = pathfinder.cluster_graph.find_path(start, goal)
+            assert path is not None
+            assert_walkable(game_map, path, start, goal)
+            ratios.append(get_cost(path) / get_cost(pathfinder.search(start, goal)))
+    # Routes through portals are never shorter than A*, and only rarely much longer
+    assert min(ratios) >= 1 - 1e-9
+    assert max(ratios) < 1.5
+    assert sum(ratios) / len(ratios) < 1.1
+
+def test_failed_hierarchical_search_falls_back_to_a_flat_search(monkeypatch):
+    game_map = GameMap(96, 96)
+    game_map.generate_map(1)
+    pathfinder = Pathfinder(game_map)
+    (start, goal), = get_far_pairs(game_map, 1, 1)
+    monkeypatch.setattr(pathfinder.cluster_graph, "find_path", lambda start, goal: None)
+
+    path = pathfinder.find_path(start, goal)
+    assert path is not None
+    assert_walkable(game_map, path, start, goal)
+    assert math.isclose(get_cost(path), get_cost(pathfinder.search(start, goal)))
+
+def test_rebuilt_clusters_match_a_fresh_build():
+    game_map = GameMap(80, 80)
+    game_map.generate_map(5)
+    graph = ClusterGraph(game_map)
+    graph.ensure_built()
+    rng = random.Random(9)
+    for _ in range(4):
+        for _ in range(30):
+            tile_type = rng.choice([game_map.TILE_GRASS, game_map.TILE_MOUNTAIN])
+            game_map.set_tile(rng.randrange(80), rng.randrange(80), tile_type)
+        graph.ensure_built()
+        fresh = ClusterGraph(game_map)
+        fresh.ensure_built()
+        assert graph.entrances == fresh.entrances
+        assert graph.links == fresh.links
+        for cluster, portals in fresh.distances.items():
+            assert graph.distances[cluster].keys() == portals.keys()
+            for portal, distances in portals.items():
+                assert np.array_equal(graph.distances[cluster][portal], distances)
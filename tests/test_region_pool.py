@@ -0,0 +1,17 @@
+from conftest import start_match, add_battle, get_state
+import game.entities.entity_arrays as entity_arrays
+
+def run_battle(workers, ticks=300):
+    engine, playing_state = start_match(use_arrays=True, workers=workers)
+    add_battle(playing_state)
+    try:
+        for _ in range(ticks):
+            engine.update()
+        return get_state(playing_state)
+    finally:
+        playing_state.entity_manager.close()
+
+def test_region_workers_step_like_one_process(monkeypatch):
+    # Split every step, however few units are moving
+    monkeypatch.setattr(entity_arrays, "REGION_MIN_MOVERS", 1)
+    assert run_battle(workers=2) == run_battle(workers=0)
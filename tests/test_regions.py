@@ -0,0 +1,41 @@
+import numpy as np
+from game.map.game_map import GameMap
+from game.map.regions import label_components
+
+def assert_same_regions(game_map):
+    """Check the incremental labels split the map the same way as a fresh labelling"""
+    passable = np.frombuffer(game_map.passability, dtype=np.uint8).reshape(game_map.height, game_map.width) != 0
+    fresh, count = label_components(passable)
+    labels = game_map.regions.labels
+    assert np.array_equal(labels != 0, passable)
+    # Ids may differ, but each incremental region must be exactly one fresh region
+    pairs = np.unique(np.stack((labels[passable], fresh[passable])), axis=1)
+    assert pairs.shape[1] == count == len(np.unique(labels[passable]))
+
+def test_single_tile_changes_match_fresh_labels():
+    game_map = GameMap(48, 40)
+    game_map.generate_map(seed=11)
+    game_map.get_region(0, 0)
+    rng = np.random.default_rng(12)
+    for _ in range(400):
+        tile_x, tile_y = (int(value) for value in rng.integers((0, 0), (48, 40)))
+        tile_type = game_map.TILE_MOUNTAIN if rng.random() < 0.6 else game_map.TILE_GRASS
+        game_map.set_tile(tile_x, tile_y, tile_type)
+        assert not game_map.regions.needs_full_build
+        assert_same_regions(game_map)
+
+def test_closing_a_bridge_splits_and_reopening_merges():
+    game_map = GameMap(9, 5)
+    # Two open rooms joined by a one-tile corridor at (4, 2)
+    for tile_y in range(5):
+        if tile_y != 2:
+            game_map.set_tile(4, tile_y, game_map.TILE_MOUNTAIN)
+    assert game_map.are_tiles_connected((0, 0), (8, 4))
+
+    game_map.set_tile(4, 2, game_map.TILE_WATER)
+    assert not game_map.are_tiles_connected((0, 0), (8, 4))
+    assert_same_regions(game_map)
+
+    game_map.set_tile(4, 2, game_map.TILE_GRASS)
+    assert game_map.are_tiles_connected((0, 0), (8, 4))
+    assert_same_regions(game_map)
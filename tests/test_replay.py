@@ -0,0 +1,44 @@
+import pytest
+from conftest import start_match
+from game.commands import Command
+from game.replay import Replay
+from game.playback import ReplayPlayer
+from game.constants import ENTITY_UNIT, ENTITY_BUILDING
+
+def record_match(use_arrays, ticks=900):
+    """Play a match driven only by commands and return its replay"""
+    engine, playing_state = start_match(use_arrays)
+    entity_manager = playing_state.entity_manager
+    command_center = entity_manager.get_group_entities(True, ENTITY_BUILDING)[0]
+    playing_state.issue_command(Command.produce(command_center, "worker"))
+    playing_state.issue_command(Command.move(entity_manager.get_group_entities(True, ENTITY_UNIT), 900, 700))
+    for tick in range(ticks):
+        if tick == 300:
+            target = entity_manager.get_group_entities(False, ENTITY_BUILDING)[0]
+            playing_state.issue_command(Command.attack(entity_manager.get_group_entities(True, ENTITY_UNIT), target))
+        engine.update()
+    return playing_state.get_replay()
+
+@pytest.mark.parametrize("use_arrays", [False, True])
+def test_replay_plays_back_to_the_recorded_checksum(tmp_path, use_arrays):
+    path = tmp_path / "match.replay"
+    record_match(use_arrays).save(path)
+    replay = Replay.load(path)
+    assert replay.use_arrays == use_arrays
+
+    player = ReplayPlayer(replay, snapshot_interval=200)
+    player.play()
+    assert player.tick == replay.ticks
+    assert player.matches_recording()
+
+    # Seeking back restores a snapshot and re-simulates to the same end
+    player.seek(250)
+    player.play()
+    assert player.matches_recording()
+
+def test_replay_without_a_command_does_not_match():
+    replay = record_match(False)
+    replay.commands = replay.commands[:-1]
+    player = ReplayPlayer(replay)
+    player.play()
+    assert not player.matches_recording()
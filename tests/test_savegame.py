@@ -0,0 +1,24 @@
+import pytest
+from conftest import start_match, add_battle, get_state
+
+@pytest.mark.parametrize("use_arrays", [False, True])
+def test_loaded_save_plays_on_like_the_original(tmp_path, use_arrays):
+    engine, playing_state = start_match(use_arrays)
+    add_battle(playing_state)
+    for _ in range(150):
+        engine.update()
+    path = tmp_path / "match.sav"
+    saved_state = get_state(playing_state)
+    playing_state.save_game(path)
+
+    for _ in range(250):
+        engine.update()
+    expected = get_state(playing_state)
+
+    playing_state.load_game(path)
+    assert get_state(playing_state) == saved_state
+    for _ in range(250):
+        engine.update()
+    assert get_state(playing_state) == expected
+    # Combat ran after the load, so targets and timers came back as well as positions
+    assert sum(expected[2].values()) > sum(saved_state[2].values())
@@ -0,0 +1,46 @@
+import numpy as np
+import pygame
+from conftest import start_match, add_battle
+from game.simulation import RenderSnapshot, SimulationThread, SnapshotEntity
+from game.constants import ENTITY_UNIT
+
+def run_battle(use_arrays, ticks=300):
+    engine, playing_state = start_match(use_arrays)
+    add_battle(playing_state)
+    for _ in range(ticks):
+        engine.update()
+    return playing_state
+
+def test_array_snapshot_matches_object_snapshot():
+    object_snapshot = RenderSnapshot(run_battle(False))
+    array_snapshot = RenderSnapshot(run_battle(True))
+    for table in ("units", "buildings"):
+        object_columns = getattr(object_snapshot, table)
+        array_columns = getattr(array_snapshot, table)
+        assert set(object_columns) == set(array_columns)
+        for name, column in object_columns.items():
+            assert np.array_equal(column, array_columns[name], equal_nan=True), (table, name)
+    assert len(array_snapshot.units["id"]) > 0 and len(array_snapshot.buildings["id"]) > 0
+
+def test_threaded_input_reads_the_published_snapshot():
+    playing_state = run_battle(True, ticks=100)
+    simulation = SimulationThread(playing_state)
+    simulation.publish()
+    playing_state.simulation = simulation
+    snapshot = simulation.frames[1]
+
+    unit = playing_state.entity_manager.get_group_entities(True, ENTITY_UNIT)[0]
+    found = playing_state.find_entity_at(unit.x, unit.y)
+    assert isinstance(found, SnapshotEntity)
+    assert found == snapshot.get_entity(found.id)
+    assert found.health == snapshot.units["health"][snapshot.find_row(found.id)[1]]
+
+    selected = playing_state.find_entities_in_rect(pygame.Rect(unit.x - 50, unit.y - 50, 100, 100))
+    assert found in selected
+    assert all(playing_state.is_in_match(entity) for entity in selected)
+
+    # An entity that died after the snapshot still counts as present until the next one is published
+    playing_state.entity_manager.remove_entity(unit)
+    assert playing_state.is_in_match(SnapshotEntity(unit.id, unit.stats, True, 0))
+    simulation.publish()
+    assert not playing_state.is_in_match(SnapshotEntity(unit.id, unit.stats, True, 0))
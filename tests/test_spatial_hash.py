@@ -0,0 +1,87 @@
+import random
+import pygame
+import pytest
+from game.entities.spatial_hash import SpatialHash
+from game.entities.entity_manager import EntityManager
+from game.constants import SPATIAL_CELL_SIZE
+
+class Box:
+    """Bare entity stand-in with the fields SpatialHash reads"""
+
+    def __init__(self, entity_id, x, y, radius):
+        self.id = entity_id
+        self.x = x
+        self.y = y
+        self.radius = radius
+
+def overlaps(box, left, top, right, bottom):
+    return (box.x + box.radius >= left and box.x - box.radius <= right and
+            box.y + box.radius >= top and box.y - box.radius <= bottom)
+
+def make_boxes(count, seed=0):
+    rng = random.Random(seed)
+    return [Box(index, rng.uniform(-300, 1300), rng.uniform(-300, 1300), rng.choice((8, 16, 48))) for index in range(count)]
+
+def test_query_rect_finds_every_overlapping_box():
+    spatial_hash = SpatialHash()
+    boxes = make_boxes(300)
+    for box in boxes:
+        spatial_hash.insert(box)
+
+    rng = random.Random(1)
+    for _ in range(100):
+        left, top = rng.uniform(-400, 1300), rng.uniform(-400, 1300)
+        right, bottom = left + rng.uniform(0, 300), top + rng.uniform(0, 300)
+        found = {box.id for box in spatial_hash.query_rect(left, top, right, bottom)}
+        expected = {box.id for box in boxes if overlaps(box, left, top, right, bottom)}
+        assert expected <= found
+
+def test_query_point_only_returns_its_cell():
+    spatial_hash = SpatialHash()
+    inside = Box(0, 10, 10, 4)
+    outside = Box(1, 10 + 2 * SPATIAL_CELL_SIZE, 10, 4)
+    spatial_hash.insert(inside)
+    spatial_hash.insert(outside)
+    assert spatial_hash.query_point(10, 10) == [inside]
+
+def test_update_and_remove_keep_cells_in_step():
+    spatial_hash = SpatialHash()
+    boxes = make_boxes(200, seed=2)
+    for box in boxes:
+        spatial_hash.insert(box)
+
+    rng = random.Random(3)
+    for box in boxes[:150]:
+        box.x += rng.uniform(-200, 200)
+        box.y += rng.uniform(-200, 200)
+        spatial_hash.update(box)
+    for box in boxes[150:]:
+        spatial_hash.remove(box)
+    remaining = boxes[:150]
+
+    fresh = SpatialHash()
+    for box in remaining:
+        fresh.insert(box)
+    assert spatial_hash.entity_cells == fresh.entity_cells
+    assert ({cell: set(bucket) for cell, bucket in spatial_hash.cells.items()} ==
+            {cell: set(bucket) for cell, bucket in fresh.cells.items()})
+
+@pytest.mark.parametrize("use_arrays", [False, True])
+def test_manager_queries_match_a_scan(use_arrays):
+    entity_manager = EntityManager(use_arrays=use_arrays)
+    rng = random.Random(4)
+    for _ in range(200):
+        entity_manager.create_unit("soldier", rng.uniform(0, 40), rng.uniform(0, 40), rng.random() < 0.5)
+    # Moves written straight to the arrays must show up in the queries too
+    for entity in entity_manager.entities[::3]:
+        entity_manager.move_entity(entity, entity.x + rng.uniform(-100, 100), entity.y + rng.uniform(-100, 100))
+    entity_manager.remove_entity(entity_manager.entities[0])
+
+    for _ in range(50):
+        rect = pygame.Rect(rng.randint(0, 1200), rng.randint(0, 1200), rng.randint(1, 200), rng.randint(1, 200))
+        expected = sorted((entity for entity in entity_manager.entities if entity.is_inside_rect(rect)), key=lambda e: e.id)
+        assert entity_manager.get_entities_in_rect(rect) == expected
+
+        x, y = rng.uniform(0, 1280), rng.uniform(0, 1280)
+        under = [entity for entity in entity_manager.entities if entity.is_point_inside(x, y)]
+        assert entity_manager.get_entity_at_position(x, y) == min(under, key=lambda e: e.id, default=None)